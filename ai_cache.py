@@ -0,0 +1,337 @@
+"""
+AI Response Cache Module
+
+This module provides a content-addressed cache for AI generations. Keys are
+a hash of everything that determines the completion (prompt, model,
+temperature and system prompt), so identical requests from different
+sections of the same course are answered without calling the model again.
+
+Three interchangeable backends are available: an in-process LRU, a SQLite
+table and a directory on the local disk. All of them support a TTL and
+size-based eviction.
+"""
+
+import hashlib
+import json
+from abc import ABC, abstractmethod
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from typing import Dict, Optional
+
+
+class CacheBackend(ABC):
+    """Interface implemented by the cache storage backends."""
+
+    def __init__(self, ttl: Optional[float] = None, max_entries: Optional[int] = None,
+                 max_bytes: Optional[int] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+    def _expires_at(self) -> Optional[float]:
+        return time.time() + self.ttl if self.ttl else None
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        """The value stored under key, or None if it is missing or expired."""
+
+    @abstractmethod
+    def set(self, key: str, value: str):
+        """Store value under key, evicting entries beyond the size limits."""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Remove the entry of key, if any."""
+
+    @abstractmethod
+    def clear(self):
+        """Remove every entry."""
+
+
+class MemoryLRUBackend(CacheBackend):
+    """In-process least-recently-used cache."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, size, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str):
+        size = len(value.encode('utf-8'))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, self._expires_at())
+            self._size += size
+            while self._entries and (
+                (self.max_entries and len(self._entries) > self.max_entries) or
+                (self.max_bytes and self._size > self.max_bytes)
+            ):
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._size -= size
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend(CacheBackend):
+    """Cache stored in a SQLite table, shared by all processes using the file."""
+
+    def __init__(self, path: str, table: str = 'ai_response_cache', **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.table = table
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.table} ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, '
+                'expires_at REAL, accessed_at REAL NOT NULL)'
+            )
+            conn.execute(f'CREATE INDEX IF NOT EXISTS ix_{self.table}_accessed_at ON {self.table} (accessed_at)')
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute(f'SELECT value, expires_at FROM {self.table} WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+                return None
+            conn.execute(f'UPDATE {self.table} SET accessed_at = ? WHERE key = ?', (now, key))
+            return value
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                f'INSERT OR REPLACE INTO {self.table} (key, value, size, expires_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, value, len(value.encode('utf-8')), self._expires_at(), now)
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        conn.execute(f'DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at <= ?', (now,))
+        if self.max_entries:
+            conn.execute(
+                f'DELETE FROM {self.table} WHERE key IN ('
+                f'SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+        if self.max_bytes:
+            # Keep the most recently used rows whose cumulative size fits
+            conn.execute(
+                f'DELETE FROM {self.table} WHERE key IN ('
+                f'SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC, key) AS total '
+                f'FROM {self.table}) WHERE total > ?)',
+                (self.max_bytes,)
+            )
+
+    def delete(self, key: str):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+
+    def clear(self):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(f'DELETE FROM {self.table}')
+
+    def __len__(self):
+        with closing(self._connect()) as conn:
+            return conn.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+
+
+class DiskBackend(CacheBackend):
+    """Cache stored as one JSON file per entry in a local directory."""
+
+    def __init__(self, directory: str, **kwargs):
+        super().__init__(**kwargs)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.json')
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('expires_at') is not None and entry['expires_at'] <= time.time():
+            self.delete(key)
+            return None
+        # The modification time doubles as the last access time for eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry['value']
+
+    def set(self, key: str, value: str):
+        # Write to a temporary file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'value': value, 'expires_at': self._expires_at()}, f)
+        os.replace(tmp_path, self._path(key))
+        self._evict()
+
+    def _evict(self):
+        if not (self.max_entries or self.max_bytes):
+            return
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort(reverse=True)
+
+        kept_bytes = 0
+        for index, (_, size, path) in enumerate(entries):
+            kept_bytes += size
+            if (self.max_entries and index >= self.max_entries) or (self.max_bytes and kept_bytes > self.max_bytes):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                self.delete(entry.name[:-5])
+
+    def __len__(self):
+        return sum(1 for entry in os.scandir(self.directory) if entry.name.endswith('.json'))
+
+
+class ResponseCache:
+    """Content-addressed cache of AI completions with hit/miss counters."""
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(prompt: str, model: str, temperature: float, system_prompt: str) -> str:
+        """
+        Hash everything that determines the completion.
+
+        Args:
+            prompt: Output of AIConfig._construct_prompt
+            model: Model identifier
+            temperature: Sampling temperature
+            system_prompt: System message sent with the prompt
+
+        Returns:
+            Hex digest used as cache key
+        """
+        material = json.dumps([prompt, model, temperature, system_prompt], ensure_ascii=False)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value: str):
+        self.backend.set(key, value)
+        with self._lock:
+            self.stores += 1
+
+    def stats(self) -> Dict:
+        """Counters for monitoring the cache effectiveness."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': type(self.backend).__name__,
+                'hits': self.hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+def build_cache_from_env() -> Optional[ResponseCache]:
+    """
+    Build the response cache configured through the environment.
+
+    AI_CACHE_BACKEND selects memory (default), sqlite, disk or none.
+    AI_CACHE_TTL, AI_CACHE_MAX_ENTRIES and AI_CACHE_MAX_BYTES bound the
+    cache and AI_CACHE_PATH locates the SQLite file or disk directory.
+
+    Returns:
+        The configured cache, or None when caching is disabled
+    """
+    backend_name = os.getenv('AI_CACHE_BACKEND', 'memory').lower()
+    options = {
+        'ttl': float(os.getenv('AI_CACHE_TTL', 7 * 24 * 3600)) or None,
+        'max_entries': int(os.getenv('AI_CACHE_MAX_ENTRIES', 1000)) or None,
+        'max_bytes': int(os.getenv('AI_CACHE_MAX_BYTES', 50 * 1024 * 1024)) or None,
+    }
+    instance_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance')
+
+    if backend_name in ('none', 'off', ''):
+        return None
+    if backend_name == 'memory':
+        backend = MemoryLRUBackend(**options)
+    elif backend_name == 'sqlite':
+        path = os.getenv('AI_CACHE_PATH', os.path.join(instance_dir, 'ai_cache.sqlite3'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        backend = SQLiteBackend(path, **options)
+    elif backend_name == 'disk':
+        backend = DiskBackend(os.getenv('AI_CACHE_PATH', os.path.join(instance_dir, 'ai_cache')), **options)
+    else:
+        raise ValueError(f"Unknown AI_CACHE_BACKEND: {backend_name}")
+    return ResponseCache(backend)
@@ -1,24 +1,278 @@
+import asyncio
+import json
 import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 import requests
-from typing import Dict, Optional
-from lab_guide_format import get_lab_guide_structure, format_lab_guide_content
+from requests.adapters import HTTPAdapter
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from lab_guide_format import get_lab_guide_structure
+from ai_cache import ResponseCache, build_cache_from_env
+from ai_logging import BodySummary, log_bodies_enabled, logger
+from ai_providers import CircuitBreaker, Endpoint, EndpointRouter, build_stub_content, endpoints_from_env
+
+SYSTEM_PROMPT = """You are an expert in creating detailed and educational laboratory guides.
+                                 Your guides must follow a specific structure and format.
+                                 IMPORTANT: Use plain text only - NO markdown, NO HTML, NO special formatting.
+                                 Just use regular text with capital letters for section titles.
+                                 Include all required sections and subsections.
+                                 Be precise and professional in your language.
+                                 Ensure all content is in Spanish.
+                                 DO NOT include institutional information, headers, or formatting - focus only on the content structure."""
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+# Status codes worth retrying: rate limiting and transient upstream failures
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+@dataclass
+class AttemptRecord:
+    """Outcome and latency (in seconds) of a single HTTP attempt."""
+    attempt: int
+    latency: float
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+    endpoint: Optional[str] = None
 
 class AIConfig:
-    """Configuration and interaction with OpenRouter's Llama Maverick model."""
+    """
+    Configuration and interaction with OpenAI-compatible chat-completions
+    endpoints (OpenRouter's Llama Maverick model by default).
+    """
     
-    def __init__(self):
-        self.api_key = os.getenv('OPENROUTER_API_KEY')
-        if not self.api_key:
+    def __init__(self,
+                 connect_timeout: Optional[float] = None,
+                 read_timeout: Optional[float] = None,
+                 pool_connections: Optional[int] = None,
+                 pool_maxsize: Optional[int] = None,
+                 max_retries: Optional[int] = None,
+                 backoff_factor: Optional[float] = None,
+                 max_backoff: Optional[float] = None,
+                 cache: Optional[ResponseCache] = None,
+                 endpoints: Optional[List[Endpoint]] = None,
+                 rate_limiter: Optional['HostRateLimiter'] = None):
+        endpoints = endpoints or endpoints_from_env()
+        if not endpoints:
             raise ValueError("OPENROUTER_API_KEY environment variable not set")
-        
-        self.base_url = "https://openrouter.ai/api/v1"
-        self.model = "meta-llama/llama-4-maverick:free"  # Llama Maverick model ID
-        self.headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "HTTP-Referer": "http://localhost:5000",  # Your application's URL
-            "X-Title": "Lab Guide AI"  # Your application's name
-        }
+        self.router = EndpointRouter(endpoints)
+
+        # The first endpoint is the primary one: cache lookups are made for its model,
+        # while completions are stored under the model of the endpoint that answered
+        self.base_url = endpoints[0].base_url
+        self.model = endpoints[0].model
         self.lab_guide_structure = get_lab_guide_structure()
+        self.system_prompt = SYSTEM_PROMPT
+        self.temperature = 0.7
+        self.max_tokens = 2000
+
+        # Sectioned generation: one request per section of lab_guide_structure
+        self.section_max_tokens = int(os.getenv('AI_SECTION_MAX_TOKENS', 800))
+        self.section_concurrency = int(os.getenv('AI_SECTION_CONCURRENCY', 6))
+        self.section_retries = int(os.getenv('AI_SECTION_RETRIES', 2))
+
+        # HTTP settings, overridable through the environment
+        self.timeout = (
+            connect_timeout if connect_timeout is not None else float(os.getenv('AI_CONNECT_TIMEOUT', 5)),
+            read_timeout if read_timeout is not None else float(os.getenv('AI_READ_TIMEOUT', 120))
+        )
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('AI_MAX_RETRIES', 3))
+        self.backoff_factor = backoff_factor if backoff_factor is not None else float(os.getenv('AI_BACKOFF_FACTOR', 1))
+        self.max_backoff = max_backoff if max_backoff is not None else float(os.getenv('AI_MAX_BACKOFF', 30))
+        self.session = self._build_session(
+            pool_connections if pool_connections is not None else int(os.getenv('AI_POOL_CONNECTIONS', 4)),
+            pool_maxsize if pool_maxsize is not None else int(os.getenv('AI_POOL_MAXSIZE', 10))
+        )
+
+        # Requests per second to each upstream host, counting retries, failovers and section requests.
+        # The default burst is the section fan-out, so the sections of a guide are not serialized
+        self.rate_limiter = rate_limiter if rate_limiter is not None else HostRateLimiter(
+            float(os.getenv('AI_RATE_LIMIT_PER_HOST', 2)),
+            burst=int(os.getenv('AI_RATE_LIMIT_BURST', len(self.lab_guide_structure['sections'])))
+        )
+
+        # Attempt latencies: per thread for the last call, and a bounded history
+        self._local = threading.local()
+        self.attempt_history = deque(maxlen=200)
+
+        # Content-addressed cache of completions (None disables it)
+        self.cache = cache if cache is not None else build_cache_from_env()
+
+    def _cache_key(self, prompt: str, model: Optional[str] = None) -> str:
+        """Cache key for a prompt under the current settings and model (the primary one by default)."""
+        return ResponseCache.make_key(prompt, model or self.model, self.temperature, self.system_prompt)
+
+    def _build_session(self, pool_connections: int, pool_maxsize: int) -> requests.Session:
+        """Create a keep-alive session whose connections are reused across generations."""
+        session = requests.Session()
+        # Retries are handled by _post_with_retries so that every attempt is timed
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    @property
+    def last_attempts(self) -> List[AttemptRecord]:
+        """Attempts made by the most recent request of the current thread."""
+        return list(getattr(self._local, 'attempts', []))
+
+    @property
+    def last_error(self) -> Optional[str]:
+        """Why the most recent generate_lab_guide call of the current thread returned None."""
+        return getattr(self._local, 'error', None)
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """Exponential backoff with jitter for the given (1-based) attempt."""
+        delay = min(self.max_backoff, self.backoff_factor * (2 ** (attempt - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _retry_after_delay(self, response: requests.Response) -> Optional[float]:
+        """Seconds requested by a Retry-After header, if present and valid."""
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                retry_at = parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                return None
+            delay = (retry_at - datetime.now(timezone.utc)).total_seconds()
+        return min(self.max_backoff, max(0.0, delay))
+
+    def _post(self, payload: Dict, stream: bool = False) -> requests.Response:
+        """
+        POST a chat-completions request, failing over between endpoints.
+        
+        Endpoints are tried in the order chosen by the router. An endpoint
+        that answers 429/5xx or cannot be reached is reported to its circuit
+        breaker and the next one is tried at once; only the last endpoint
+        still available retries with backoff.
+        
+        Args:
+            payload: JSON body of the request (the model is set per endpoint)
+            stream: Whether to stream the response body
+            
+        Returns:
+            The response of the endpoint that served the request (which may
+            still be an error status)
+            
+        Raises:
+            requests.exceptions.ConnectionError: If no endpoint is available
+        """
+        self._local.attempts = []
+        self._local.endpoint = None
+        self._local.model = None
+        candidates = self.router.candidates()
+        last_error = None
+
+        for index, endpoint in enumerate(candidates):
+            if not endpoint.breaker.allow_request():
+                continue
+            # Later candidates whose breaker has opened since (or whose probe another
+            # request took) will be skipped, so this may be the last endpoint tried
+            is_last = all(later.breaker.state == CircuitBreaker.OPEN for later in candidates[index + 1:])
+            start = time.perf_counter()
+            try:
+                response = self._post_with_retries(
+                    dict(payload, model=endpoint.model), stream=stream, endpoint=endpoint,
+                    max_retries=self.max_retries if is_last else 0
+                )
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                endpoint.breaker.record_failure(time.perf_counter() - start)
+                last_error = e
+                logger.warning('ai.failover', extra={'fields': {'endpoint': endpoint.name, 'error': str(e)}})
+                continue
+            except BaseException:
+                # Not worth failing over, but the outcome must still reach the breaker:
+                # only an outcome releases the probe reserved by allow_request
+                endpoint.breaker.record_failure(time.perf_counter() - start)
+                raise
+
+            if response.status_code in RETRY_STATUS_CODES:
+                endpoint.breaker.record_failure(time.perf_counter() - start)
+                if not is_last:
+                    logger.warning('ai.failover', extra={'fields': {
+                        'endpoint': endpoint.name, 'status_code': response.status_code}})
+                    response.close()
+                    continue
+            else:
+                endpoint.breaker.record_success(time.perf_counter() - start)
+            self._local.endpoint = endpoint.name
+            self._local.model = endpoint.model
+            return response
+
+        if last_error is not None:
+            raise last_error
+        raise requests.exceptions.ConnectionError("No AI endpoint available (all circuit breakers are open)")
+
+    def _post_with_retries(self,
+                           payload: Dict,
+                           stream: bool = False,
+                           endpoint: Optional[Endpoint] = None,
+                           max_retries: Optional[int] = None) -> requests.Response:
+        """
+        POST to one chat-completions endpoint, retrying on 429/5xx and connection errors.
+        
+        Every attempt first waits for the rate limit of the endpoint's host.
+        
+        Args:
+            payload: JSON body of the request
+            stream: Whether to stream the response body
+            endpoint: Endpoint to call (defaults to the primary one)
+            max_retries: Retries allowed (defaults to self.max_retries)
+            
+        Returns:
+            The last response received (which may still be an error status)
+        """
+        attempts = getattr(self._local, 'attempts', None)
+        if attempts is None:
+            attempts = self._local.attempts = []
+        endpoint = endpoint or self.router.endpoints[0]
+        max_retries = self.max_retries if max_retries is None else max_retries
+        url = f"{endpoint.base_url}/chat/completions"
+
+        for attempt in range(1, max_retries + 2):
+            self.rate_limiter.acquire(endpoint.host)
+            start = time.perf_counter()
+            try:
+                response = self.session.post(url, json=payload, headers=endpoint.request_headers,
+                                             timeout=self.timeout, stream=stream)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                record = AttemptRecord(attempt, time.perf_counter() - start, error=str(e), endpoint=endpoint.name)
+                attempts.append(record)
+                self.attempt_history.append(record)
+                if attempt > max_retries:
+                    raise
+                delay = self._backoff_delay(attempt)
+            else:
+                record = AttemptRecord(attempt, time.perf_counter() - start, status_code=response.status_code,
+                                       endpoint=endpoint.name)
+                attempts.append(record)
+                self.attempt_history.append(record)
+                if response.status_code not in RETRY_STATUS_CODES or attempt > max_retries:
+                    return response
+                delay = self._retry_after_delay(response)
+                if delay is None:
+                    delay = self._backoff_delay(attempt)
+                response.close()
+
+            logger.warning('ai.retry', extra={'fields': {
+                'endpoint': endpoint.name,
+                'attempt': attempt,
+                'status_code': record.status_code,
+                'error': record.error,
+                'latency_ms': round(record.latency * 1000, 1),
+                'retry_in_ms': round(delay * 1000, 1),
+            }})
+            time.sleep(delay)
 
     def generate_lab_guide(self, 
                           subject_name: str,
@@ -28,7 +282,9 @@ class AIConfig:
                           difficulty_level: str,
                           estimated_duration: int,
                           additional_notes: str = "",
-                          lab_guide_title: str = "") -> Optional[str]:
+                          lab_guide_title: str = "",
+                          use_cache: bool = True,
+                          sectioned: bool = False) -> Optional[str]:
         """
         Generate a lab guide using the AI model.
         
@@ -41,13 +297,16 @@ class AIConfig:
             estimated_duration: Estimated duration in minutes
             additional_notes: Any additional notes for the AI
             lab_guide_title: The title of the lab guide
+            use_cache: Whether an identical earlier generation may be reused
+            sectioned: Generate the guide section by section (see
+                generate_lab_guide_sectioned) instead of in a single request
             
         Returns:
             Generated lab guide content or None if generation fails
+            (the reason is then available through last_error)
         """
-        try:
-            # Construct the prompt
-            prompt = self._construct_prompt(
+        if sectioned:
+            return self.generate_lab_guide_sectioned(
                 subject_name=subject_name,
                 topic_title=topic_title,
                 topic_description=topic_description,
@@ -55,74 +314,206 @@ class AIConfig:
                 difficulty_level=difficulty_level,
                 estimated_duration=estimated_duration,
                 additional_notes=additional_notes,
-                lab_guide_title=lab_guide_title
+                lab_guide_title=lab_guide_title,
+                use_cache=use_cache
             )
 
+        started = time.perf_counter()
+        # Construct the prompt
+        prompt = self._construct_prompt(
+            subject_name=subject_name,
+            topic_title=topic_title,
+            topic_description=topic_description,
+            lab_number=lab_number,
+            difficulty_level=difficulty_level,
+            estimated_duration=estimated_duration,
+            additional_notes=additional_notes,
+            lab_guide_title=lab_guide_title
+        )
+        return self._complete(prompt, use_cache=use_cache, fields={'prompt_ms': _elapsed_ms(started)}, started=started)
+
+    def _complete(self,
+                  prompt: str,
+                  use_cache: bool = True,
+                  max_tokens: Optional[int] = None,
+                  fields: Optional[Dict] = None,
+                  started: Optional[float] = None) -> Optional[str]:
+        """
+        Send one prompt to the model and return the completion text.
+        
+        Args:
+            prompt: User message of the request
+            use_cache: Whether an identical earlier completion may be reused
+            max_tokens: Completion budget (defaults to self.max_tokens)
+            fields: Extra fields for the 'ai.generation' log record
+            started: perf_counter() value the total time is measured from
+            
+        Returns:
+            The completion text or None if the request fails (the reason is
+            then available through last_error)
+        """
+        self._local.error = None
+        fields = dict({'model': self.model, 'cache': 'bypass'}, **(fields or {}))
+        started = started if started is not None else time.perf_counter()
+        try:
+            cache_key = None
+            if use_cache and self.cache is not None:
+                cache_key = self._cache_key(prompt)
+                cached = self.cache.get(cache_key)
+                fields['cache'] = 'miss' if cached is None else 'hit'
+                if cached is not None:
+                    fields['total_ms'] = _elapsed_ms(started)
+                    logger.info('ai.generation', extra={'fields': fields})
+                    return cached
+
             # Prepare the request payload
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": """You are an expert in creating detailed and educational laboratory guides.
-                                 Your guides must follow a specific structure and format.
-                                 IMPORTANT: Use plain text only - NO markdown, NO HTML, NO special formatting.
-                                 Just use regular text with capital letters for section titles.
-                                 Include all required sections and subsections.
-                                 Be precise and professional in your language.
-                                 Ensure all content is in Spanish.
-                                 DO NOT include institutional information, headers, or formatting - focus only on the content structure."""
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                "temperature": 0.7,
-                "max_tokens": 2000
-            }
-
-            print("Sending prompt to AI:\n", prompt)
-            print("\nAPI Request Payload:\n", payload)
+            payload = self._build_payload(prompt, max_tokens=max_tokens)
+            # Sampled once, so that a call logs both of its bodies or neither
+            log_bodies = log_bodies_enabled()
+            if log_bodies:
+                logger.debug('ai.request', extra={'fields': {'model': self.model, 'payload': BodySummary(payload)}})
 
             # Make the API request
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=self.headers,
-                json=payload
-            )
-            
-            print("\nAPI Response Status Code:", response.status_code)
-            print("API Response Headers:\n", response.headers)
-            print("API Response Body:\n", response.text)
+            network_started = time.perf_counter()
+            response = self._post(payload)
+            fields['network_ms'] = _elapsed_ms(network_started)
+            fields['endpoint'] = self._local.endpoint
+            fields['status_code'] = response.status_code
+            fields['attempts_ms'] = [round(a.latency * 1000, 1) for a in self.last_attempts]
 
             response.raise_for_status()
 
             # Extract the generated content
+            parse_started = time.perf_counter()
             result = response.json()
-            print("\nAPI Response JSON:\n", result)
-            
             content = result['choices'][0]['message']['content']
-            print("\nGenerated Content:\n", content)
+            fields['parse_ms'] = _elapsed_ms(parse_started)
+            fields['response_bytes'] = len(response.content)
+            if log_bodies:
+                logger.debug('ai.response', extra={'fields': {'model': self.model, 'content': BodySummary(content)}})
+
+            # A fallback endpoint may run another model: its completion is not the primary model's
+            if cache_key is not None and content:
+                self.cache.set(self._cache_key(prompt, self._local.model), content)
 
+            fields['total_ms'] = _elapsed_ms(started)
+            logger.info('ai.generation', extra={'fields': fields})
             return content
 
         except requests.exceptions.RequestException as e:
-            print(f"Error making API request: {str(e)}")
             if e.response is not None:
-                print(f"Request Error Details - Status Code: {e.response.status_code}")
-                print(f"Request Error Details - Response Body: {e.response.text}")
+                fields['status_code'] = e.response.status_code
+                fields['response_body'] = BodySummary(e.response.text)
+            logger.error('ai.request_failed', extra={'fields': dict(fields, error=str(e))})
+            self._local.error = f"Error making API request: {str(e)}"
             return None
-        except (KeyError, IndexError) as e:
-            print(f"Error parsing API response: {str(e)}")
+        except (KeyError, IndexError, ValueError) as e:
             if 'result' in locals():
-                 print("Response JSON structure:", result)
+                fields['response_body'] = BodySummary(result)
+            logger.error('ai.parse_failed', extra={'fields': dict(fields, error=str(e))})
+            self._local.error = f"Error parsing API response: {str(e)}"
             return None
         except Exception as e:
-            print(f"Unexpected error: {str(e)}")
+            logger.exception('ai.unexpected_error', extra={'fields': fields})
+            self._local.error = f"Unexpected error: {str(e)}"
             return None
 
-    def _construct_prompt(self, 
+    def generate_lab_guide_sectioned(self,
+                                     subject_name: str,
+                                     topic_title: str,
+                                     topic_description: str,
+                                     lab_number: int,
+                                     difficulty_level: str,
+                                     estimated_duration: int,
+                                     additional_notes: str = "",
+                                     lab_guide_title: str = "",
+                                     use_cache: bool = True) -> Optional[str]:
+        """
+        Generate a lab guide one section of lab_guide_structure at a time.
+        
+        The section prompts share the same context and are sent concurrently,
+        so the wall-clock time is close to that of the slowest section, and
+        each section gets its own token budget instead of sharing a single
+        one. A failed section is retried on its own; the sections are then
+        assembled in the order of the structure, each under its title in
+        capital letters.
+        
+        Takes the same arguments as generate_lab_guide.
+        
+        Returns:
+            Generated lab guide content or None if a section could not be
+            generated (the reason is then available through last_error)
+        """
+        self._local.error = None
+        started = time.perf_counter()
+        context = self._construct_context(
+            subject_name=subject_name,
+            topic_title=topic_title,
+            topic_description=topic_description,
+            lab_number=lab_number,
+            difficulty_level=difficulty_level,
+            estimated_duration=estimated_duration,
+            additional_notes=additional_notes,
+            lab_guide_title=lab_guide_title
+        )
+        sections = self.lab_guide_structure['sections']
+        prompts = [self._construct_section_prompt(context, index) for index in range(len(sections))]
+
+        def generate_section(index: int) -> Tuple[Optional[str], Optional[str]]:
+            # Runs in a worker thread; last_error is thread-local so read it here
+            content = self._complete(prompts[index], use_cache=use_cache, max_tokens=self.section_max_tokens,
+                                     fields={'section': sections[index]['title']})
+            return content, (None if content else self.last_error or 'Empty response from the AI')
+
+        results: List[Optional[str]] = [None] * len(sections)
+        errors: Dict[int, str] = {}
+        retries = [0] * len(sections)
+        max_workers = max(1, min(len(sections), self.section_concurrency))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ai-section') as executor:
+            futures = {executor.submit(generate_section, index): index for index in range(len(sections))}
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = futures.pop(future)
+                    try:
+                        content, error = future.result()
+                    except Exception as e:
+                        content, error = None, f"Unexpected error: {str(e)}"
+                    if content:
+                        results[index] = content
+                    elif retries[index] < self.section_retries:
+                        # Retry only the failed section; the others keep running
+                        retries[index] += 1
+                        logger.warning('ai.section_retry', extra={'fields': {
+                            'section': sections[index]['title'], 'retry': retries[index], 'error': error}})
+                        futures[executor.submit(generate_section, index)] = index
+                    else:
+                        errors[index] = error
+
+        fields = {'model': self.model, 'sections': len(sections), 'retries': sum(retries),
+                  'total_ms': _elapsed_ms(started)}
+        if errors:
+            failed = ', '.join(sections[index]['title'] for index in sorted(errors))
+            logger.error('ai.sectioned_generation_failed', extra={'fields': dict(fields, failed=failed)})
+            self._local.error = f"Error generating sections ({failed}): {errors[min(errors)]}"
+            return None
+
+        logger.info('ai.sectioned_generation', extra={'fields': fields})
+        return self._assemble_sections(sections, results)
+
+    @staticmethod
+    def _assemble_sections(sections: List[Dict], contents: List[str]) -> str:
+        """Join section contents in order, each under its title in capital letters."""
+        parts = []
+        for section, content in zip(sections, contents):
+            lines = content.strip().splitlines()
+            # Drop the section title if the model repeated it anyway
+            if lines and lines[0].strip().rstrip(':').casefold() == section['title'].casefold():
+                lines = lines[1:]
+            parts.append(section['title'].upper() + '\n' + '\n'.join(lines).strip())
+        return '\n\n'.join(parts)
+
+    def stream_lab_guide(self,
                          subject_name: str,
                          topic_title: str,
                          topic_description: str,
@@ -130,26 +521,290 @@ class AIConfig:
                          difficulty_level: str,
                          estimated_duration: int,
                          additional_notes: str = "",
-                         lab_guide_title: str = "") -> str:
-        """Construct a detailed prompt for the AI model."""
+                         lab_guide_title: str = "",
+                         use_cache: bool = True) -> Iterator[str]:
+        """
+        Generate a lab guide using the AI model, yielding text as it arrives.
         
-        # Get the lab guide structure - we will not strictly enforce this structure now
-        # structure = self.lab_guide_structure
+        Takes the same arguments as generate_lab_guide. A cached generation
+        is yielded as a single fragment.
         
-        # Start building a simpler prompt
-        prompt = f"""Generate a lab guide based on the following information:
+        Yields:
+            Fragments of the generated content, in order
+            
+        Raises:
+            requests.exceptions.RequestException: If the API request fails
+        """
+        prompt = self._construct_prompt(
+            subject_name=subject_name,
+            topic_title=topic_title,
+            topic_description=topic_description,
+            lab_number=lab_number,
+            difficulty_level=difficulty_level,
+            estimated_duration=estimated_duration,
+            additional_notes=additional_notes,
+            lab_guide_title=lab_guide_title
+        )
+
+        cache_key = None
+        if use_cache and self.cache is not None:
+            cache_key = self._cache_key(prompt)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        payload = self._build_payload(prompt, stream=True)
+        # Sampled once, so that a call logs both of its bodies or neither
+        log_bodies = log_bodies_enabled()
+        if log_bodies:
+            logger.debug('ai.request', extra={'fields': {'model': self.model, 'payload': BodySummary(payload)}})
+        fragments = []
+        fields = {'model': self.model, 'stream': True, 'cache': 'miss' if cache_key else 'bypass'}
+        started = time.perf_counter()
+
+        response = self._post(payload, stream=True)
+        # Read now: the thread may make other requests while the stream is consumed
+        answered_model = self._local.model
+        fields['endpoint'] = self._local.endpoint
+        fields['status_code'] = response.status_code
+        fields['attempts_ms'] = [round(a.latency * 1000, 1) for a in self.last_attempts]
+        with response:
+            response.raise_for_status()
+            # The API answers with server-sent events: "data: {json}" lines,
+            # comment lines starting with ":" and a final "data: [DONE]".
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                data = line[5:].strip()
+                if data == '[DONE]':
+                    break
+                chunk = json.loads(data)
+                if chunk.get('error'):
+                    raise requests.exceptions.RequestException(chunk['error'].get('message', 'Streaming error'))
+                choices = chunk.get('choices') or [{}]
+                delta = choices[0].get('delta', {}).get('content')
+                if delta:
+                    if not fragments:
+                        fields['first_token_ms'] = _elapsed_ms(started)
+                    fragments.append(delta)
+                    yield delta
+
+        fields['total_ms'] = _elapsed_ms(started)
+        fields['chunks'] = len(fragments)
+        if log_bodies:
+            logger.debug('ai.response', extra={'fields': {'model': self.model, 'content': BodySummary(''.join(fragments))}})
+        logger.info('ai.generation', extra={'fields': fields})
 
-Subject: {subject_name}
+        if cache_key is not None and fragments:
+            self.cache.set(self._cache_key(prompt, answered_model), ''.join(fragments))
+
+    def _build_payload(self, prompt: str, stream: bool = False, max_tokens: Optional[int] = None) -> Dict:
+        """Build the chat-completions request body for a prompt."""
+        payload = {
+            "model": self.model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": self.system_prompt
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "temperature": self.temperature,
+            "max_tokens": max_tokens or self.max_tokens
+        }
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    def _construct_context(self,
+                           subject_name: str,
+                           topic_title: str,
+                           topic_description: str,
+                           lab_number: int,
+                           difficulty_level: str,
+                           estimated_duration: int,
+                           additional_notes: str = "",
+                           lab_guide_title: str = "") -> str:
+        """Describe the lab guide to generate; shared by the full and the section prompts."""
+        context = f"""Subject: {subject_name}
 Weekly Topic Title: {topic_title}
 Weekly Topic Description: {topic_description}
 Lab Guide Title: {lab_guide_title}
+Difficulty Level: {difficulty_level}
 Estimated Duration: {estimated_duration} minutes
 
 """
 
+        # The notes are part of the prompt so that they also take part in the cache key
+        if additional_notes:
+            context += f"Additional Notes: {additional_notes}\n\n"
+
+        return context
+
+    def _construct_prompt(self, 
+                         subject_name: str,
+                         topic_title: str,
+                         topic_description: str,
+                         lab_number: int,
+                         difficulty_level: str,
+                         estimated_duration: int,
+                         additional_notes: str = "",
+                         lab_guide_title: str = "") -> str:
+        """Construct a detailed prompt for the AI model."""
+        
+        # Start building a simpler prompt
+        prompt = "Generate a lab guide based on the following information:\n\n" + self._construct_context(
+            subject_name=subject_name,
+            topic_title=topic_title,
+            topic_description=topic_description,
+            lab_number=lab_number,
+            difficulty_level=difficulty_level,
+            estimated_duration=estimated_duration,
+            additional_notes=additional_notes,
+            lab_guide_title=lab_guide_title
+        )
+
         prompt += """Please generate the content for the lab guide in Spanish. Focus on the core elements relevant to the topic and difficulty. Provide a title, objectives, theoretical background, materials, procedure, and analysis/conclusions. Use plain text only, no markdown or HTML."""
 
         return prompt
 
-# Create a singleton instance
-ai_config = AIConfig() 
\ No newline at end of file
+    def _construct_section_prompt(self, context: str, index: int) -> str:
+        """Construct the prompt for one section of the lab guide structure."""
+        sections = self.lab_guide_structure['sections']
+        section = sections[index]
+        outline = '\n'.join(f"{number}. {item['title']}" for number, item in enumerate(sections, start=1))
+
+        prompt = f"""A lab guide is being written one section at a time, based on the following information:
+
+{context}The complete guide has these sections, in this order:
+{outline}
+
+Write ONLY section {index + 1}, "{section['title']}", in Spanish. Do not repeat its title and do not write any other section.
+"""
+        subsections = section.get('subsections', [])
+        if subsections:
+            prompt += "Cover these subsections, each introduced by its title followed by a colon:\n"
+            for subsection in subsections:
+                kind = 'a list with one item per line' if subsection.get('type') == 'list' else 'a paragraph'
+                prompt += f"- {subsection['title']} ({kind})\n"
+        elif section.get('type') == 'text':
+            prompt += "Answer with a single line.\n"
+
+        prompt += "Use plain text only, no markdown or HTML."
+        return prompt
+
+class HostRateLimiter:
+    """Thread-safe token bucket limiting the request rate to each upstream host."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}  # host -> (tokens, last refill time)
+        self._lock = threading.Lock()
+
+    def acquire(self, host: str) -> float:
+        """
+        Wait until a request to host is allowed.
+
+        The token is reserved under the lock and waited for outside it, so
+        callers for other hosts are never held up.
+
+        Returns:
+            Seconds waited
+        """
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            tokens, last = self._buckets.get(host, (self.burst, now))
+            # Tokens go negative while callers are queued for the ones still to come
+            tokens = min(self.burst, tokens + (now - last) * self.rate) - 1
+            self._buckets[host] = (tokens, now)
+        delay = -tokens / self.rate if tokens < 0 else 0.0
+        if delay:
+            time.sleep(delay)
+        return delay
+
+class AsyncAIClient:
+    """Asyncio front-end to AIConfig for generating many guides concurrently."""
+
+    def __init__(self,
+                 config: AIConfig,
+                 max_concurrency: Optional[int] = None):
+        self.config = config
+        self.max_concurrency = max_concurrency or int(os.getenv('AI_BULK_CONCURRENCY', 4))
+
+    def _generate(self, kwargs: Dict) -> Tuple[Optional[str], Optional[str]]:
+        # Runs in a worker thread; last_error is thread-local so read it here
+        content = self.config.generate_lab_guide(**kwargs)
+        return content, (None if content else self.config.last_error or 'Empty response from the AI')
+
+    async def generate_lab_guide(self, semaphore: asyncio.Semaphore, **kwargs) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Generate one lab guide once a concurrency slot is free.
+        
+        The per-host rate limit of the config applies to each HTTP attempt.
+        
+        Args:
+            semaphore: Semaphore bounding the fan-out of the current batch
+            **kwargs: Arguments of AIConfig.generate_lab_guide
+            
+        Returns:
+            Tuple of (content, error); content is None when generation failed
+        """
+        async with semaphore:
+            # The blocking client runs in a thread and shares the pooled session
+            return await asyncio.to_thread(self._generate, kwargs)
+
+    async def generate_many(self, requests_kwargs: List[Dict]) -> AsyncIterator[Tuple[int, Optional[str], Optional[str]]]:
+        """
+        Generate several lab guides with bounded concurrency.
+        
+        Args:
+            requests_kwargs: One dict of generate_lab_guide arguments per guide
+            
+        Yields:
+            Tuples of (index in requests_kwargs, content, error) as generations finish
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(index, kwargs):
+            try:
+                content, error = await self.generate_lab_guide(semaphore, **kwargs)
+            except Exception as e:
+                content, error = None, f"Unexpected error: {str(e)}"
+            return index, content, error
+
+        tasks = [asyncio.ensure_future(run(index, kwargs)) for index, kwargs in enumerate(requests_kwargs)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+class StubAIConfig(AIConfig):
+    """
+    Offline AIConfig returning deterministic content derived from the prompt.
+    
+    Used for tests and benchmarks; no API key or network access is needed.
+    """
+
+    def __init__(self, latency: float = 0.0, **kwargs):
+        kwargs.setdefault('endpoints', [Endpoint(name='stub', base_url='http://stub.invalid/v1', model='stub')])
+        super().__init__(**kwargs)
+        self.latency = latency
+
+    def _complete(self, prompt: str, use_cache: bool = True, max_tokens: Optional[int] = None,
+                  fields: Optional[Dict] = None, started: Optional[float] = None) -> Optional[str]:
+        self._local.error = None
+        time.sleep(self.latency)
+        return build_stub_content(prompt)
+
+    def stream_lab_guide(self, **kwargs) -> Iterator[str]:
+        kwargs.pop('use_cache', None)
+        yield from self._complete(self._construct_prompt(**kwargs)).splitlines(keepends=True) 
\ No newline at end of file
@@ -0,0 +1,94 @@
+"""
+AI Logging Module
+
+Structured, sampled logging for the AI client. Records carry their data in
+a ``fields`` dict (passed through ``extra``) and large bodies are wrapped in
+lazy objects, so nothing is serialized unless the record is actually emitted.
+
+Environment variables:
+    AI_LOG_LEVEL        Level of the 'lab_guide_ai.ai' logger (default INFO)
+    AI_LOG_SAMPLE_RATE  Fraction of requests whose bodies are logged at DEBUG (default 0.1)
+    AI_LOG_MAX_BODY     Characters of a body kept in the log (default 500)
+"""
+
+import hashlib
+import json
+import logging
+import os
+import random
+from datetime import datetime, timezone
+
+logger = logging.getLogger('lab_guide_ai.ai')
+
+SAMPLE_RATE = float(os.getenv('AI_LOG_SAMPLE_RATE', 0.1))
+MAX_BODY = int(os.getenv('AI_LOG_MAX_BODY', 500))
+
+
+class BodySummary:
+    """
+    Lazily rendered summary of a large body: length, hash and a truncated preview.
+
+    The body is only serialized and hashed when the log record is formatted.
+    """
+
+    __slots__ = ('body', 'max_chars')
+
+    def __init__(self, body, max_chars: int = None):
+        self.body = body
+        self.max_chars = MAX_BODY if max_chars is None else max_chars
+
+    def _text(self) -> str:
+        if isinstance(self.body, (bytes, bytearray)):
+            return self.body.decode('utf-8', errors='replace')
+        if isinstance(self.body, str):
+            return self.body
+        return json.dumps(self.body, ensure_ascii=False, default=str)
+
+    def to_dict(self) -> dict:
+        text = self._text()
+        return {
+            'length': len(text),
+            'sha256': hashlib.sha256(text.encode('utf-8')).hexdigest()[:16],
+            'preview': text if len(text) <= self.max_chars else text[:self.max_chars] + '...',
+        }
+
+    def __str__(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+
+def should_sample(rate: float = None) -> bool:
+    """Decide whether the current request's bodies are logged."""
+    rate = SAMPLE_RATE if rate is None else rate
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+def log_bodies_enabled() -> bool:
+    """True when body dumps are both enabled by level and selected by sampling."""
+    return logger.isEnabledFor(logging.DEBUG) and should_sample()
+
+
+class StructuredFormatter(logging.Formatter):
+    """Formats records as one JSON object per line, including their ``fields``."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': record.getMessage(),
+        }
+        for key, value in getattr(record, 'fields', {}).items():
+            entry[key] = value.to_dict() if isinstance(value, BodySummary) else value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_ai_logging():
+    """Attach a structured stderr handler to the AI logger unless one is configured."""
+    logger.setLevel(os.getenv('AI_LOG_LEVEL', 'INFO').upper())
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(StructuredFormatter())
+        logger.addHandler(handler)
+        logger.propagate = False
@@ -0,0 +1,341 @@
+"""
+AI Providers Module
+
+Registry of the AI clients the application can use. The client is built
+lazily, the first time a generation needs it, so importing the app, running
+`flask db` commands or starting workers does not require an API key or the
+HTTP stack.
+
+The provider is chosen with the AI_PROVIDER setting (app config or
+environment): 'openrouter' (default) or 'stub'. An already built client can
+also be injected by putting the instance itself in app.config['AI_PROVIDER'].
+
+The 'openrouter' client can spread its requests over several
+OpenAI-compatible endpoints (OpenRouter, a locally hosted model, the stub
+server...). Each endpoint has a weight and a circuit breaker; requests are
+routed to healthy endpoints by weight and fail over to the next one.
+"""
+
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+from flask import current_app
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+OPENROUTER_MODEL = "meta-llama/llama-4-maverick:free"  # Llama Maverick model ID
+
+
+class CircuitBreaker:
+    """
+    Tracks the recent outcomes of an endpoint and stops routing to it when
+    it misbehaves.
+
+    The breaker opens when, over the last `window` requests (and at least
+    `min_requests`), the error rate reaches `error_rate_threshold` or the
+    average latency exceeds `latency_threshold` seconds. After `cooldown`
+    seconds it lets a single probe request through (half-open); the probe's
+    outcome closes or re-opens it.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self,
+                 window: int = 20,
+                 min_requests: int = 5,
+                 error_rate_threshold: float = 0.5,
+                 latency_threshold: Optional[float] = None,
+                 cooldown: float = 30.0):
+        self.window = window
+        self.min_requests = min_requests
+        self.error_rate_threshold = error_rate_threshold
+        self.latency_threshold = latency_threshold
+        self.cooldown = cooldown
+        self._outcomes = deque(maxlen=window)  # (ok, latency)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                return self.HALF_OPEN
+            if self._state == self.HALF_OPEN and self._probing:
+                # The probe is in flight; nothing else gets through meanwhile
+                return self.OPEN
+            return self._state
+
+    def allow_request(self) -> bool:
+        """Whether a request may be sent now (reserves the probe when half-open)."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown or self._probing:
+                return False
+            self._state = self.HALF_OPEN
+            self._probing = True
+            return True
+
+    def record_success(self, latency: float):
+        self._record(True, latency)
+
+    def record_failure(self, latency: float):
+        self._record(False, latency)
+
+    def _record(self, ok: bool, latency: float):
+        with self._lock:
+            slow = self.latency_threshold is not None and latency > self.latency_threshold
+            if self._state == self.HALF_OPEN:
+                self._probing = False
+                if ok and not slow:
+                    self._state = self.CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._open()
+                return
+
+            self._outcomes.append((ok, latency))
+            if len(self._outcomes) < self.min_requests:
+                return
+            errors = sum(1 for outcome_ok, _ in self._outcomes if not outcome_ok)
+            average_latency = sum(outcome_latency for _, outcome_latency in self._outcomes) / len(self._outcomes)
+            if (errors / len(self._outcomes) >= self.error_rate_threshold or
+                    (self.latency_threshold is not None and average_latency > self.latency_threshold)):
+                self._open()
+
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            outcomes = list(self._outcomes)
+        return {
+            'state': self.state,
+            'requests': len(outcomes),
+            'errors': sum(1 for ok, _ in outcomes if not ok),
+            'avg_latency_ms': round(sum(latency for _, latency in outcomes) / len(outcomes) * 1000, 1) if outcomes else None,
+        }
+
+
+@dataclass
+class Endpoint:
+    """An OpenAI-compatible chat-completions endpoint."""
+    name: str
+    base_url: str
+    model: str
+    api_key: Optional[str] = None
+    weight: float = 1.0
+    headers: Dict[str, str] = field(default_factory=dict)
+    breaker: CircuitBreaker = field(default_factory=CircuitBreaker)
+
+    @property
+    def host(self) -> str:
+        """Host (and port) requests are sent to; rate limits are kept per host."""
+        return urlparse(self.base_url).netloc
+
+    @property
+    def request_headers(self) -> Dict[str, str]:
+        headers = dict(self.headers)
+        if self.api_key:
+            headers['Authorization'] = f"Bearer {self.api_key}"
+        return headers
+
+
+class EndpointRouter:
+    """Orders the healthy endpoints for each request by weighted random choice."""
+
+    def __init__(self, endpoints: List[Endpoint]):
+        if not endpoints:
+            raise ValueError("At least one AI endpoint must be configured")
+        self.endpoints = endpoints
+
+    def candidates(self) -> List[Endpoint]:
+        """
+        Endpoints to try for one request, in order.
+
+        Endpoints whose breaker is open are left out; the others are
+        ordered by a weighted shuffle. Callers must still call
+        breaker.allow_request() before using an endpoint, which reserves
+        the single probe of a half-open breaker.
+        """
+        def weighted_key(endpoint):
+            # Efraimidis-Spirakis: sorting by u^(1/w) is a weighted shuffle
+            return random.random() ** (1.0 / endpoint.weight) if endpoint.weight > 0 else 0.0
+
+        available = [endpoint for endpoint in self.endpoints if endpoint.breaker.state != CircuitBreaker.OPEN]
+        return sorted(available, key=weighted_key, reverse=True)
+
+    def stats(self) -> List[Dict]:
+        return [dict(endpoint.breaker.stats(), name=endpoint.name, base_url=endpoint.base_url,
+                     model=endpoint.model, weight=endpoint.weight)
+                for endpoint in self.endpoints]
+
+
+def _breaker_from_env() -> CircuitBreaker:
+    latency_threshold = os.getenv('AI_BREAKER_LATENCY')
+    return CircuitBreaker(
+        window=int(os.getenv('AI_BREAKER_WINDOW', 20)),
+        min_requests=int(os.getenv('AI_BREAKER_MIN_REQUESTS', 5)),
+        error_rate_threshold=float(os.getenv('AI_BREAKER_ERROR_RATE', 0.5)),
+        latency_threshold=float(latency_threshold) if latency_threshold else None,
+        cooldown=float(os.getenv('AI_BREAKER_COOLDOWN', 30))
+    )
+
+
+def endpoints_from_env() -> List[Endpoint]:
+    """
+    Build the endpoint list from the environment.
+
+    AI_ENDPOINTS may hold a JSON list of objects with name, base_url, model,
+    weight and either api_key or api_key_env. Otherwise the endpoints are
+    OpenRouter (when OPENROUTER_API_KEY is set, OPENROUTER_BASE_URL and
+    OPENROUTER_MODEL override its defaults) and a locally hosted model when
+    AI_LOCAL_BASE_URL is set (AI_LOCAL_MODEL, AI_LOCAL_WEIGHT).
+    """
+    common_headers = {
+        "HTTP-Referer": "http://localhost:5000",  # Your application's URL
+        "X-Title": "Lab Guide AI"  # Your application's name
+    }
+
+    configured = os.getenv('AI_ENDPOINTS')
+    if configured:
+        endpoints = []
+        for entry in json.loads(configured):
+            api_key = entry.get('api_key') or (os.getenv(entry['api_key_env']) if entry.get('api_key_env') else None)
+            endpoints.append(Endpoint(
+                name=entry.get('name', entry['base_url']),
+                base_url=entry['base_url'].rstrip('/'),
+                model=entry['model'],
+                api_key=api_key,
+                weight=float(entry.get('weight', 1.0)),
+                headers=dict(common_headers),
+                breaker=_breaker_from_env()
+            ))
+        return endpoints
+
+    endpoints = []
+    api_key = os.getenv('OPENROUTER_API_KEY')
+    if api_key:
+        endpoints.append(Endpoint(
+            name='openrouter',
+            base_url=os.getenv('OPENROUTER_BASE_URL', OPENROUTER_BASE_URL).rstrip('/'),
+            model=os.getenv('OPENROUTER_MODEL', OPENROUTER_MODEL),
+            api_key=api_key,
+            weight=float(os.getenv('OPENROUTER_WEIGHT', 1.0)),
+            headers=dict(common_headers),
+            breaker=_breaker_from_env()
+        ))
+    local_url = os.getenv('AI_LOCAL_BASE_URL')
+    if local_url:
+        endpoints.append(Endpoint(
+            name='local',
+            base_url=local_url.rstrip('/'),
+            model=os.getenv('AI_LOCAL_MODEL', 'local'),
+            api_key=os.getenv('AI_LOCAL_API_KEY'),
+            weight=float(os.getenv('AI_LOCAL_WEIGHT', 1.0)),
+            headers=dict(common_headers),
+            breaker=_breaker_from_env()
+        ))
+    return endpoints
+
+
+def _openrouter_factory():
+    from ai_config import AIConfig
+    return AIConfig()
+
+
+def build_stub_content(prompt: str) -> str:
+    """
+    Builds a plain text lab guide that only depends on the prompt.
+
+    Args:
+        prompt (str): The user prompt sent to the model
+
+    Returns:
+        str: Plain text content shaped like a real generation
+    """
+    digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:12]
+    return (
+        f"GUIA DE LABORATORIO {digest}\n"
+        "\n"
+        "OBJETIVOS\n"
+        "General:\n"
+        "Comprender el tema propuesto mediante la experimentacion.\n"
+        "\n"
+        "MATERIALES Y EQUIPOS\n"
+        "Computador con el software requerido.\n"
+        "\n"
+        "PROCEDIMIENTO\n"
+        "Paso 1. Preparar el entorno de trabajo.\n"
+        "Paso 2. Ejecutar la practica y registrar los resultados.\n"
+        "\n"
+        "CONCLUSIONES\n"
+        "Los resultados se comparan con el fundamento teorico.\n"
+    )
+
+
+def _stub_factory():
+    from ai_config import StubAIConfig
+    return StubAIConfig(latency=float(os.getenv('AI_STUB_LATENCY', 0)))
+
+
+PROVIDER_FACTORIES: Dict[str, Callable] = {
+    'openrouter': _openrouter_factory,
+    'stub': _stub_factory,
+}
+
+_lock = threading.Lock()
+
+
+def register_provider(name: str, factory: Callable):
+    """Make a provider selectable through AI_PROVIDER."""
+    PROVIDER_FACTORIES[name] = factory
+
+
+def get_ai_config(app=None):
+    """
+    Returns the AI client of the application, building it on first use.
+
+    Args:
+        app: Flask application (defaults to current_app)
+
+    Returns:
+        The configured AIConfig-compatible client
+
+    Raises:
+        ValueError: If the provider is unknown or cannot be configured
+    """
+    app = app or current_app._get_current_object()
+    client = app.extensions.get('ai_provider')
+    if client is not None:
+        return client
+
+    with _lock:
+        client = app.extensions.get('ai_provider')
+        if client is None:
+            provider = app.config.get('AI_PROVIDER') or os.getenv('AI_PROVIDER', 'openrouter')
+            if isinstance(provider, str):
+                if provider not in PROVIDER_FACTORIES:
+                    raise ValueError(f"Unknown AI provider: {provider}")
+                client = PROVIDER_FACTORIES[provider]()
+            else:
+                client = provider
+            app.extensions['ai_provider'] = client
+    return client
+
+
+def reset_ai_config(app=None):
+    """Drop the cached client so the next use builds it again."""
+    app = app or current_app._get_current_object()
+    app.extensions.pop('ai_provider', None)
@@ -1,28 +1,48 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file, Response, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_migrate import Migrate
-from models import db, User, Professor, Subject, LabGuide, WeeklyTopic, Laboratory
+from models import db, User, Professor, Subject, LabGuide, WeeklyTopic, Laboratory, GenerationJob
 from werkzeug.security import generate_password_hash
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import cm
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+from werkzeug.http import is_resource_modified
 import os
+import sys
+import json
+import click
 import tempfile
 from datetime import datetime
-from io import BytesIO
+
+if __name__ == '__main__':
+    # `python app.py` hands over to `flask run` before setting anything up. Render
+    # processes are spawned (see render_pool) and run the server's __main__ module
+    # again first: as __main__, this module would set the app up in each of them
+    os.execv(sys.executable, [sys.executable, '-m', 'flask', '--app', os.path.abspath(__file__), 'run', '--debug'])
 
 # To use this application, you need to set your OpenRouter API key as an environment variable:
 # Windows: set OPENROUTER_API_KEY=your-api-key
 # Linux/Mac: export OPENROUTER_API_KEY=your-api-key
 # Or set it in your system's environment variables
-
-from ai_config import ai_config  # Import the AI configuration
+# The key is only read when the first guide is generated; set AI_PROVIDER=stub
+# to use the offline stub provider instead.
+
+from database import configure_database
+from generation_jobs import (GenerationWorkerPool, TopicResult, delete_jobs, detach_jobs, enqueue_subject_jobs,
+                             run_bulk_jobs)
+from ai_providers import get_ai_config
+from ai_logging import configure_ai_logging
+from lab_guide_format import IncrementalFormatter, wrap_generated_guide
+from pdf_cache import PDFCache
+from pdf_renderer import GuideSnapshot
+from render_pool import RenderPool, RenderPoolSaturated
+from dashboard_views import load_subject_cards
+from user_directory import UserCount, list_users
+from identity import IdentityCache
+from authz import can_access_guide, can_access_subject, forget_owned_subjects, owned_subject_ids
+from pdf_export import EXPORT_ID_RE, ExportProgressStore, guides_for_subjects, snapshot_guides, stream_export_zip
+from guide_search import GuideSearch, include_in_migrations
+import guide_similarity
 
 app = Flask(__name__)
+configure_ai_logging()
 # Configure Flask-Login
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -31,18 +51,57 @@ login_manager.login_view = 'login'
 # Add a secret key for session management
 app.config['SECRET_KEY'] = 'your-secret-key-here'  # Change this to a secure secret key in production
 
-# Configure SQLAlchemy
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///site.db'
+# Configure SQLAlchemy: DATABASE_URL, connection pool and SQLite pragmas (see database)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
-
-# Configure Flask-Migrate
-migrate = Migrate(app, db)
+configure_database(app)
+
+# Configure Flask-Migrate, leaving the full-text index out of autogenerated migrations
+migrate = Migrate(app, db, include_name=include_in_migrations)
+
+# Full-text index of lab guides (SQLite FTS5), kept in sync with the guides (see guide_search)
+search_index = GuideSearch(app)
+# Requests at least this similar to an earlier guide of the subject are offered that guide first
+app.config['GUIDE_SIMILARITY_THRESHOLD'] = float(os.getenv('GUIDE_SIMILARITY_THRESHOLD', 0.8))
+
+# Templates check ownership with the same memoized subject IDs as the routes
+app.add_template_global(can_access_guide)
+
+# AI provider, built lazily on first use (see ai_providers)
+app.config['AI_PROVIDER'] = os.getenv('AI_PROVIDER', 'openrouter')
+
+# Configure the background generation workers
+app.config['GENERATION_MAX_WORKERS'] = int(os.getenv('GENERATION_MAX_WORKERS', 4))
+# Default generation mode offered in the form: 'single' request or 'sectioned'
+app.config['AI_GENERATION_MODE'] = os.getenv('AI_GENERATION_MODE', 'single')
+generation_pool = GenerationWorkerPool(app)
+
+# Configure the cache of rendered PDFs
+app.config['PDF_CACHE_MAX_BYTES'] = int(os.getenv('PDF_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+if os.getenv('PDF_CACHE_DIR'):
+    app.config['PDF_CACHE_DIR'] = os.getenv('PDF_CACHE_DIR')
+pdf_cache = PDFCache(app)
+# Let the front-end server (nginx X-Accel / Apache mod_xsendfile) send cached PDFs
+app.config['USE_X_SENDFILE'] = os.getenv('USE_X_SENDFILE', '').lower() in ('1', 'true', 'yes')
+# Render processes used by PDF downloads, and how many renders may wait for them
+app.config['PDF_RENDER_WORKERS'] = int(os.getenv('PDF_RENDER_WORKERS', 2))
+app.config['PDF_RENDER_QUEUE_DEPTH'] = int(os.getenv('PDF_RENDER_QUEUE_DEPTH', 8))
+app.config['PDF_RENDER_TIMEOUT'] = float(os.getenv('PDF_RENDER_TIMEOUT', 60))
+render_pool = RenderPool(app)
+# Progress of ZIP exports, polled by the dashboard while the archive downloads
+export_progress = ExportProgressStore(app)
+# Seconds the number of users listed by /api/users is cached for
+app.config['USER_COUNT_TTL'] = int(os.getenv('USER_COUNT_TTL', 60))
+user_count = UserCount(app)
+
+# Signed-in users are cached per process until their auth version changes, for at most
+# USER_IDENTITY_TTL seconds (see identity)
+app.config['USER_IDENTITY_TTL'] = int(os.getenv('USER_IDENTITY_TTL', 60))
+identity_cache = IdentityCache(app)
 
 @login_manager.user_loader
 def load_user(user_id):
     """Load user by ID for Flask-Login"""
-    return User.query.get(int(user_id))
+    return identity_cache.load(user_id)
 
 @app.route('/register', methods=['GET', 'POST'])
 def register():
@@ -121,9 +180,38 @@ def logout():
 
 @app.route('/')
 def home():
-    # Get all users (includes Professor, Student, etc.)
-    users = User.query.all()
-    return render_template('index.html', title='Welcome to Flask', users=users)
+    # The landing page is static: anonymous hits must not query the users table
+    return render_template('index.html', title='Welcome to Flask')
+
+@app.route('/api/users')
+@login_required
+def list_users_api():
+    """API endpoint listing users a page at a time (?after=<last id>&limit=<n>)"""
+    page = list_users(request.args.get('after', type=int), request.args.get('limit', 20, type=int), user_count)
+    return jsonify({
+        'users': [user.to_dict() for user in page.users],
+        'total': page.total,
+        'next_after': page.next_after,
+        'next_url': url_for('list_users_api', after=page.next_after, limit=len(page.users))
+                    if page.next_after is not None else None
+    })
+
+@app.route('/api/lab_guides/search')
+@login_required
+def search_lab_guides():
+    """API endpoint searching the guides of the current user's subjects (?q=<words>&page=<n>&limit=<n>)"""
+    if not search_index.available:
+        return jsonify({'error': 'Full-text search is not available on this database.'}), 501
+    terms = request.args.get('q', '')
+    result = search_index.search(terms, owned_subject_ids(),
+                                 page=request.args.get('page', 1, type=int),
+                                 limit=request.args.get('limit', 20, type=int))
+    return jsonify({
+        'results': [dict(hit.to_dict(), url=url_for('view_lab_guide', guide_id=hit.id)) for hit in result.hits],
+        'page': result.page,
+        'next_url': url_for('search_lab_guides', q=terms, page=result.next_page, limit=len(result.hits))
+                    if result.next_page is not None else None
+    })
 
 @app.route('/dashboard')
 @login_required
@@ -131,9 +219,9 @@ def dashboard():
     """Dashboard for authenticated users. Provides options to create lab guides, manage subjects (if professor), and edit account data."""
     # For professors, fetch their subjects (if any) so that the dashboard can display or link to them.
     subjects = []
-    if hasattr(current_user, "subjects") and (current_user.user_type == "professor"):
-        subjects = current_user.subjects.all()
-    return render_template("dashboard.html", subjects=subjects, WeeklyTopic=WeeklyTopic)
+    if current_user.user_type == "professor":
+        subjects = load_subject_cards(current_user.id)
+    return render_template("dashboard.html", subjects=subjects)
 
 @app.route('/api/subjects/<int:subject_id>/weekly-topics')
 @login_required
@@ -141,7 +229,7 @@ def get_weekly_topics(subject_id):
     """API endpoint to get weekly topics for a subject"""
     # Verify the subject exists and the user has access to it
     subject = Subject.query.get_or_404(subject_id)
-    if not (current_user.user_type == 'professor' and subject in current_user.subjects):
+    if not can_access_subject(subject):
         return jsonify({'error': 'Unauthorized'}), 403
     
     topics = subject.weekly_topics.order_by(WeeklyTopic.week_number).all()
@@ -168,10 +256,12 @@ def create_lab_guide():
         estimated_duration = request.form.get('estimated_duration')
         additional_notes = request.form.get('additional_notes', '')
         laboratory_id = request.form.get('laboratory_id')
+        use_cache = not request.form.get('skip_cache')
+        sectioned = bool(request.form.get('sectioned'))
 
         # Validate subject ownership
         subject = Subject.query.get_or_404(subject_id)
-        if subject not in current_user.subjects:
+        if not can_access_subject(subject):
             flash('No tienes permiso para crear guías para esta materia.', 'error')
             return redirect(url_for('dashboard'))
 
@@ -181,71 +271,36 @@ def create_lab_guide():
             flash('El tema semanal seleccionado no pertenece a la materia.', 'error')
             return redirect(url_for('dashboard'))
 
+        # Offer an existing guide before spending an AI call on a near-duplicate
+        if not request.form.get('ignore_similar'):
+            similar = guide_similarity.find_similar(subject.id, weekly_topic.id, title, additional_notes,
+                                                    threshold=app.config['GUIDE_SIMILARITY_THRESHOLD'])
+            if similar:
+                return render_template('similar_lab_guides.html', similar=similar, subject=subject,
+                                       weekly_topic=weekly_topic, form=request.form)
+
         try:
-            # Generate lab guide content using AI
-            content = ai_config.generate_lab_guide(
-                subject_name=subject.name,
-                topic_title=weekly_topic.title,
-                topic_description=weekly_topic.description,
+            # Enqueue the generation; a background worker calls the AI
+            job = GenerationJob(
+                subject_id=subject.id,
+                weekly_topic_id=weekly_topic.id,
+                title=title,
                 lab_number=int(lab_number),
                 difficulty_level=difficulty_level,
                 estimated_duration=int(estimated_duration),
                 additional_notes=additional_notes,
-                lab_guide_title=title
-            )
-
-            if not content:
-                flash('Error al generar la guía de laboratorio. Por favor, intente nuevamente.', 'error')
-                return redirect(url_for('create_lab_guide'))
-
-            # Convert plain text content to HTML for display
-            formatted_content = f"""
-<div class="institutional-header">
-    <h1>Universidad Cooperativa de Colombia</h1>
-    <h2>{current_user.department}</h2>
-    <p><strong>Asignatura:</strong> {subject.code} - {subject.name}</p>
-    <p><strong>Laboratorio:</strong> {title}</p>
-    <p><strong>Docente:</strong> {current_user.username}</p>
-    <p><strong>Semestre:</strong> 2024-1</p>
-</div>
-<hr>
-<div class="lab-guide-content">
-"""
-
-            # Process the content line by line to convert to HTML
-            lines = content.split('\n')
-            for line in lines:
-                line = line.strip()
-                if not line:  # Empty line
-                    formatted_content += '<br>\n'
-                elif line.isupper() and len(line) > 3:  # Section title
-                    formatted_content += f'<h2>{line}</h2>\n'
-                elif line.endswith(':'):  # Subsection title
-                    formatted_content += f'<h3>{line}</h3>\n'
-                else:  # Regular text
-                    formatted_content += f'<p>{line}</p>\n'
-
-            formatted_content += '</div>'
-
-            # Create new lab guide
-            lab_guide = LabGuide(
-                subject_id=subject_id,
-                weekly_topic_id=weekly_topic_id,
-                title=title,
-                content=formatted_content,
-                lab_number=lab_number,
-                difficulty_level=difficulty_level,
-                estimated_duration=estimated_duration,
-                status='draft',
+                use_cache=use_cache,
+                sectioned=sectioned,
                 laboratory_id=laboratory_id if laboratory_id else None,
-                created_by_id=current_user.id  # Add the professor's ID as the creator
+                created_by_id=current_user.id
             )
-
-            db.session.add(lab_guide)
+            db.session.add(job)
             db.session.commit()
 
-            flash('Guía de laboratorio creada exitosamente.', 'success')
-            return redirect(url_for('dashboard'))
+            generation_pool.submit(job.id)
+
+            flash('La guía de laboratorio se está generando.', 'info')
+            return redirect(url_for('view_generation_job', job_id=job.id))
 
         except Exception as e:
             db.session.rollback()
@@ -260,6 +315,231 @@ def create_lab_guide():
                          subjects=subjects,
                          laboratories=laboratories)
 
+def _sse(event, data):
+    """Serialize a server-sent event."""
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+@app.route('/dashboard/create_lab_guide/stream', methods=['POST'])
+@login_required
+def create_lab_guide_stream():
+    """Generate a lab guide while relaying the formatted text as server-sent events."""
+    if current_user.user_type != 'professor':
+        return jsonify({'error': 'Solo los profesores pueden crear guías de laboratorio.'}), 403
+
+    subject_id = request.form.get('subject_id')
+    weekly_topic_id = request.form.get('weekly_topic_id')
+    title = request.form.get('title')
+    lab_number = request.form.get('lab_number', type=int)
+    difficulty_level = request.form.get('difficulty_level')
+    estimated_duration = request.form.get('estimated_duration', type=int)
+    additional_notes = request.form.get('additional_notes', '')
+    laboratory_id = request.form.get('laboratory_id')
+    use_cache = not request.form.get('skip_cache')
+
+    # Validated before streaming starts, so a bad form gets a status code rather than an error event
+    if lab_number is None or estimated_duration is None:
+        return jsonify({'error': 'El número de laboratorio y la duración estimada deben ser números enteros.'}), 400
+
+    # Validate subject ownership
+    subject = Subject.query.get_or_404(subject_id)
+    if not can_access_subject(subject):
+        return jsonify({'error': 'No tienes permiso para crear guías para esta materia.'}), 403
+
+    # Validate weekly topic association
+    weekly_topic = WeeklyTopic.query.get_or_404(weekly_topic_id)
+    if weekly_topic.subject_id != subject.id:
+        return jsonify({'error': 'El tema semanal seleccionado no pertenece a la materia.'}), 400
+
+    if not request.form.get('ignore_similar'):
+        similar = guide_similarity.find_similar(subject.id, weekly_topic.id, title, additional_notes,
+                                                threshold=app.config['GUIDE_SIMILARITY_THRESHOLD'])
+        if similar:
+            return jsonify({
+                'error': 'Ya existe una guía muy similar en esta materia. Puedes abrirla o clonarla, '
+                         'o marcar "Generar aunque exista una guía similar".',
+                'similar': [dict(guide.to_dict(), url=url_for('view_lab_guide', guide_id=guide.id))
+                            for guide in similar]
+            }), 409
+
+    def generate():
+        # Sent before the AI answers so the browser gets the first byte at once
+        yield _sse('start', {'title': title})
+
+        formatter = IncrementalFormatter()
+        try:
+            for delta in get_ai_config().stream_lab_guide(
+                subject_name=subject.name,
+                topic_title=weekly_topic.title,
+                topic_description=weekly_topic.description,
+                lab_number=lab_number,
+                difficulty_level=difficulty_level,
+                estimated_duration=estimated_duration,
+                additional_notes=additional_notes,
+                lab_guide_title=title,
+                use_cache=use_cache
+            ):
+                # Each line is formatted once, when the delta that ends it arrives
+                html = formatter.feed(delta)
+                if html:
+                    yield _sse('chunk', {'html': html})
+            html = formatter.close()
+            if html:
+                yield _sse('chunk', {'html': html})
+
+            lab_guide = LabGuide(
+                subject_id=subject.id,
+                weekly_topic_id=weekly_topic.id,
+                title=title,
+                content=wrap_generated_guide(
+                    formatter.html,
+                    department=current_user.department,
+                    subject_code=subject.code,
+                    subject_name=subject.name,
+                    title=title,
+                    professor_name=current_user.username
+                ),
+                lab_number=lab_number,
+                difficulty_level=difficulty_level,
+                estimated_duration=estimated_duration,
+                status='draft',
+                laboratory_id=laboratory_id if laboratory_id else None,
+                created_by_id=current_user.id
+            )
+            guide_similarity.remember(lab_guide, additional_notes)
+            db.session.add(lab_guide)
+            db.session.commit()
+            yield _sse('done', {'lab_guide_id': lab_guide.id,
+                                'lab_guide_url': url_for('view_lab_guide', guide_id=lab_guide.id)})
+
+        except Exception as e:
+            db.session.rollback()
+            app.logger.exception('Error streaming lab guide')
+            yield _sse('error', {'error': f'Error al generar la guía de laboratorio: {str(e)}'})
+
+    return Response(stream_with_context(generate()),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def _flag(params, name, default):
+    """
+    Read a boolean parameter of a JSON body or a form.
+
+    JSON booleans are taken as they are and strings such as 'true', '1' or
+    'on' and 'false', '0', 'off' or '' are parsed; a missing parameter is
+    default. Returns None for any other value.
+    """
+    value = params.get(name)
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in ('1', 'true', 'yes', 'on'):
+        return True
+    if value in ('0', 'false', 'no', 'off', ''):
+        return False
+    return None
+
+@app.route('/api/subjects/<int:subject_id>/generate-guides', methods=['POST'])
+@login_required
+def generate_subject_guides(subject_id):
+    """API endpoint to generate a draft for every weekly topic of a subject"""
+    subject = Subject.query.get_or_404(subject_id)
+    if not can_access_subject(subject):
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    params = request.get_json(silent=True) or request.form
+    try:
+        estimated_duration = int(params.get('estimated_duration', 120))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'La duración estimada debe ser un número entero.'}), 400
+    skip_cache = _flag(params, 'skip_cache', False)
+    skip_existing = _flag(params, 'skip_existing', True)
+    sectioned = _flag(params, 'sectioned', app.config['AI_GENERATION_MODE'] == 'sectioned')
+    if None in (skip_cache, skip_existing, sectioned):
+        return jsonify({'error': 'skip_cache, skip_existing y sectioned deben ser true o false.'}), 400
+
+    jobs = enqueue_subject_jobs(
+        subject,
+        current_user,
+        difficulty_level=params.get('difficulty_level', 'intermediate'),
+        estimated_duration=estimated_duration,
+        use_cache=not skip_cache,
+        skip_existing=skip_existing,
+        sectioned=sectioned
+    )
+    if jobs:
+        generation_pool.submit_bulk([job.id for job in jobs])
+
+    return jsonify({
+        'subject_id': subject.id,
+        'topics': [dict(vars(TopicResult.from_job(job)),
+                        status_url=url_for('get_generation_job', job_id=job.id))
+                   for job in jobs]
+    }), 202
+
+@app.route('/api/metrics/ai_cache')
+@login_required
+def get_ai_cache_metrics():
+    """API endpoint with the hit/miss counters of the AI response cache"""
+    try:
+        cache = get_ai_config().cache
+    except ValueError as e:
+        return jsonify({'enabled': False, 'error': str(e)})
+    if cache is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(cache.stats(), enabled=True))
+
+@app.route('/api/metrics/ai_endpoints')
+@login_required
+def get_ai_endpoint_metrics():
+    """API endpoint with the circuit breaker state of each AI endpoint"""
+    try:
+        router = get_ai_config().router
+    except ValueError as e:
+        return jsonify({'endpoints': [], 'error': str(e)})
+    return jsonify({'endpoints': router.stats()})
+
+@app.route('/api/metrics/pdf_render')
+@login_required
+def get_pdf_render_metrics():
+    """API endpoint with the queue depth and render times of the PDF render pool"""
+    return jsonify(render_pool.stats())
+
+@app.route('/api/metrics/pdf_cache')
+@login_required
+def get_pdf_cache_metrics():
+    """API endpoint with the hit/miss counters and size of the PDF cache"""
+    return jsonify(pdf_cache.stats())
+
+@app.route('/generation_job/<int:job_id>')
+@login_required
+def view_generation_job(job_id):
+    """Page that polls the status of a generation job until the guide is ready."""
+    job = GenerationJob.query.get_or_404(job_id)
+    if job.created_by_id != current_user.id:
+        flash('No tienes permiso para ver esta generación.', 'error')
+        return redirect(url_for('dashboard'))
+
+    return render_template('generation_job.html', job=job)
+
+@app.route('/api/generation_jobs/<int:job_id>')
+@login_required
+def get_generation_job(job_id):
+    """API endpoint to poll the status of a generation job"""
+    job = GenerationJob.query.get_or_404(job_id)
+    if job.created_by_id != current_user.id:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    return jsonify({
+        'id': job.id,
+        'status': job.status,
+        'progress': job.progress,
+        'error': job.error,
+        'lab_guide_id': job.lab_guide_id,
+        'lab_guide_url': url_for('view_lab_guide', guide_id=job.lab_guide_id) if job.lab_guide_id else None
+    })
+
 @app.route('/dashboard/manage_subjects', methods=['GET', 'POST'])
 @login_required
 def manage_subjects():
@@ -284,6 +564,7 @@ def manage_subjects():
                 # Associate subject with professor
                 current_user.subjects.append(subject)
                 db.session.commit()
+                forget_owned_subjects()
                 flash('Subject added successfully!', 'success')
 
             elif action == 'add_topic':
@@ -292,12 +573,17 @@ def manage_subjects():
                 subject = Subject.query.get_or_404(subject_id)
                 
                 # Verify subject ownership
-                if subject not in current_user.subjects:
+                if not can_access_subject(subject):
                     flash('You do not have permission to modify this subject.', 'error')
                     return redirect(url_for('manage_subjects'))
 
+                week_number = int(request.form.get('week_number'))
+                if WeeklyTopic.query.filter_by(subject_id=subject.id, week_number=week_number).first():
+                    flash(f'Week {week_number} already has a topic in this subject.', 'error')
+                    return redirect(url_for('manage_subjects'))
+
                 topic = WeeklyTopic(
-                    week_number=int(request.form.get('week_number')),
+                    week_number=week_number,
                     title=request.form.get('topic_title'),
                     description=request.form.get('topic_description'),
                     subject_id=subject_id
@@ -312,10 +598,11 @@ def manage_subjects():
                 topic = WeeklyTopic.query.get_or_404(topic_id)
                 
                 # Verify subject ownership
-                if topic.subject not in current_user.subjects:
+                if not can_access_subject(topic.subject_id):
                     flash('You do not have permission to delete this topic.', 'error')
                     return redirect(url_for('manage_subjects'))
 
+                delete_jobs(topic.subject_id, topic.id)
                 db.session.delete(topic)
                 db.session.commit()
                 flash('Weekly topic deleted successfully!', 'success')
@@ -326,7 +613,7 @@ def manage_subjects():
                 subject = Subject.query.get_or_404(subject_id)
                 
                 # Verify subject ownership
-                if subject not in current_user.subjects:
+                if not can_access_subject(subject):
                     flash('You do not have permission to delete this subject.', 'error')
                     return redirect(url_for('manage_subjects'))
 
@@ -337,11 +624,13 @@ def manage_subjects():
 
                 # Remove subject from professor's subjects
                 current_user.subjects.remove(subject)
-                # Delete all weekly topics associated with the subject
+                # Delete its generation jobs and all weekly topics associated with the subject
+                delete_jobs(subject.id)
                 WeeklyTopic.query.filter_by(subject_id=subject_id).delete()
                 # Delete the subject
                 db.session.delete(subject)
                 db.session.commit()
+                forget_owned_subjects()
                 flash('Subject and its weekly topics deleted successfully!', 'success')
 
             else:
@@ -374,7 +663,7 @@ def view_lab_guide(guide_id):
     lab_guide = LabGuide.query.get_or_404(guide_id)
     
     # Check if user has permission to view the guide
-    if not (current_user.user_type == 'professor' and lab_guide.subject in current_user.subjects):
+    if not can_access_guide(lab_guide):
         flash('No tienes permiso para ver esta guía de laboratorio.', 'error')
         return redirect(url_for('dashboard'))
     
@@ -387,11 +676,12 @@ def delete_lab_guide(guide_id):
     lab_guide = LabGuide.query.get_or_404(guide_id)
     
     # Check if user has permission to delete the guide
-    if not (current_user.user_type == 'professor' and lab_guide.subject in current_user.subjects):
+    if not can_access_guide(lab_guide):
         flash('No tienes permiso para eliminar esta guía de laboratorio.', 'error')
         return redirect(url_for('dashboard'))
     
     try:
+        detach_jobs(lab_guide.id)
         db.session.delete(lab_guide)
         db.session.commit()
         flash('Guía de laboratorio eliminada exitosamente.', 'success')
@@ -401,6 +691,46 @@ def delete_lab_guide(guide_id):
     
     return redirect(url_for('dashboard'))
 
+@app.route('/lab_guide/<int:guide_id>/clone', methods=['POST'])
+@login_required
+def clone_lab_guide(guide_id):
+    """Route to copy a lab guide as a new draft, optionally for another weekly topic of its subject."""
+    lab_guide = LabGuide.query.get_or_404(guide_id)
+
+    # Check if user has permission to copy the guide
+    if current_user.user_type != 'professor' or not can_access_guide(lab_guide):
+        flash('No tienes permiso para clonar esta guía de laboratorio.', 'error')
+        return redirect(url_for('dashboard'))
+
+    weekly_topic_id = request.form.get('weekly_topic_id', lab_guide.weekly_topic_id, type=int)
+    weekly_topic = WeeklyTopic.query.get_or_404(weekly_topic_id)
+    if weekly_topic.subject_id != lab_guide.subject_id:
+        flash('El tema semanal seleccionado no pertenece a la materia.', 'error')
+        return redirect(url_for('view_lab_guide', guide_id=lab_guide.id))
+
+    try:
+        clone = LabGuide(
+            subject_id=lab_guide.subject_id,
+            weekly_topic_id=weekly_topic.id,
+            title=lab_guide.title,
+            content=lab_guide.content,
+            lab_number=request.form.get('lab_number', lab_guide.lab_number, type=int),
+            difficulty_level=lab_guide.difficulty_level,
+            estimated_duration=lab_guide.estimated_duration,
+            status='draft',
+            laboratory_id=lab_guide.laboratory_id,
+            created_by_id=current_user.id
+        )
+        guide_similarity.remember(clone, request.form.get('additional_notes'))
+        db.session.add(clone)
+        db.session.commit()
+        flash('Guía de laboratorio clonada como borrador.', 'success')
+        return redirect(url_for('view_lab_guide', guide_id=clone.id))
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error al clonar la guía de laboratorio: {str(e)}', 'error')
+        return redirect(url_for('view_lab_guide', guide_id=lab_guide.id))
+
 @app.route('/lab_guide/<int:guide_id>/pdf')
 @login_required
 def download_lab_guide_pdf(guide_id):
@@ -409,154 +739,116 @@ def download_lab_guide_pdf(guide_id):
         lab_guide = LabGuide.query.get_or_404(guide_id)
         
         # Check if user has permission to view the guide
-        if not (current_user.user_type == 'professor' and lab_guide.subject in current_user.subjects):
+        if not can_access_guide(lab_guide):
             flash('No tienes permiso para descargar esta guía de laboratorio.', 'error')
             return redirect(url_for('dashboard'))
         
-        # Create a BytesIO buffer to store the PDF
-        buffer = BytesIO()
-        
-        # Create the PDF document
-        doc = SimpleDocTemplate(
-            buffer,
-            pagesize=A4,
-            rightMargin=2.5*cm,
-            leftMargin=2.5*cm,
-            topMargin=2.5*cm,
-            bottomMargin=2.5*cm
-        )
-        
-        # Create styles
-        styles = getSampleStyleSheet()
-        styles.add(ParagraphStyle(
-            name='Header',
-            parent=styles['Heading1'],
-            fontSize=18,
-            spaceAfter=30,
-            alignment=1,  # Center alignment
-            textColor=colors.HexColor('#003366')
-        ))
-        styles.add(ParagraphStyle(
-            name='SubHeader',
-            parent=styles['Heading2'],
-            fontSize=14,
-            spaceAfter=20,
-            alignment=1,
-            textColor=colors.HexColor('#003366')
-        ))
-        styles.add(ParagraphStyle(
-            name='CustomBodyText',
-            parent=styles['Normal'],
-            fontSize=11,
-            spaceAfter=12,
-            leading=14
-        ))
-        
-        # Build the PDF content
-        story = []
-        
-        # Add logo if it exists
-        logo_path = os.path.join(os.path.dirname(__file__), 'static', 'images', 'logou.png')
-        if os.path.exists(logo_path):
+        # Guides are rendered once per version and then served from the cache. Only the
+        # ETag is validated: renaming the subject or author changes it, not updated_at
+        cache_key = pdf_cache.key(lab_guide)
+        if not is_resource_modified(request.environ, etag=cache_key):
+            response = Response(status=304)
+            response.set_etag(cache_key)
+            return response
+
+        path = pdf_cache.path_for(cache_key)
+        if path is None:
+            # Rendering is CPU-bound: a render process writes the PDF straight into the cache
             try:
-                img = Image(logo_path)
-                # Scale image to reasonable size while maintaining aspect ratio
-                img.drawHeight = 2*cm
-                img.drawWidth = 2*cm
-                img.hAlign = 'CENTER'
-                story.append(img)
-                story.append(Spacer(1, 20))
-            except Exception as e:
-                print(f"Error loading logo: {str(e)}")
-                flash('Error loading university logo.', 'warning')
-        else:
-            flash('University logo file not found at {logo_path}.', 'warning')
-        
-        # Add header information
-        story.append(Paragraph("Universidad Cooperativa de Colombia", styles['Header']))
-        story.append(Paragraph(current_user.department, styles['SubHeader']))
-        story.append(Spacer(1, 20))
-        
-        # Add subject information
-        story.append(Paragraph(f"<b>Asignatura:</b> {lab_guide.subject.code} - {lab_guide.subject.name}", styles['CustomBodyText']))
-        story.append(Paragraph(f"<b>Laboratorio:</b> {lab_guide.title}", styles['CustomBodyText']))
-        story.append(Paragraph(f"<b>Docente:</b> {current_user.username}", styles['CustomBodyText']))
-        story.append(Paragraph(f"<b>Semestre:</b> 2024-1", styles['CustomBodyText']))
-        story.append(Spacer(1, 30))
-        
-        # Add a single line
-        story.append(Paragraph("_" * 80, styles['CustomBodyText']))
-        story.append(Spacer(1, 20))
-        
-        # Process the content to remove duplicates and clean up formatting
-        content = lab_guide.content
-        
-        # Remove institutional header section
-        if '<div class="institutional-header">' in content:
-            content = content.split('<div class="lab-guide-content">')[-1]
-        
-        # Remove HTML tags and clean up the content
-        content = content.replace('<div class="lab-guide-content">', '')
-        content = content.replace('</div>', '')
-        content = content.replace('<h2>', '\n\n').replace('</h2>', '\n')
-        content = content.replace('<h3>', '\n').replace('</h3>', '\n')
-        content = content.replace('<p>', '').replace('</p>', '\n')
-        content = content.replace('<br>', '\n')
-        
-        # Remove duplicate lines and clean up spacing
-        paragraphs = []
-        seen_lines = set()
-        for para in content.split('\n'):
-            para = para.strip()
-            # Also remove lines that consist only of underscores
-            if para and para not in seen_lines and not (para.startswith('_') and all(c == '_' for c in para)):
-                seen_lines.add(para)
-                paragraphs.append(para)
-        
-        # Add processed content to PDF
-        for para in paragraphs:
-            story.append(Paragraph(para, styles['CustomBodyText']))
-        
-        # Add footer with generation date
-        story.append(Spacer(1, 30))
-        story.append(Paragraph("_" * 80, styles['CustomBodyText']))
-        story.append(Paragraph(f"Documento generado el {datetime.now().strftime('%d/%m/%Y %H:%M')}", 
-                             ParagraphStyle(
-                                 name='Footer',
-                                 parent=styles['Normal'],
-                                 fontSize=9,
-                                 textColor=colors.gray,
-                                 alignment=1
-                             )))
+                path = render_pool.render(GuideSnapshot.from_lab_guide(lab_guide, cache_key), pdf_cache.path(cache_key))
+            except RenderPoolSaturated as e:
+                response = Response('El servidor está generando muchos documentos. Intente de nuevo en unos segundos.',
+                                    status=503, mimetype='text/plain')
+                response.headers['Retry-After'] = str(e.retry_after)
+                return response
+            pdf_cache.added(cache_key)
         
-        # Build the PDF
-        doc.build(story)
-        
-        # Get the value of the BytesIO buffer
-        pdf = buffer.getvalue()
-        buffer.close()
-        
-        # Create the response
+        # Serve the cached file itself: the server streams it (or hands it to the
+        # front-end server with USE_X_SENDFILE) without loading it into memory
         response = send_file(
-            BytesIO(pdf),
+            path,
             mimetype='application/pdf',
             as_attachment=True,
-            download_name=f'guia_laboratorio_{lab_guide.title.lower().replace(" ", "_")}.pdf'
+            download_name=f'guia_laboratorio_{lab_guide.title.lower().replace(" ", "_")}.pdf',
+            etag=cache_key,
+            conditional=True
         )
+        # Downloads require a login: browsers may keep a copy but must revalidate it
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
         
         return response
         
     except Exception as e:
-        print(f"Error generating PDF: {str(e)}")  # Debug log
+        app.logger.exception('Error generating PDF of lab guide %s', guide_id)
         flash(f'Error al generar el PDF: {str(e)}', 'error')
         return redirect(url_for('view_lab_guide', guide_id=guide_id))
 
+def _export_response(subject_ids, download_name):
+    """Stream a ZIP with the PDFs of every guide of the given subjects."""
+    snapshots = snapshot_guides(guides_for_subjects(subject_ids), pdf_cache)
+    if not snapshots:
+        flash('No hay guías de laboratorio para exportar.', 'info')
+        return redirect(url_for('dashboard'))
+
+    # The dashboard passes an ID of its choosing to follow the export with /api/exports/<export_id>
+    export_id = request.args.get('export_id', '')
+    report = None
+    if EXPORT_ID_RE.match(export_id):
+        report = export_progress.start(current_user.id, export_id, len(snapshots))
+
+    def log_progress(progress):
+        if report is not None:
+            report(progress)
+        if progress.done % 10 == 0 or progress.done == progress.total:
+            app.logger.info('PDF export %s: %d/%d (%d rendered, %d cached, %d failed)', download_name,
+                            progress.done, progress.total, progress.rendered, progress.cached, progress.failed)
+
+    return Response(
+        stream_export_zip(snapshots, pdf_cache, render_pool, progress=log_progress),
+        mimetype='application/zip',
+        headers={
+            'Content-Disposition': f'attachment; filename="{download_name}"',
+            'X-Export-Total': str(len(snapshots)),
+        }
+    )
+
+@app.route('/api/exports/<export_id>')
+@login_required
+def get_export_progress(export_id):
+    """API endpoint to poll the progress of a ZIP export downloaded with ?export_id=<export_id>"""
+    progress = export_progress.get(current_user.id, export_id) if EXPORT_ID_RE.match(export_id) else None
+    if progress is None:
+        return jsonify({'error': 'Not found'}), 404
+    return jsonify(progress)
+
+@app.route('/subject/<int:subject_id>/lab_guides.zip')
+@login_required
+def export_subject_guides(subject_id):
+    """Download every lab guide of a subject as a ZIP of PDFs."""
+    subject = Subject.query.get_or_404(subject_id)
+    if not can_access_subject(subject):
+        flash('No tienes permiso para exportar las guías de esta materia.', 'error')
+        return redirect(url_for('dashboard'))
+    return _export_response([subject.id], f'guias_{subject.code}.zip')
+
+@app.route('/dashboard/lab_guides.zip')
+@login_required
+def export_professor_guides():
+    """Download every lab guide of the current professor's subjects as a ZIP of PDFs."""
+    if current_user.user_type != 'professor':
+        flash('Solo los profesores pueden exportar guías de laboratorio.', 'error')
+        return redirect(url_for('dashboard'))
+    subject_ids = sorted(owned_subject_ids())
+    return _export_response(subject_ids, f'guias_{current_user.username}.zip')
+
 # Create database tables
 with app.app_context():
     db.create_all()
 
-    # Only add sample data if DB is empty
-    if not User.query.first():
+    # Only add sample data if DB is empty (reading only the ID, so that
+    # `flask db upgrade` can load the app before new user columns exist)
+    if not db.session.query(User.id).first():
         prof = Professor(
             username='drsmith',
             email='drsmith@university.edu',
@@ -566,5 +858,85 @@ with app.app_context():
         db.session.add(prof)
         db.session.commit()
 
-if __name__ == '__main__':
-    app.run(debug=True)
+@app.cli.command('generate-subject-guides')
+@click.argument('subject_code')
+@click.option('--professor', 'username', required=True, help='Username of the professor who owns the drafts.')
+@click.option('--difficulty', 'difficulty_level', default='intermediate', show_default=True)
+@click.option('--duration', 'estimated_duration', default=120, show_default=True, help='Estimated duration in minutes.')
+@click.option('--all-topics', is_flag=True, help='Also regenerate topics that already have a guide.')
+@click.option('--no-cache', is_flag=True, help='Do not reuse earlier identical generations.')
+@click.option('--sectioned/--single', default=None, help='Generate each guide section by section.')
+def generate_subject_guides_command(subject_code, username, difficulty_level, estimated_duration, all_topics, no_cache,
+                                    sectioned):
+    """Generate lab guide drafts for every weekly topic of a subject."""
+    subject = Subject.query.filter_by(code=subject_code).first()
+    professor = Professor.query.filter_by(username=username).first()
+    if subject is None or professor is None:
+        raise click.ClickException('Unknown subject code or professor username.')
+
+    jobs = enqueue_subject_jobs(subject, professor,
+                                difficulty_level=difficulty_level,
+                                estimated_duration=estimated_duration,
+                                use_cache=not no_cache,
+                                skip_existing=not all_topics,
+                                sectioned=(app.config['AI_GENERATION_MODE'] == 'sectioned'
+                                           if sectioned is None else sectioned))
+    print(f'Generating {len(jobs)} lab guide(s) for {subject.code} - {subject.name}...')
+    results = run_bulk_jobs([job.id for job in jobs])
+
+    for result in results:
+        outcome = f'guide {result.lab_guide_id}' if result.lab_guide_id else f'FAILED: {result.error}'
+        print(f'  Week {result.week_number:>2} {result.topic_title}: {outcome}')
+    failed = sum(1 for result in results if result.status != 'succeeded')
+    print(f'{len(results) - failed} succeeded, {failed} failed.')
+
+@app.cli.command('export-guides')
+@click.argument('output', type=click.Path(dir_okay=False, writable=True))
+@click.option('--subject', 'subject_code', help='Export the guides of this subject code.')
+@click.option('--professor', 'username', help='Export the guides of every subject of this professor.')
+@click.option('--workers', type=int, default=None,
+              help='Render processes of this command (defaults to PDF_RENDER_WORKERS).')
+def export_guides_command(output, subject_code, username, workers):
+    """Export lab guides as a ZIP of PDFs."""
+    if bool(subject_code) == bool(username):
+        raise click.UsageError('Pass exactly one of --subject or --professor.')
+    if subject_code:
+        subject = Subject.query.filter_by(code=subject_code).first()
+        if subject is None:
+            raise click.ClickException('Unknown subject code.')
+        subject_ids = [subject.id]
+    else:
+        professor = Professor.query.filter_by(username=username).first()
+        if professor is None:
+            raise click.ClickException('Unknown professor username.')
+        subject_ids = sorted(owned_subject_ids(professor))
+
+    snapshots = snapshot_guides(guides_for_subjects(subject_ids), pdf_cache)
+    if workers:
+        # The command has its own render pool, which has not started any process yet
+        render_pool.max_workers = workers
+    print(f'Exporting {len(snapshots)} lab guide(s) to {output}...')
+
+    def show_progress(progress):
+        print(f'  [{progress.done}/{progress.total}] {progress.current}')
+
+    with open(output, 'wb') as f:
+        for chunk in stream_export_zip(snapshots, pdf_cache, render_pool, progress=show_progress):
+            f.write(chunk)
+    print('Done.')
+
+@app.cli.command('index-guides')
+@click.option('--batch-size', default=500, show_default=True, help='Guides indexed per batch.')
+def index_guides_command(batch_size):
+    """Rebuild the full-text search index and sign the lab guides that have no similarity signature."""
+    print(f'Signed {guide_similarity.rebuild(batch_size)} lab guide(s) for similarity checks.')
+    if not search_index.available:
+        raise click.ClickException('Full-text search needs an SQLite database with FTS5.')
+    print(f'Indexed {search_index.rebuild(batch_size)} lab guide(s).')
+
+@app.cli.command('resume-generation-jobs')
+def resume_generation_jobs():
+    """Run the generation jobs that are still queued."""
+    job_ids = generation_pool.resume_pending()
+    print(f'Resumed {len(job_ids)} generation job(s).')
+    generation_pool.shutdown(wait=True)
@@ -0,0 +1,75 @@
+"""
+Authorization Module
+
+This module answers whether a user may access a subject or a lab guide.
+Professors may access the subjects they teach and the guides of those
+subjects. The IDs of the subjects a professor teaches are read with one
+query on the indexed professor_subject table the first time a request
+needs them and memoized on flask.g, so routes and templates can check
+ownership as often as they need without loading the subjects themselves.
+"""
+
+from typing import FrozenSet, Union
+
+from flask import g
+from flask_login import current_user
+
+from models import db, professor_subject, Subject, LabGuide
+
+
+def owned_subject_ids(user=None) -> FrozenSet[int]:
+    """
+    IDs of the subjects a user teaches, read once per request.
+
+    Args:
+        user: The user to check (defaults to current_user)
+
+    Returns:
+        frozenset: Subject IDs; empty for anonymous users and non-professors
+    """
+    user = current_user if user is None else user
+    if not user.is_authenticated or user.user_type != 'professor':
+        return frozenset()
+    # The session principal (see identity) already carries them
+    subject_ids = getattr(user, 'subject_ids', None)
+    if subject_ids is not None:
+        return subject_ids
+    memo = g.setdefault('_owned_subject_ids', {})
+    if user.id not in memo:
+        memo[user.id] = frozenset(
+            subject_id for (subject_id,) in db.session.query(professor_subject.c.subject_id)
+            .filter(professor_subject.c.professor_id == user.id)
+        )
+    return memo[user.id]
+
+
+def forget_owned_subjects():
+    """Drop the memoized subject IDs after the subjects of a professor changed."""
+    g.pop('_owned_subject_ids', None)
+
+
+def can_access_subject(subject: Union[Subject, int, str], user=None) -> bool:
+    """
+    Whether a user may access a subject.
+
+    Args:
+        subject: The Subject or its ID
+        user: The user to check (defaults to current_user)
+    """
+    subject_id = subject.id if isinstance(subject, Subject) else subject
+    try:
+        return int(subject_id) in owned_subject_ids(user)
+    except (TypeError, ValueError):
+        return False
+
+
+def can_access_guide(lab_guide: LabGuide, user=None) -> bool:
+    """
+    Whether a user may access a lab guide, i.e. the subject it belongs to.
+
+    Args:
+        lab_guide: The LabGuide (only its subject_id is read)
+        user: The user to check (defaults to current_user)
+    """
+    return can_access_subject(lab_guide.subject_id, user)
+
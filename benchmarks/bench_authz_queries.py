@@ -0,0 +1,76 @@
+"""
+Benchmark: queries issued by ownership checks.
+
+Seeds an in-memory database with a professor teaching a growing number of
+subjects and, inside one request, checks access to a guide several times
+(as a route and its template do): once with `lab_guide.subject in
+professor.subjects`, as the routes used to, and once with authz.
+tests/test_authz_queries.py checks that authz needs one query per
+request.
+
+    python benchmarks/bench_authz_queries.py --subjects 1 10 200 --checks 3
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from authz import can_access_guide  # noqa: E402
+from benchmarks.support import count_queries, create_app, seed_professor  # noqa: E402
+from models import db, Professor, LabGuide  # noqa: E402
+
+
+def seed(subject_counts) -> dict:
+    """Create one professor per subject count and return their ids with the id of their last guide."""
+    ids = {}
+    for count in subject_counts:
+        professor = seed_professor(f'prof{count}', count, guides=1)
+        last_guide = LabGuide.query.filter_by(created_by_id=professor.id).order_by(LabGuide.id.desc()).first()
+        ids[count] = (professor.id, last_guide.id)
+    return ids
+
+
+def check_dynamic(professor, lab_guide) -> bool:
+    return professor.user_type == 'professor' and lab_guide.subject in professor.subjects
+
+
+def check_authz(professor, lab_guide) -> bool:
+    return can_access_guide(lab_guide, professor)
+
+
+def measure(app, check, professor_id: int, guide_id: int, checks: int):
+    """Run the checks of one request; the user and guide are loaded beforehand as in the routes."""
+    db.session.expunge_all()
+    with app.test_request_context():
+        professor = db.session.get(Professor, professor_id)
+        lab_guide = db.session.get(LabGuide, guide_id)
+        start = time.perf_counter()
+        with count_queries() as statements:
+            allowed = all(check(professor, lab_guide) for _ in range(checks))
+    assert allowed
+    return len(statements), (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--subjects', type=int, nargs='+', default=[1, 10, 200])
+    parser.add_argument('--checks', type=int, default=3, help='Checks per request')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        ids = seed(args.subjects)
+
+        for subjects, (professor_id, guide_id) in ids.items():
+            dynamic_queries, dynamic_ms = measure(app, check_dynamic, professor_id, guide_id, args.checks)
+            authz_queries, authz_ms = measure(app, check_authz, professor_id, guide_id, args.checks)
+            print(f'{subjects:4d} subjects   subject in professor.subjects {dynamic_queries:3d} queries '
+                  f'{dynamic_ms:7.2f} ms   authz {authz_queries:3d} queries {authz_ms:7.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
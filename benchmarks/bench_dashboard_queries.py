@@ -0,0 +1,63 @@
+"""
+Benchmark: queries issued to build the professor dashboard.
+
+Seeds an in-memory database with professors teaching a growing number of
+subjects and counts the SQL statements needed to load the dashboard, once
+through the lazy='dynamic' relationships (as the template used to do) and
+once with load_subject_cards. tests/test_dashboard_queries.py checks
+that the latter stays constant.
+
+    python benchmarks/bench_dashboard_queries.py --subjects 1 10 50
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.support import count_queries, create_app, seed_professor  # noqa: E402
+from dashboard_views import load_subject_cards  # noqa: E402
+from models import db, Professor, WeeklyTopic  # noqa: E402
+
+
+def load_dynamic(professor_id: int):
+    """What the dashboard template did through the dynamic relationships."""
+    professor = db.session.get(Professor, professor_id)
+    for subject in professor.subjects.all():
+        if subject.weekly_topics.count() > 0:
+            list(subject.weekly_topics.order_by(WeeklyTopic.week_number))
+        subject.lab_guides.all()
+
+
+def measure(load, professor_id: int):
+    db.session.expunge_all()
+    start = time.perf_counter()
+    with count_queries() as statements:
+        load(professor_id)
+    return len(statements), (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--subjects', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--topics', type=int, default=16)
+    parser.add_argument('--guides', type=int, default=8)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        professor_ids = {subjects: seed_professor(f'prof{subjects}', subjects, args.topics, args.guides).id
+                         for subjects in args.subjects}
+
+        for subjects, professor_id in professor_ids.items():
+            dynamic_queries, dynamic_ms = measure(load_dynamic, professor_id)
+            card_queries, card_ms = measure(load_subject_cards, professor_id)
+            print(f'{subjects:4d} subjects   dynamic {dynamic_queries:5d} queries {dynamic_ms:8.1f} ms   '
+                  f'subject cards {card_queries:3d} queries {card_ms:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark: guide formatting time as the AI output grows.
+
+Builds AI-like outputs of increasing size (sections, subsections,
+paragraphs and lists with some inline markdown) and times
+format_generated_guide and clean_markdown_formatting on each, printing
+the time per 100 KB of input. Linear scaling shows as a flat column.
+
+    python benchmarks/bench_formatter.py --sizes 100 1000 10000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lab_guide_format import clean_markdown_formatting, format_generated_guide  # noqa: E402
+
+SECTION = """OBJETIVOS
+Objetivo general:
+Comprender el funcionamiento de un **perceptron** y aplicarlo a datos reales & simulados.
+- Implementar el algoritmo en `numpy` paso a paso
+- Comparar resultados con [scikit-learn](https://scikit-learn.org)
+
+PROCEDIMIENTO
+Paso a paso:
+1. Cargar el conjunto de datos <iris> y normalizar las columnas.
+2. Entrenar el modelo durante *diez* epocas y registrar el error.
+"""
+
+MARKDOWN_SECTION = """## Objetivos
+### Objetivo general
+Comprender el funcionamiento de un **perceptron** y aplicarlo a datos reales & simulados.
+- Implementar el algoritmo en `numpy` paso a paso
+- Comparar resultados con [scikit-learn](https://scikit-learn.org)
+
+```
+w = w + lr * (y - y_hat) * x
+```
+"""
+
+
+def sample(section: str, kilobytes: int) -> str:
+    return section * max(1, kilobytes * 1024 // len(section))
+
+
+def timed(function, text: str, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000], help='Input sizes in KB')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    def generated(text):
+        return format_generated_guide(text, 'Ingenieria', 'CS101', 'Introduccion', 'Guia', 'drsmith')
+
+    for kilobytes in args.sizes:
+        plain, markdown = sample(SECTION, kilobytes), sample(MARKDOWN_SECTION, kilobytes)
+        generated_s = timed(generated, plain, args.repeat)
+        markdown_s = timed(clean_markdown_formatting, markdown, args.repeat)
+        print(f'{kilobytes:6d} KB   format_generated_guide {generated_s * 1000:9.1f} ms '
+              f'({generated_s * 1000 * 100 / kilobytes:6.2f} ms/100 KB)   '
+              f'clean_markdown_formatting {markdown_s * 1000:9.1f} ms '
+              f'({markdown_s * 1000 * 100 / kilobytes:6.2f} ms/100 KB)')
+
+
+if __name__ == '__main__':
+    main()
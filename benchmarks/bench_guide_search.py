@@ -0,0 +1,140 @@
+"""
+Benchmark: keyword search over lab guides, LIKE scans against FTS5.
+
+Seeds a SQLite file with lab guides of a few KB each (HTML content as
+stored by the app), all owned by one professor, and builds the full-text
+index with GuideSearch.rebuild, as `flask index-guides` does. Each query
+is then run as the LIKE '%word%' scan over titles, contents and topics
+that the schema allowed until now, both stopping at the first 20 rows
+(unranked) and reading every match (as any ranking needs), and through
+GuideSearch.search (ranked first page, with snippets). Words are drawn
+with Zipf frequencies, so the first queries match almost every guide
+and are the worst case for ranking.
+
+    python benchmarks/bench_guide_search.py --guides 2000 20000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from sqlalchemy import or_  # noqa: E402
+
+from guide_search import GuideSearch  # noqa: E402
+from lab_guide_format import format_generated_guide  # noqa: E402
+from models import db, professor_subject, Professor, User, Subject, WeeklyTopic, LabGuide  # noqa: E402
+
+ROOTS = ('red neuronal perceptron regresion lineal clasificacion arbol decision bosque aleatorio '
+         'gradiente descenso funcion perdida activacion capa convolucion imagen texto token '
+         'embedding atencion transformador entrenamiento validacion prueba metrica precision '
+         'recall matriz confusion sobreajuste regularizacion normalizacion lote epoca').split()
+# 2000 terms used with Zipf frequencies, so that queries range from common to rare words
+WORDS = [root + suffix for suffix in ('', 'es', 'al', 'ado', 'ico', 'ismo', 'ista', 'ura', 'ivo', 'ion')
+         for root in ROOTS] + [f'{root}{n}' for n in range(40) for root in ROOTS]
+WEIGHTS = [1 / rank for rank in range(1, len(WORDS) + 1)]
+QUERIES = (WORDS[0], WORDS[30], WORDS[300], f'{WORDS[5]} {WORDS[40]}', f'{WORDS[1500][:-2]}*', 'inexistente')
+SUBJECTS = 20
+TOPICS = 16
+
+
+def words(rng: random.Random, count: int) -> str:
+    return ' '.join(rng.choices(WORDS, WEIGHTS, k=count))
+
+
+def guide_text(rng: random.Random) -> str:
+    sections = []
+    for section in ('OBJETIVOS', 'MARCO TEORICO', 'PROCEDIMIENTO', 'RESULTADOS ESPERADOS'):
+        sections.append(section)
+        for _ in range(rng.randint(3, 6)):
+            sections.append(words(rng, rng.randint(12, 30)).capitalize() + '.')
+        sections.append('')
+    return '\n'.join(sections)
+
+
+def seed(guides: int):
+    rng = random.Random(0)
+    connection = db.session.connection()
+    connection.execute(User.__table__.insert(), [{'id': 1, 'username': 'prof', 'email': 'prof@example.com',
+                                                  'password_hash': '-', 'user_type': 'professor'}])
+    connection.execute(Professor.__table__.insert(), [{'id': 1, 'department': 'Ingenieria'}])
+    connection.execute(Subject.__table__.insert(), [
+        {'id': s, 'code': f'S{s}', 'name': f'Materia {s}', 'credits': 3} for s in range(1, SUBJECTS + 1)
+    ])
+    connection.execute(professor_subject.insert(), [
+        {'professor_id': 1, 'subject_id': s} for s in range(1, SUBJECTS + 1)
+    ])
+    connection.execute(WeeklyTopic.__table__.insert(), [
+        {'id': (s - 1) * TOPICS + w, 'subject_id': s, 'week_number': w,
+         'title': words(rng, 2).capitalize(), 'description': words(rng, 20)}
+        for s in range(1, SUBJECTS + 1) for w in range(1, TOPICS + 1)
+    ])
+    rows = []
+    for g in range(guides):
+        subject_id = g % SUBJECTS + 1
+        title = f'Laboratorio de {words(rng, 2)} {g}'
+        rows.append({'title': title, 'lab_number': g % TOPICS + 1, 'subject_id': subject_id,
+                     'weekly_topic_id': (subject_id - 1) * TOPICS + g % TOPICS + 1,
+                     'created_by_id': 1, 'status': 'draft', 'difficulty_level': 'intermediate',
+                     'content': format_generated_guide(guide_text(rng), 'Ingenieria', f'S{subject_id}',
+                                                       f'Materia {subject_id}', title, 'prof')})
+    connection.execute(LabGuide.__table__.insert(), rows)
+    db.session.commit()
+
+
+def like_search(terms: str, subject_ids, limit=None) -> list:
+    query = (db.session.query(LabGuide.id)
+             .join(WeeklyTopic, WeeklyTopic.id == LabGuide.weekly_topic_id)
+             .filter(LabGuide.subject_id.in_(subject_ids)))
+    for word in terms.split():
+        pattern = f'%{word.rstrip("*")}%'
+        query = query.filter(or_(LabGuide.title.like(pattern), LabGuide.content.like(pattern),
+                                 WeeklyTopic.title.like(pattern), WeeklyTopic.description.like(pattern)))
+    return query.limit(limit).all()
+
+
+def timed(function, repeat: int = 5) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--guides', type=int, nargs='+', default=[2000, 20000])
+    args = parser.parse_args()
+
+    for guides in args.guides:
+        with tempfile.TemporaryDirectory() as directory:
+            app = Flask(__name__)
+            app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(directory, "bench.db")}'
+            db.init_app(app)
+            with app.app_context():
+                db.create_all()
+                search = GuideSearch(app)
+                seed(guides)
+                start = time.perf_counter()
+                search.rebuild()
+                print(f'{guides} guides: index built in {time.perf_counter() - start:.2f} s')
+
+                subject_ids = list(range(1, SUBJECTS + 1))
+                for terms in QUERIES:
+                    first_s = timed(lambda: like_search(terms, subject_ids, 20))
+                    all_s = timed(lambda: like_search(terms, subject_ids))
+                    fts_s = timed(lambda: search.search(terms, subject_ids))
+                    print(f'  {terms!r:<28} LIKE first 20 {first_s * 1000:8.2f} ms   '
+                          f'LIKE all {all_s * 1000:8.2f} ms ({len(like_search(terms, subject_ids)):5d} rows)   '
+                          f'FTS5 ranked page {fts_s * 1000:8.2f} ms')
+                db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark: near-duplicate lookups before generating a lab guide.
+
+Seeds a SQLite file with guides and the signatures of the requests they
+came from (a title and notes built from a topic vocabulary), spread over
+a number of subjects. It then looks up requests that are edits of
+existing ones (accents, case, a few changed words) and requests for new
+guides. Each lookup is done with guide_similarity.find_similar (LSH
+bands) and by comparing the request with every signature of the
+subject. It prints the time per lookup and how many edited requests
+found their original both ways (edits of short requests can fall below
+the threshold, so the full scan misses some too).
+
+    python benchmarks/bench_guide_similarity.py --guides 10000 50000 --subjects 50
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+
+import guide_similarity  # noqa: E402
+from models import db, Professor, User, Subject, WeeklyTopic, LabGuide, LabGuideBand, LabGuideSignature  # noqa: E402
+
+WORDS = ('red neuronal perceptron regresion lineal clasificacion arbol decision bosque aleatorio '
+         'gradiente descenso funcion perdida activacion capa convolucion imagen texto token '
+         'embedding atencion transformador entrenamiento validacion prueba metrica precision '
+         'recall matriz confusion sobreajuste regularizacion normalizacion lote epoca numpy '
+         'pandas sklearn pytorch dataset iris mnist cifar circuito osciloscopio resistencia').split()
+TOPICS = 16
+
+
+def request(rng: random.Random):
+    title = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 6))).capitalize()
+    notes = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(0, 12)))
+    return title, notes
+
+
+def edit(rng: random.Random, title: str, notes: str):
+    """The same request typed again: other case, an accent, one word of the notes changed."""
+    words = notes.split()
+    if words:
+        words[rng.randrange(len(words))] = rng.choice(WORDS)
+    return title.upper().replace('ON', 'ÓN', 1), ' '.join(words) + '.'
+
+
+def seed(guides: int, subjects: int, rng: random.Random) -> list:
+    connection = db.session.connection()
+    connection.execute(User.__table__.insert(), [{'id': 1, 'username': 'prof', 'email': 'prof@example.com',
+                                                  'password_hash': '-', 'user_type': 'professor'}])
+    connection.execute(Professor.__table__.insert(), [{'id': 1, 'department': 'Ingenieria'}])
+    connection.execute(Subject.__table__.insert(), [
+        {'id': s, 'code': f'S{s}', 'name': f'Materia {s}', 'credits': 3} for s in range(1, subjects + 1)
+    ])
+    connection.execute(WeeklyTopic.__table__.insert(), [
+        {'id': (s - 1) * TOPICS + w, 'subject_id': s, 'week_number': w, 'title': f'Tema {w}'}
+        for s in range(1, subjects + 1) for w in range(1, TOPICS + 1)
+    ])
+    requests, guide_rows, signature_rows, band_rows = [], [], [], []
+    for guide_id in range(1, guides + 1):
+        subject_id = guide_id % subjects + 1
+        topic_id = (subject_id - 1) * TOPICS + guide_id % TOPICS + 1
+        title, notes = request(rng)
+        requests.append((guide_id, subject_id, topic_id, title, notes))
+        signature = guide_similarity.minhash(guide_similarity.request_text(title, notes))
+        guide_rows.append({'id': guide_id, 'title': title, 'content': '<p>x</p>', 'lab_number': 1,
+                           'subject_id': subject_id, 'weekly_topic_id': topic_id, 'created_by_id': 1,
+                           'status': 'draft', 'difficulty_level': 'intermediate'})
+        signature_rows.append({'lab_guide_id': guide_id,
+                               'minhash': guide_similarity._PACKING.pack(*signature)})
+        band_rows.extend({'band_key': key, 'lab_guide_id': guide_id}
+                         for key in set(guide_similarity.band_keys(signature, subject_id)))
+    connection.execute(LabGuide.__table__.insert(), guide_rows)
+    connection.execute(LabGuideSignature.__table__.insert(), signature_rows)
+    connection.execute(LabGuideBand.__table__.insert(), band_rows)
+    db.session.commit()
+    return requests
+
+
+def brute_force(subject_id: int, title: str, notes: str, threshold: float) -> list:
+    signature = guide_similarity.minhash(guide_similarity.request_text(title, notes))
+    rows = (db.session.query(LabGuideSignature.lab_guide_id, LabGuideSignature.minhash)
+            .join(LabGuide, LabGuide.id == LabGuideSignature.lab_guide_id)
+            .filter(LabGuide.subject_id == subject_id))
+    return [lab_guide_id for lab_guide_id, packed in rows
+            if guide_similarity.similarity(signature, guide_similarity._PACKING.unpack(packed)) >= threshold]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--guides', type=int, nargs='+', default=[10000, 50000])
+    parser.add_argument('--subjects', type=int, default=50)
+    parser.add_argument('--lookups', type=int, default=200)
+    parser.add_argument('--threshold', type=float, default=guide_similarity.DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    for guides in args.guides:
+        rng = random.Random(0)
+        with tempfile.TemporaryDirectory() as directory:
+            app = Flask(__name__)
+            app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(directory, "bench.db")}'
+            db.init_app(app)
+            with app.app_context():
+                db.create_all()
+                requests = seed(guides, args.subjects, rng)
+                edited = []
+                for guide_id, subject_id, topic_id, title, notes in rng.sample(requests, args.lookups):
+                    edited.append((guide_id, subject_id, topic_id) + edit(rng, title, notes))
+                fresh = [(None, rng.randint(1, args.subjects), 1) + request(rng) for _ in range(args.lookups)]
+
+                print(f'{guides} guides in {args.subjects} subjects')
+                for label, lookups in (('edited requests', edited), ('new requests', fresh)):
+                    found = 0
+                    start = time.perf_counter()
+                    for guide_id, subject_id, topic_id, title, notes in lookups:
+                        similar = guide_similarity.find_similar(subject_id, topic_id, title, notes, args.threshold)
+                        found += any(guide.id == guide_id for guide in similar)
+                    lsh_ms = (time.perf_counter() - start) / len(lookups) * 1000
+                    scanned = 0
+                    start = time.perf_counter()
+                    for guide_id, subject_id, topic_id, title, notes in lookups:
+                        scanned += guide_id in brute_force(subject_id, title, notes, args.threshold)
+                    brute_ms = (time.perf_counter() - start) / len(lookups) * 1000
+                    recall = (f'   original found {found} times, {scanned} by the full scan'
+                              if label == 'edited requests' else '')
+                    print(f'  {label:<16} find_similar {lsh_ms:6.2f} ms/lookup   '
+                          f'every signature of the subject {brute_ms:7.2f} ms/lookup{recall}')
+                db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
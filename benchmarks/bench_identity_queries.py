@@ -0,0 +1,88 @@
+"""
+Benchmark: queries and time spent loading the signed-in user.
+
+Runs a minimal app with Flask-Login in front of an in-memory database
+and sends a series of authenticated requests to an endpoint that, like
+most routes, reads the user type and checks subject ownership. This is
+done once with the old user_loader (User.query.get, a join with
+professors on every request) and once with IdentityCache (one lookup of
+the user's auth version). It prints the queries per request and the time
+per request.
+
+    python benchmarks/bench_identity_queries.py --requests 200
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify  # noqa: E402
+from flask_login import LoginManager, current_user, login_required, login_user  # noqa: E402
+
+from authz import can_access_subject  # noqa: E402
+from benchmarks.support import count_queries, create_app as create_bare_app  # noqa: E402
+from identity import IdentityCache  # noqa: E402
+from models import db, Professor, Subject, User  # noqa: E402
+
+
+def create_app(loader: str) -> Flask:
+    app = create_bare_app(SECRET_KEY='bench')
+    login_manager = LoginManager(app)
+    identity_cache = IdentityCache(app) if loader == 'identity' else None
+
+    @login_manager.user_loader
+    def load_user(user_id):
+        if identity_cache is not None:
+            return identity_cache.load(user_id)
+        return User.query.get(int(user_id))
+
+    @app.route('/login/<int:user_id>')
+    def login(user_id):
+        login_user(db.session.get(User, user_id))
+        return 'ok'
+
+    @app.route('/check/<int:subject_id>')
+    @login_required
+    def check(subject_id):
+        return jsonify(user_type=current_user.user_type, allowed=can_access_subject(subject_id))
+
+    return app
+
+
+def run(loader: str, requests: int, subjects: int):
+    app = create_app(loader)
+    with app.app_context():
+        db.create_all()
+        professor = Professor(username='drsmith', email='drsmith@example.com', password_hash='-', department='AI')
+        professor.subjects.extend(Subject(code=f'S{s}', name=f'Materia {s}', credits=3) for s in range(subjects))
+        db.session.add(professor)
+        db.session.commit()
+        professor_id, subject_id = professor.id, professor.subjects.first().id
+
+    client = app.test_client()
+    client.get(f'/login/{professor_id}')
+    with count_queries(app) as statements:
+        start = time.perf_counter()
+        for _ in range(requests):
+            response = client.get(f'/check/{subject_id}')
+            assert response.get_json()['allowed']
+        elapsed = time.perf_counter() - start
+    return len(statements) / requests, elapsed / requests * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--subjects', type=int, default=20)
+    args = parser.parse_args()
+
+    for label, loader in (('User.query.get', 'orm'), ('IdentityCache', 'identity')):
+        queries, ms = run(loader, args.requests, args.subjects)
+        print(f'{label:<16} {queries:5.2f} queries/request   {ms:6.3f} ms/request')
+
+
+if __name__ == '__main__':
+    main()
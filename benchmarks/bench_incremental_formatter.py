@@ -0,0 +1,69 @@
+"""
+Benchmark: time to format each streamed chunk as the guide grows.
+
+Splits an AI-like output into chunks of a few dozen characters, the size
+of streamed deltas, that split lines at arbitrary points. Each chunk is
+passed to IncrementalFormatter.feed, and the same is done by formatting
+all the text received so far again for every chunk, as a formatter
+without state would have to. The time per chunk is printed for the first
+and the last tenth of the stream. Constant cost shows as equal columns.
+
+    python benchmarks/bench_incremental_formatter.py --kilobytes 50 200 --chunk 40
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_formatter import SECTION, sample  # noqa: E402
+from lab_guide_format import IncrementalFormatter  # noqa: E402
+
+
+def incremental(chunks):
+    formatter = IncrementalFormatter()
+    for chunk in chunks:
+        yield formatter.feed(chunk)
+
+
+def reformat(chunks):
+    received = []
+    for chunk in chunks:
+        received.append(chunk)
+        formatter = IncrementalFormatter()
+        formatter.feed(''.join(received))
+        yield formatter.html
+
+
+def per_chunk(strategy, chunks) -> list:
+    times = []
+    start = time.perf_counter()
+    for _ in strategy(chunks):
+        now = time.perf_counter()
+        times.append(now - start)
+        start = now
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--kilobytes', type=int, nargs='+', default=[50, 200], help='Output sizes in KB')
+    parser.add_argument('--chunk', type=int, default=40, help='Characters per streamed chunk')
+    args = parser.parse_args()
+
+    for kilobytes in args.kilobytes:
+        text = sample(SECTION, kilobytes)
+        chunks = [text[i:i + args.chunk] for i in range(0, len(text), args.chunk)]
+        tenth = max(1, len(chunks) // 10)
+        for label, strategy in (('IncrementalFormatter', incremental), ('re-format all', reformat)):
+            times = per_chunk(strategy, chunks)
+            first = sum(times[:tenth]) / tenth * 1e6
+            last = sum(times[-tenth:]) / tenth * 1e6
+            print(f'{kilobytes:5d} KB {len(chunks):6d} chunks   {label:<20} '
+                  f'first tenth {first:10.1f} us/chunk   last tenth {last:10.1f} us/chunk')
+
+
+if __name__ == '__main__':
+    main()
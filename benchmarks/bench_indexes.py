@@ -0,0 +1,131 @@
+"""
+Benchmark: query plans of the hot lookups before and after the indexes.
+
+Seeds a SQLite database with thousands of subjects, weekly topics and lab
+guides, drops the indexes added by migration 3f1c2a9d8b7e, and prints the
+plan and timing of the lookups the app runs constantly. The indexes are
+then created from the models and the same lookups are measured again, so
+the plans can be seen moving from table scans to index searches.
+
+    python benchmarks/bench_indexes.py --subjects 5000 --professors 500
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select  # noqa: E402
+
+from benchmarks.support import create_app  # noqa: E402
+from models import db, professor_subject, Professor, User, Subject, WeeklyTopic, LabGuide  # noqa: E402
+
+INDEXED_TABLES = (LabGuide.__table__, WeeklyTopic.__table__, professor_subject)
+
+
+def seed(professors: int, subjects: int, topics: int, guides: int):
+    """Bulk insert the dataset with Core statements; the ORM would dominate the run time."""
+    connection = db.session.connection()
+    connection.execute(User.__table__.insert(), [
+        {'id': p, 'username': f'prof{p}', 'email': f'prof{p}@example.com', 'password_hash': '-',
+         'user_type': 'professor'}
+        for p in range(1, professors + 1)
+    ])
+    connection.execute(Professor.__table__.insert(), [
+        {'id': p, 'department': 'Ingenieria'} for p in range(1, professors + 1)
+    ])
+    connection.execute(Subject.__table__.insert(), [
+        {'id': s, 'code': f'S{s}', 'name': f'Materia {s}', 'credits': 3} for s in range(1, subjects + 1)
+    ])
+    connection.execute(professor_subject.insert(), [
+        {'professor_id': (s % professors) + 1, 'subject_id': s} for s in range(1, subjects + 1)
+    ])
+    connection.execute(WeeklyTopic.__table__.insert(), [
+        {'id': (s - 1) * topics + w, 'subject_id': s, 'week_number': w, 'title': f'Tema {w}'}
+        for s in range(1, subjects + 1) for w in range(1, topics + 1)
+    ])
+    rows = []
+    for s in range(1, subjects + 1):
+        for g in range(guides):
+            rows.append({'title': f'Guia {g}', 'content': '<p>x</p>', 'lab_number': g + 1,
+                         'subject_id': s, 'weekly_topic_id': (s - 1) * topics + g + 1,
+                         'created_by_id': (s % professors) + 1, 'status': 'draft',
+                         'difficulty_level': 'intermediate'})
+    connection.execute(LabGuide.__table__.insert(), rows)
+    db.session.commit()
+
+
+def lookups(subjects: int, professors: int, topics: int) -> dict:
+    """The lookups behind the dashboard, the guide pages, generation jobs and ownership checks."""
+    rng = random.Random(0)
+    subject_id = rng.randint(1, subjects)
+    professor_id = rng.randint(1, professors)
+    topic_id = rng.randint(1, subjects * topics)
+    return {
+        'guides of a subject': select(LabGuide.id).where(LabGuide.subject_id == subject_id)
+                                                  .order_by(LabGuide.id),
+        'guides of a topic': select(LabGuide.id).where(LabGuide.weekly_topic_id == topic_id),
+        'guides of a professor': select(LabGuide.id).where(LabGuide.created_by_id == professor_id),
+        'topics of a subject by week': select(WeeklyTopic.id).where(WeeklyTopic.subject_id == subject_id)
+                                                            .order_by(WeeklyTopic.week_number),
+        'professors of a subject': select(professor_subject.c.professor_id)
+                                   .where(professor_subject.c.subject_id == subject_id),
+    }
+
+
+def measure(statements: dict, repeat: int) -> dict:
+    results = {}
+    connection = db.session.connection()
+    for label, statement in statements.items():
+        sql = str(statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+        plan = '; '.join(row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}'))
+        start = time.perf_counter()
+        for _ in range(repeat):
+            connection.exec_driver_sql(sql).fetchall()
+        results[label] = (plan, (time.perf_counter() - start) / repeat * 1000)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--professors', type=int, default=500)
+    parser.add_argument('--subjects', type=int, default=5000)
+    parser.add_argument('--topics', type=int, default=16)
+    parser.add_argument('--guides', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        with app.app_context():
+            db.create_all()
+            for table in INDEXED_TABLES:
+                for index in table.indexes:
+                    index.drop(db.engine)
+
+            start = time.perf_counter()
+            seed(args.professors, args.subjects, args.topics, args.guides)
+            print(f'seeded {args.subjects} subjects, {args.subjects * args.topics} topics and '
+                  f'{args.subjects * args.guides} guides in {time.perf_counter() - start:.1f} s\n')
+
+            statements = lookups(args.subjects, args.professors, args.topics)
+            before = measure(statements, args.repeat)
+            db.session.commit()
+            for table in INDEXED_TABLES:
+                for index in table.indexes:
+                    index.create(db.engine)
+            db.session.execute(db.text('ANALYZE'))
+            after = measure(statements, args.repeat)
+
+            for label in statements:
+                (plan_before, ms_before), (plan_after, ms_after) = before[label], after[label]
+                print(f'{label}\n  without indexes {ms_before:8.3f} ms  {plan_before}\n'
+                      f'  with indexes    {ms_after:8.3f} ms  {plan_after}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark: per-request PDF setup cost versus a shared LabGuidePDFRenderer.
+
+Renders the same guide N times, once with a fresh renderer per render
+(the stylesheet is rebuilt and the logo decoded every time, as the route
+used to do) and once with a single shared renderer.
+
+    python benchmarks/bench_pdf_setup.py --renders 20
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from io import BytesIO
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf_renderer import LabGuidePDFRenderer  # noqa: E402
+
+
+def sample_guide() -> SimpleNamespace:
+    """A detached stand-in for a LabGuide with realistic content."""
+    sections = ''.join(
+        f'<h2>SECCION {number}</h2><h3>Subtitulo:</h3>'
+        + ''.join(f'<p>Linea {number}.{line} del contenido de la guia de laboratorio.</p>' for line in range(8))
+        for number in range(12)
+    )
+    return SimpleNamespace(
+        title='Guia de referencia',
+        content=f'<div class="lab-guide-content">{sections}</div>',
+        subject=SimpleNamespace(code='CS101', name='Introduccion a la programacion'),
+        created_by=SimpleNamespace(username='drsmith', department='Ingenieria'),
+    )
+
+
+def time_renders(renders: int, make_renderer) -> list:
+    guide = sample_guide()
+    timings = []
+    for _ in range(renders):
+        start = time.perf_counter()
+        make_renderer().render(guide, BytesIO())
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--renders', type=int, default=20)
+    args = parser.parse_args()
+
+    shared = LabGuidePDFRenderer()
+    shared.render(sample_guide(), BytesIO())  # warm up: build styles, decode logo
+
+    setup_start = time.perf_counter()
+    fresh = LabGuidePDFRenderer()
+    fresh.styles, fresh.logo
+    setup_ms = (time.perf_counter() - setup_start) * 1000
+
+    per_request = time_renders(args.renders, LabGuidePDFRenderer)
+    reused = time_renders(args.renders, lambda: shared)
+
+    print(f'one-time setup (styles + logo): {setup_ms:8.1f} ms')
+    for label, timings in (('fresh renderer per request', per_request), ('shared renderer', reused)):
+        print(f'{label:<28} median {statistics.median(timings):8.1f} ms   '
+              f'p95 {sorted(timings)[int(len(timings) * 0.95) - 1]:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark: concurrent writer and reader throughput on SQLite.
+
+Runs writer threads (each transaction reads, inserts a row and commits,
+like a form submission) next to reader threads (listing queries) against
+a SQLite file for a fixed time. It does this once with SQLAlchemy's
+defaults (rollback journal, synchronous=FULL, no pragmas) and once with
+the engine options and pragmas of the database module. It reports
+commits, reads and "database is locked" errors per second.
+
+    python benchmarks/bench_sqlite_writers.py --writers 8 --readers 8 --seconds 5
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, func, select  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from database import engine_options, install_sqlite_pragmas, sqlite_pragmas  # noqa: E402
+
+metadata = MetaData()
+entries = Table(
+    'entries', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('writer', Integer, nullable=False),
+    Column('payload', String(2000), nullable=False),
+)
+
+
+def run(engine, writers: int, readers: int, seconds: float) -> dict:
+    metadata.create_all(engine)
+    counts = {'commits': 0, 'reads': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def add(name: str):
+        with lock:
+            counts[name] += 1
+
+    def write(writer: int):
+        while time.monotonic() < deadline:
+            try:
+                with engine.begin() as connection:
+                    connection.execute(select(func.count()).select_from(entries)
+                                       .where(entries.c.writer == writer)).scalar()
+                    connection.execute(entries.insert().values(writer=writer, payload='x' * 1500))
+                add('commits')
+            except OperationalError:
+                add('errors')
+
+    def read():
+        while time.monotonic() < deadline:
+            try:
+                with engine.connect() as connection:
+                    connection.execute(select(entries.c.id, entries.c.writer)
+                                       .order_by(entries.c.id.desc()).limit(50)).fetchall()
+                add('reads')
+            except OperationalError:
+                add('errors')
+
+    threads = ([threading.Thread(target=write, args=(w,)) for w in range(writers)]
+               + [threading.Thread(target=read) for _ in range(readers)])
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    return {name: value / seconds for name, value in counts.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        default_uri = f'sqlite:///{os.path.join(directory, "default.db")}'
+        tuned_uri = f'sqlite:///{os.path.join(directory, "tuned.db")}'
+
+        default_engine = create_engine(default_uri)
+        tuned_engine = create_engine(tuned_uri, **engine_options(tuned_uri))
+        install_sqlite_pragmas(tuned_engine, sqlite_pragmas())
+
+        for label, engine in (('defaults', default_engine), ('database module', tuned_engine)):
+            result = run(engine, args.writers, args.readers, args.seconds)
+            print(f'{label:<16} commits/s {result["commits"]:8.1f}   reads/s {result["reads"]:8.1f}   '
+                  f'locked errors/s {result["errors"]:6.1f}')
+
+
+if __name__ == '__main__':
+    main()
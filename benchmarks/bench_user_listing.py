@@ -0,0 +1,76 @@
+"""
+Benchmark: cost of listing users as the table grows.
+
+Seeds a SQLite database with a growing number of accounts (half of them
+professors) and times what the home page used to do, User.query.all(),
+against one keyset page of list_users at the start and near the end of
+the table.
+
+    python benchmarks/bench_user_listing.py --users 1000 10000 100000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.support import create_app  # noqa: E402
+from models import db, Professor, User  # noqa: E402
+from user_directory import UserCount, list_users  # noqa: E402
+
+
+def seed(first_id: int, last_id: int):
+    """Insert users first_id..last_id with Core statements; every other one is a professor."""
+    connection = db.session.connection()
+    rows = range(first_id, last_id + 1)
+    connection.execute(User.__table__.insert(), [
+        {'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': '-',
+         'user_type': 'professor' if i % 2 else 'user'}
+        for i in rows
+    ])
+    connection.execute(Professor.__table__.insert(), [
+        {'id': i, 'department': 'Ingenieria'} for i in rows if i % 2
+    ])
+    db.session.commit()
+
+
+def timed(function, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        with app.app_context():
+            db.create_all()
+            count = UserCount()
+            seeded = 0
+            for users in sorted(args.users):
+                seed(seeded + 1, users)
+                seeded = users
+                count.invalidate()
+                all_ms = timed(lambda: User.query.all(), args.repeat)
+                first_ms = timed(lambda: list_users(None, args.page_size, count), args.repeat)
+                last_ms = timed(lambda: list_users(users - args.page_size, args.page_size, count), args.repeat)
+                print(f'{users:7d} users   User.query.all() {all_ms:9.2f} ms   '
+                      f'first page {first_ms:6.3f} ms   last page {last_ms:6.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Shared fixtures of the benchmarks and the tests.
+
+A bare Flask app bound to the models, professors seeded through the ORM
+and a context manager that records the SQL statements issued while it is
+active.
+"""
+
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+from flask import Flask
+from sqlalchemy import event
+
+from models import db, Professor, Subject, WeeklyTopic, LabGuide
+
+
+def create_app(uri: str = 'sqlite://', **config) -> Flask:
+    """Flask app with the models bound to the database at uri (in memory by default)."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config.update(config)
+    db.init_app(app)
+    return app
+
+
+def seed_professor(username: str, subjects: int, topics: int = 1, guides: int = 0) -> Professor:
+    """
+    Create a professor teaching the given number of subjects and commit it.
+
+    Every subject gets topics weekly topics, added in descending week order so
+    that readers have to sort them, and guides lab guides spread over them.
+    """
+    professor = Professor(username=username, email=f'{username}@example.com',
+                          password_hash='-', department='Ingenieria')
+    db.session.add(professor)
+    for s in range(subjects):
+        subject = Subject(code=f'{username.upper()}S{s}', name=f'Materia {s}', credits=3, description='d')
+        professor.subjects.append(subject)
+        weekly_topics = [WeeklyTopic(week_number=w, title=f'Tema {w}', subject=subject)
+                         for w in range(topics, 0, -1)]
+        db.session.add_all(weekly_topics)
+        for g in range(guides):
+            db.session.add(LabGuide(title=f'Guia {g}', content='<p>x</p>', lab_number=g + 1,
+                                    subject=subject, weekly_topic=weekly_topics[g % topics],
+                                    created_by=professor))
+    db.session.commit()
+    return professor
+
+
+@contextmanager
+def count_queries(app: Optional[Flask] = None) -> Iterator[List[str]]:
+    """
+    Record the SQL statements sent to the database; yields the list they go to.
+
+    The database is the one of the current app, or of app, so that requests
+    sent through its test client can be counted without pushing an app
+    context around them.
+    """
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    if app is None:
+        engine = db.engine
+    else:
+        with app.app_context():
+            engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
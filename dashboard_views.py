@@ -0,0 +1,87 @@
+"""
+Dashboard Views Module
+
+This module loads what the professor dashboard displays as plain view
+models. Subjects, weekly topics and lab guides are each fetched with one
+query projecting only the rendered columns, so the page costs the same
+fixed number of queries however many subjects a professor teaches.
+"""
+
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from models import db, professor_subject, Subject, WeeklyTopic, LabGuide
+
+
+@dataclass
+class TopicView:
+    id: int
+    week_number: int
+    title: str
+    description: Optional[str]
+
+
+@dataclass
+class GuideView:
+    id: int
+    lab_number: int
+    title: str
+    status: str
+    difficulty_level: str
+    estimated_duration: Optional[int]
+
+    @property
+    def is_published(self) -> bool:
+        return self.status == 'published'
+
+
+@dataclass
+class SubjectCard:
+    """A subject of the dashboard with its weekly topics and lab guides."""
+    id: int
+    code: str
+    name: str
+    credits: int
+    description: Optional[str]
+    topics: List[TopicView] = field(default_factory=list)
+    guides: List[GuideView] = field(default_factory=list)
+
+
+def load_subject_cards(professor_id: int) -> List[SubjectCard]:
+    """
+    Load the dashboard subjects of a professor in three queries.
+
+    Args:
+        professor_id (int): The professor whose subjects are shown
+
+    Returns:
+        list: One SubjectCard per subject, topics ordered by week and guides by creation
+    """
+    subjects = (db.session.query(Subject.id, Subject.code, Subject.name, Subject.credits, Subject.description)
+                .join(professor_subject, professor_subject.c.subject_id == Subject.id)
+                .filter(professor_subject.c.professor_id == professor_id)
+                .order_by(Subject.id)
+                .all())
+    if not subjects:
+        return []
+    cards = {row.id: SubjectCard(**row._asdict()) for row in subjects}
+
+    # Topics and guides are filtered through the association table rather than
+    # an IN list, so the statements stay the same whatever the subject count
+    topics = (db.session.query(WeeklyTopic.subject_id, WeeklyTopic.id, WeeklyTopic.week_number,
+                               WeeklyTopic.title, WeeklyTopic.description)
+              .join(professor_subject, professor_subject.c.subject_id == WeeklyTopic.subject_id)
+              .filter(professor_subject.c.professor_id == professor_id)
+              .order_by(WeeklyTopic.subject_id, WeeklyTopic.week_number))
+    for subject_id, *columns in topics:
+        cards[subject_id].topics.append(TopicView(*columns))
+
+    guides = (db.session.query(LabGuide.subject_id, LabGuide.id, LabGuide.lab_number, LabGuide.title,
+                               LabGuide.status, LabGuide.difficulty_level, LabGuide.estimated_duration)
+              .join(professor_subject, professor_subject.c.subject_id == LabGuide.subject_id)
+              .filter(professor_subject.c.professor_id == professor_id)
+              .order_by(LabGuide.subject_id, LabGuide.id))
+    for subject_id, *columns in guides:
+        cards[subject_id].guides.append(GuideView(*columns))
+
+    return list(cards.values())
@@ -0,0 +1,109 @@
+"""
+Database Module
+
+Engine configuration for the application database. The URI, the
+connection pool and, for SQLite, the pragmas applied to every new
+connection come from the environment. SQLite runs in WAL mode, so
+readers no longer block the writer, and a busy timeout makes concurrent
+writers wait for the lock instead of failing with "database is locked".
+Any other SQLAlchemy URL (e.g. PostgreSQL) gets a pre-pinged, recycled pool.
+
+Environment variables:
+    DATABASE_URL          Database URI (default sqlite:///site.db, in the instance folder)
+    DB_POOL_SIZE          Connections kept open by the pool (default 5)
+    DB_MAX_OVERFLOW       Extra connections opened under load (default 10)
+    DB_POOL_TIMEOUT       Seconds to wait for a free connection (default 30)
+    DB_POOL_RECYCLE       Seconds after which server connections are replaced (default 1800)
+    SQLITE_JOURNAL_MODE   journal_mode pragma (default WAL)
+    SQLITE_SYNCHRONOUS    synchronous pragma (default NORMAL, safe with WAL)
+    SQLITE_BUSY_TIMEOUT   Milliseconds a connection waits for a lock (default 5000)
+    SQLITE_CACHE_SIZE_KB  Page cache per connection in KiB (default 65536)
+    SQLITE_MMAP_SIZE      Bytes of the file read through mmap (default 268435456)
+"""
+
+import os
+from typing import Dict, Mapping
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+from models import db
+
+DEFAULT_DATABASE_URI = 'sqlite:///site.db'
+
+
+def database_uri(environ: Mapping[str, str] = os.environ) -> str:
+    """The configured database URI, accepting the postgres:// scheme of hosting platforms."""
+    uri = environ.get('DATABASE_URL') or DEFAULT_DATABASE_URI
+    if uri.startswith('postgres://'):
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
+def _is_memory_sqlite(uri: str) -> bool:
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def engine_options(uri: str, environ: Mapping[str, str] = os.environ) -> Dict:
+    """
+    Pool options for an engine on uri.
+
+    In-memory SQLite keeps the single shared connection SQLAlchemy gives it.
+    SQLite files get a bounded queue pool. Server databases also have their
+    connections checked before use and recycled, so restarts and idle
+    timeouts on the server side do not surface as errors.
+    """
+    if _is_memory_sqlite(uri):
+        return {}
+    options = {
+        'pool_size': int(environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': float(environ.get('DB_POOL_TIMEOUT', 30)),
+    }
+    if make_url(uri).get_backend_name() != 'sqlite':
+        options['pool_pre_ping'] = True
+        options['pool_recycle'] = int(environ.get('DB_POOL_RECYCLE', 1800))
+    return options
+
+
+def sqlite_pragmas(environ: Mapping[str, str] = os.environ) -> Dict[str, str]:
+    """Pragmas applied to every new SQLite connection, in order."""
+    return {
+        'journal_mode': environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'busy_timeout': str(int(environ.get('SQLITE_BUSY_TIMEOUT', 5000))),
+        # A negative cache_size is in KiB rather than pages
+        'cache_size': str(-int(environ.get('SQLITE_CACHE_SIZE_KB', 64 * 1024))),
+        'mmap_size': str(int(environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))),
+    }
+
+
+def install_sqlite_pragmas(engine: Engine, pragmas: Mapping[str, str]):
+    """Apply pragmas to every connection the engine opens; does nothing for other databases."""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+
+def configure_database(app):
+    """
+    Configure the database of a Flask application and bind db to it.
+
+    Explicit SQLALCHEMY_DATABASE_URI and SQLALCHEMY_ENGINE_OPTIONS settings
+    take precedence over the environment.
+    """
+    app.config.setdefault('SQLALCHEMY_DATABASE_URI', database_uri())
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+    app.config.setdefault('SQLITE_PRAGMAS', sqlite_pragmas())
+    db.init_app(app)
+    with app.app_context():
+        install_sqlite_pragmas(db.engine, app.config['SQLITE_PRAGMAS'])
@@ -0,0 +1,357 @@
+"""
+Generation Jobs Module
+
+This module runs AI lab guide generation in the background so that web
+requests only enqueue a GenerationJob and return immediately. A bounded
+pool of worker threads per process picks the jobs up, calls the AI and
+writes the result as a LabGuide draft. Whole subjects can be generated
+in bulk through the async AI client.
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from models import db, GenerationJob, LabGuide, Professor, Subject, WeeklyTopic
+from ai_providers import get_ai_config
+from lab_guide_format import format_generated_guide
+from guide_similarity import remember
+
+
+class GenerationWorkerPool:
+    """Per-process pool of workers that execute queued generation jobs."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Bind the pool to a Flask application."""
+        app.config.setdefault('GENERATION_MAX_WORKERS', 4)
+        self.app = app
+        app.extensions['generation_pool'] = self
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        # Threads are only started on the first submission so that CLI
+        # commands and migrations never spin up workers.
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.app.config['GENERATION_MAX_WORKERS'],
+                    thread_name_prefix='generation-worker'
+                )
+            return self._executor
+
+    def submit(self, job_id: int):
+        """Schedule a queued job for execution."""
+        return self.executor.submit(self._run, job_id)
+
+    def submit_bulk(self, job_ids: List[int]):
+        """Schedule several queued jobs to run concurrently as one bulk run."""
+        return self.executor.submit(self._run_bulk, job_ids)
+
+    def resume_pending(self):
+        """Re-submit jobs that were enqueued but never picked up."""
+        job_ids = [job_id for (job_id,) in db.session.query(GenerationJob.id)
+                   .filter_by(status='queued')
+                   .order_by(GenerationJob.id)]
+        for job_id in job_ids:
+            self.submit(job_id)
+        return job_ids
+
+    def _run_bulk(self, job_ids: List[int]):
+        with self.app.app_context():
+            try:
+                return run_bulk_jobs(job_ids)
+            finally:
+                db.session.remove()
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+    def _run(self, job_id: int):
+        with self.app.app_context():
+            try:
+                run_job(job_id)
+            finally:
+                db.session.remove()
+
+
+def _claim(job_ids: List[int]) -> List[int]:
+    """
+    Atomically move queued jobs to running so that a job is never run twice,
+    even when several processes resume the same queue.
+
+    Each job is claimed by its own conditional UPDATE: a row counts as
+    claimed only if this UPDATE moved it, so jobs another worker claimed
+    first are left out.
+
+    Returns:
+        IDs of the jobs claimed, ordered like job_ids
+    """
+    claimed = []
+    started_at = datetime.utcnow()
+    for job_id in job_ids:
+        moved = GenerationJob.query.filter_by(id=job_id, status='queued').update(
+            {'status': 'running', 'progress': 10, 'started_at': started_at},
+            synchronize_session=False
+        )
+        if moved:
+            claimed.append(job_id)
+    db.session.commit()
+    return claimed
+
+
+def _generation_kwargs(job: GenerationJob) -> Dict:
+    """Arguments of AIConfig.generate_lab_guide for a job."""
+    return dict(
+        subject_name=job.subject.name,
+        topic_title=job.weekly_topic.title,
+        topic_description=job.weekly_topic.description,
+        lab_number=job.lab_number,
+        difficulty_level=job.difficulty_level,
+        estimated_duration=job.estimated_duration,
+        additional_notes=job.additional_notes or '',
+        lab_guide_title=job.title,
+        use_cache=job.use_cache,
+        sectioned=job.sectioned
+    )
+
+
+def _store_result(job: GenerationJob, content: Optional[str], error: Optional[str] = None) -> Optional[LabGuide]:
+    """Add the LabGuide draft for a finished generation and close the job (without committing)."""
+    if not content:
+        job.fail(error or 'Error al generar la guía de laboratorio. Por favor, intente nuevamente.')
+        return None
+
+    subject = job.subject
+    professor = job.created_by
+    formatted_content = format_generated_guide(
+        content,
+        department=professor.department,
+        subject_code=subject.code,
+        subject_name=subject.name,
+        title=job.title,
+        professor_name=professor.username
+    )
+
+    lab_guide = LabGuide(
+        subject_id=job.subject_id,
+        weekly_topic_id=job.weekly_topic_id,
+        title=job.title,
+        content=formatted_content,
+        lab_number=job.lab_number,
+        difficulty_level=job.difficulty_level,
+        estimated_duration=job.estimated_duration,
+        status='draft',
+        laboratory_id=job.laboratory_id,
+        created_by_id=job.created_by_id
+    )
+    # Later requests like this one are offered the draft instead of a new generation
+    remember(lab_guide, job.additional_notes)
+    db.session.add(lab_guide)
+    job.succeed(lab_guide)
+    return lab_guide
+
+
+def run_job(job_id: int) -> Optional[GenerationJob]:
+    """
+    Execute a generation job and store the result as a LabGuide draft.
+
+    Args:
+        job_id: Primary key of the GenerationJob to execute
+
+    Returns:
+        The job, or None if it does not exist
+    """
+    if not _claim([job_id]):
+        return db.session.get(GenerationJob, job_id)
+
+    job = db.session.get(GenerationJob, job_id)
+
+    try:
+        content = get_ai_config().generate_lab_guide(**_generation_kwargs(job))
+
+        if content:
+            job.progress = 90
+            db.session.commit()
+
+        _store_result(job, content)
+        db.session.commit()
+
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(GenerationJob, job_id)
+        if job is None:
+            # Deleted with its subject or topic while the AI was answering
+            return None
+        job.fail(f'Error al crear la guía de laboratorio: {str(e)}')
+        db.session.commit()
+
+    return job
+
+
+def delete_jobs(subject_id: int, weekly_topic_id: Optional[int] = None) -> int:
+    """
+    Delete the jobs of a subject, or of one of its weekly topics, before deleting it (without committing).
+
+    A worker still running one of them finds it gone and drops the result.
+
+    Returns:
+        Number of jobs deleted
+    """
+    query = GenerationJob.query.filter_by(subject_id=subject_id)
+    if weekly_topic_id is not None:
+        query = query.filter_by(weekly_topic_id=weekly_topic_id)
+    return query.delete(synchronize_session=False)
+
+
+def detach_jobs(lab_guide_id: int) -> int:
+    """
+    Unlink the jobs that produced a lab guide before deleting it (without committing).
+
+    Returns:
+        Number of jobs unlinked
+    """
+    return GenerationJob.query.filter_by(lab_guide_id=lab_guide_id).update(
+        {'lab_guide_id': None}, synchronize_session=False
+    )
+
+
+@dataclass
+class TopicResult:
+    """Outcome of the generation of one weekly topic in a bulk run."""
+    weekly_topic_id: int
+    week_number: int
+    topic_title: str
+    job_id: int
+    status: str
+    lab_guide_id: Optional[int] = None
+    error: Optional[str] = None
+
+    @classmethod
+    def from_job(cls, job: GenerationJob) -> 'TopicResult':
+        return cls(
+            weekly_topic_id=job.weekly_topic_id,
+            week_number=job.weekly_topic.week_number,
+            topic_title=job.weekly_topic.title,
+            job_id=job.id,
+            status=job.status,
+            lab_guide_id=job.lab_guide_id,
+            error=job.error
+        )
+
+
+def enqueue_subject_jobs(subject: Subject,
+                         professor: Professor,
+                         difficulty_level: str = 'intermediate',
+                         estimated_duration: int = 120,
+                         use_cache: bool = True,
+                         skip_existing: bool = True,
+                         sectioned: bool = False) -> List[GenerationJob]:
+    """
+    Create one queued GenerationJob per weekly topic of a subject.
+
+    Args:
+        subject: Subject whose weekly topics get a lab guide
+        professor: Professor the drafts are created for
+        difficulty_level: Difficulty level of every guide
+        estimated_duration: Estimated duration in minutes of every guide
+        use_cache: Whether identical earlier generations may be reused
+        skip_existing: Skip topics that already have a lab guide
+        sectioned: Generate every guide section by section
+
+    Returns:
+        The created jobs, ordered by week number
+    """
+    topics = subject.weekly_topics.order_by(WeeklyTopic.week_number).all()
+    if skip_existing:
+        covered = {topic_id for (topic_id,) in db.session.query(LabGuide.weekly_topic_id)
+                   .filter_by(subject_id=subject.id).distinct()}
+        topics = [topic for topic in topics if topic.id not in covered]
+
+    jobs = [
+        GenerationJob(
+            subject_id=subject.id,
+            weekly_topic_id=topic.id,
+            title=topic.title,
+            lab_number=topic.week_number,
+            difficulty_level=difficulty_level,
+            estimated_duration=estimated_duration,
+            use_cache=use_cache,
+            sectioned=sectioned,
+            created_by_id=professor.id
+        )
+        for topic in topics
+    ]
+    db.session.add_all(jobs)
+    db.session.commit()
+    return jobs
+
+
+def run_bulk_jobs(job_ids: List[int],
+                  batch_size: Optional[int] = None,
+                  client=None) -> List[TopicResult]:
+    """
+    Execute several generation jobs concurrently through the async AI client.
+
+    The drafts are written in one transaction per batch of finished
+    generations, so a failure halfway through keeps the completed batches.
+
+    Args:
+        job_ids: Primary keys of queued GenerationJobs; those claimed by another worker are skipped
+        batch_size: Number of finished generations committed together
+        client: AsyncAIClient to use (defaults to one wrapping the app's AI client)
+
+    Returns:
+        One TopicResult per job, ordered like job_ids
+    """
+    batch_size = batch_size or int(os.getenv('AI_BULK_BATCH_SIZE', 4))
+    if client is None:
+        from ai_config import AsyncAIClient
+        client = AsyncAIClient(get_ai_config())
+
+    # Only the jobs claimed here are generated; others may be running elsewhere
+    claimed = _claim(job_ids)
+    jobs_by_id = {job.id: job for job in GenerationJob.query.filter(GenerationJob.id.in_(claimed))}
+    jobs = [jobs_by_id[job_id] for job_id in claimed if job_id in jobs_by_id]
+    requests_kwargs = [_generation_kwargs(job) for job in jobs]
+
+    async def generate_and_store():
+        pending = []
+        async for index, content, error in client.generate_many(requests_kwargs):
+            pending.append((jobs[index], content, error))
+            if len(pending) >= batch_size:
+                _flush(pending)
+                pending = []
+        _flush(pending)
+
+    def _flush(batch):
+        try:
+            for job, content, error in batch:
+                _store_result(job, content, error)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            for job, _, _ in batch:
+                job = db.session.get(GenerationJob, job.id)
+                if job is None:
+                    continue
+                job.fail(f'Error al crear la guía de laboratorio: {str(e)}')
+            db.session.commit()
+
+    asyncio.run(generate_and_store())
+
+    jobs_by_id = {job.id: job for job in GenerationJob.query.filter(GenerationJob.id.in_(job_ids))}
+    return [TopicResult.from_job(jobs_by_id[job_id]) for job_id in job_ids if job_id in jobs_by_id]
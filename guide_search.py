@@ -0,0 +1,306 @@
+"""
+Guide Search Module
+
+This module keeps a full-text index of lab guides in an SQLite FTS5
+virtual table, lab_guide_fts, and searches it. Each row holds the title
+of a guide, its content as plain text (without the institutional header
+or HTML tags) and the title and description of its weekly topic; its
+rowid is the ID of the guide. Rows are written by mapper events in the
+same transaction as the guide, so the index follows every insert,
+update and delete made through the ORM. Guides that existed before the
+index are added with `flask index-guides`.
+
+Searches are ranked with bm25, a title match counting the most, and
+return a snippet of the content around the matched words. On databases
+other than SQLite, or SQLite builds without FTS5, search is unavailable.
+"""
+
+import re
+import unicodedata
+from dataclasses import dataclass
+from datetime import datetime
+from html import escape, unescape
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, event, text
+from sqlalchemy.exc import OperationalError
+
+from models import db, LabGuide, WeeklyTopic
+
+TABLE = 'lab_guide_fts'
+MAX_PAGE_SIZE = 50
+
+# Stored guides open with the institutional header; only what follows it is indexed
+CONTENT_MARKER = '<div class="lab-guide-content">'
+TAG_RE = re.compile(r'<[^>]+>')
+WORD_RE = re.compile(r'(\w+)(\*?)')
+TOKEN_RE = re.compile(r'\w+')
+# Column weights for bm25: title, content, topic title, topic description
+WEIGHTS = '10.0, 1.0, 4.0, 2.0'
+# Words shown in a snippet, and how many of them come before the first match
+SNIPPET_WORDS = 24
+SNIPPET_LEAD = 6
+
+CREATE_SQL = (
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5('
+    "title, content, topic_title, topic_description, tokenize='unicode61 remove_diacritics 2')"
+)
+INSERT_SQL = text(
+    f'INSERT INTO {TABLE} (rowid, title, content, topic_title, topic_description) '
+    'SELECT :id, :title, :content, '
+    '(SELECT title FROM weekly_topics WHERE id = :topic_id), '
+    '(SELECT description FROM weekly_topics WHERE id = :topic_id)'
+)
+DELETE_SQL = text(f'DELETE FROM {TABLE} WHERE rowid = :id')
+UPDATE_TOPIC_SQL = text(
+    f'UPDATE {TABLE} SET topic_title = :title, topic_description = :description '
+    'WHERE rowid IN (SELECT id FROM lab_guides WHERE weekly_topic_id = :topic_id)'
+)
+SEARCH_SQL = text(
+    # Only columns of lab_guides are read for every match: an FTS5 row is read
+    # whole, content included, so the indexed text is fetched for the page alone
+    f'SELECT g.id, g.title, g.status, g.subject_id, g.updated_at, bm25({TABLE}, {WEIGHTS}) AS score '
+    f'FROM {TABLE} JOIN lab_guides AS g ON g.id = {TABLE}.rowid '
+    f'WHERE {TABLE} MATCH :query AND g.subject_id IN :subject_ids '
+    'ORDER BY score LIMIT :limit OFFSET :offset'
+).bindparams(bindparam('subject_ids', expanding=True)).columns(updated_at=db.DateTime)
+INDEXED_SQL = text(
+    f'SELECT rowid, topic_title, content FROM {TABLE} WHERE rowid IN :ids'
+).bindparams(bindparam('ids', expanding=True))
+
+
+def plain_text(content: str) -> str:
+    """The text of a stored guide, without its header, tags or entities."""
+    body = content.split(CONTENT_MARKER, 1)[-1]
+    return ' '.join(unescape(TAG_RE.sub(' ', body)).split())
+
+
+def match_query(terms: str) -> Optional[str]:
+    """
+    Turns what a user typed into an FTS5 query that cannot be a syntax error.
+
+    Every word must appear; case and accents are ignored and a trailing *
+    matches any word with that prefix, e.g. 'Redes neuro*' becomes
+    '"Redes" "neuro"*'. Returns None when there are no words.
+    """
+    words = WORD_RE.findall(terms or '')
+    if not words:
+        return None
+    return ' '.join(f'"{word}"{star}' for word, star in words)
+
+
+def _fold(word: str) -> str:
+    # Same normalization as the unicode61 tokenizer with remove_diacritics
+    return ''.join(c for c in unicodedata.normalize('NFKD', word) if not unicodedata.combining(c)).casefold()
+
+
+def snippet(text: str, words: Sequence[Tuple[str, str]]) -> str:
+    """
+    A short excerpt of text around the first matched word, as escaped HTML.
+
+    Building it here rather than with the snippet() function of FTS5 avoids
+    running the MATCH a second time, which costs as much as the search itself.
+
+    Args:
+        text (str): Indexed plain text
+        words: (word, '*' or '') pairs, as found by WORD_RE in the query
+
+    Returns:
+        str: The excerpt, matched words in <mark> elements
+    """
+    exact = {_fold(word) for word, star in words if not star}
+    prefixes = tuple(_fold(word) for word, star in words if star)
+
+    def matches(token: str) -> bool:
+        folded = _fold(token)
+        return folded in exact or folded.startswith(prefixes)
+
+    tokens = []
+    first = None
+    truncated = False
+    for token in TOKEN_RE.finditer(text):
+        if first is not None and len(tokens) == first + SNIPPET_WORDS:
+            truncated = True
+            break
+        tokens.append(token)
+        if first is None and matches(token.group()):
+            first = len(tokens) - 1
+    if not tokens:
+        return ''
+    # Near the end of the text, the excerpt starts earlier to show as many words
+    start = max(0, min((first or 0) - SNIPPET_LEAD, len(tokens) - SNIPPET_WORDS))
+    shown = tokens[start:start + SNIPPET_WORDS]
+    parts = ['…' if start > 0 else '']
+    position = shown[0].start()
+    for token in shown:
+        parts.append(escape(text[position:token.start()], quote=False))
+        word = escape(token.group(), quote=False)
+        parts.append(f'<mark>{word}</mark>' if matches(token.group()) else word)
+        position = token.end()
+    if truncated or start + SNIPPET_WORDS < len(tokens):
+        parts.append('…')
+    return ''.join(parts)
+
+
+def include_in_migrations(name, type_, parent_names) -> bool:
+    """Alembic include_name hook: the index is not part of the models, so autogenerate must not drop it."""
+    return not (type_ == 'table' and name.startswith(TABLE))
+
+
+def _row(guide: LabGuide) -> dict:
+    return {'id': guide.id, 'title': guide.title, 'content': plain_text(guide.content),
+            'topic_id': guide.weekly_topic_id}
+
+
+def _on_guide_inserted(mapper, connection, target):
+    connection.execute(INSERT_SQL, _row(target))
+
+
+def _on_guide_updated(mapper, connection, target):
+    state = db.inspect(target)
+    # Status and date changes do not touch the index, nor strip the content again
+    if not any(state.attrs[name].history.has_changes() for name in ('title', 'content', 'weekly_topic_id')):
+        return
+    connection.execute(DELETE_SQL, {'id': target.id})
+    connection.execute(INSERT_SQL, _row(target))
+
+
+def _on_guide_deleted(mapper, connection, target):
+    connection.execute(DELETE_SQL, {'id': target.id})
+
+
+def _on_topic_updated(mapper, connection, target):
+    state = db.inspect(target)
+    if not any(state.attrs[name].history.has_changes() for name in ('title', 'description')):
+        return
+    connection.execute(UPDATE_TOPIC_SQL, {'title': target.title, 'description': target.description,
+                                          'topic_id': target.id})
+
+
+@dataclass
+class SearchHit:
+    id: int
+    title: str
+    status: str
+    subject_id: int
+    topic_title: Optional[str]
+    snippet: str
+    score: float
+    updated_at: datetime
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'title': self.title,
+            'status': self.status,
+            'subject_id': self.subject_id,
+            'topic_title': self.topic_title,
+            'snippet': self.snippet,
+            'score': self.score,
+            'updated_at': self.updated_at.isoformat(),
+        }
+
+
+@dataclass
+class SearchPage:
+    """A page of search results; next_page is None on the last one."""
+    hits: List[SearchHit]
+    page: int
+    next_page: Optional[int]
+
+
+class GuideSearch:
+    """Full-text index of lab guides, kept in sync by mapper events."""
+
+    def __init__(self, app=None):
+        self.available = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Create the index if needed and start following changes to guides and topics."""
+        app.extensions['guide_search'] = self
+        with app.app_context():
+            if db.engine.dialect.name == 'sqlite':
+                try:
+                    with db.engine.begin() as connection:
+                        connection.exec_driver_sql(CREATE_SQL)
+                    self.available = True
+                except OperationalError:
+                    # SQLite built without FTS5
+                    self.available = False
+        if not self.available:
+            return
+        # Mapper events are global: listen once however many apps are created
+        for target, name, listener in ((LabGuide, 'after_insert', _on_guide_inserted),
+                                       (LabGuide, 'after_update', _on_guide_updated),
+                                       (LabGuide, 'after_delete', _on_guide_deleted),
+                                       (WeeklyTopic, 'after_update', _on_topic_updated)):
+            if not event.contains(target, name, listener):
+                event.listen(target, name, listener)
+
+    def rebuild(self, batch_size: int = 500) -> int:
+        """
+        Index every existing guide again, replacing the current index.
+
+        Args:
+            batch_size (int): Guides read and written per batch
+
+        Returns:
+            int: Number of guides indexed
+        """
+        rows = (db.session.query(LabGuide.id, LabGuide.title, LabGuide.content, LabGuide.weekly_topic_id)
+                .order_by(LabGuide.id)
+                .yield_per(batch_size))
+        connection = db.session.connection()
+        connection.exec_driver_sql(f'DELETE FROM {TABLE}')
+        indexed = 0
+        batch = []
+        for guide_id, title, content, topic_id in rows:
+            batch.append({'id': guide_id, 'title': title, 'content': plain_text(content), 'topic_id': topic_id})
+            if len(batch) == batch_size:
+                connection.execute(INSERT_SQL, batch)
+                indexed += len(batch)
+                batch = []
+        if batch:
+            connection.execute(INSERT_SQL, batch)
+            indexed += len(batch)
+        # Merge the segments written by the batches into one b-tree
+        connection.exec_driver_sql(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')")
+        db.session.commit()
+        return indexed
+
+    def search(self, terms: str, subject_ids: Iterable[int], page: int = 1, limit: int = 20) -> SearchPage:
+        """
+        Searches the guides of some subjects, best matches first.
+
+        Args:
+            terms (str): The words to look for
+            subject_ids: IDs of the subjects whose guides may be returned
+            page (int): Page number, starting at 1
+            limit (int): Results per page, at most MAX_PAGE_SIZE
+
+        Returns:
+            SearchPage: The hits of the page, with escaped snippets where matches are in <mark> elements
+        """
+        page = max(page or 1, 1)
+        limit = min(max(limit or 1, 1), MAX_PAGE_SIZE)
+        query = match_query(terms)
+        subject_ids = list(subject_ids)
+        if query is None or not subject_ids:
+            return SearchPage([], page, None)
+        # One extra row tells whether there is a next page without counting the matches
+        rows = db.session.execute(SEARCH_SQL, {
+            'query': query, 'subject_ids': subject_ids, 'limit': limit + 1, 'offset': (page - 1) * limit,
+        }).fetchall()
+        more, rows = len(rows) > limit, rows[:limit]
+        indexed = {}
+        if rows:
+            indexed = {row.rowid: row for row in db.session.execute(INDEXED_SQL, {'ids': [row.id for row in rows]})}
+        words = WORD_RE.findall(terms)
+        hits = [
+            SearchHit(row.id, row.title, row.status, row.subject_id, indexed[row.id].topic_title,
+                      snippet(indexed[row.id].content, words), row.score, row.updated_at)
+            for row in rows
+        ]
+        return SearchPage(hits, page, page + 1 if more else None)
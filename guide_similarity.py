@@ -0,0 +1,221 @@
+"""
+Guide Similarity Module
+
+This module finds lab guides that were generated from a request very
+similar to a new one, so the professor can reuse a guide instead of
+paying for another AI call. Every guide keeps the MinHash signature of
+the title and notes it was requested with (character 3-grams, ignoring
+case, accents and punctuation) in lab_guide_signatures. The signature is
+also split into bands whose hashes, salted with the subject, are stored
+in lab_guide_bands (locality-sensitive hashing). A lookup reads the rows
+that share a band with the new request through the primary key of
+lab_guide_bands and compares only those signatures, so its cost does not
+grow with the number of guides.
+
+Signatures are added with the guide (see remember) and removed with it.
+Guides created before this module are added with `flask index-guides`.
+"""
+
+import hashlib
+import random
+import struct
+import unicodedata
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional, Sequence
+
+from models import db, LabGuide, LabGuideBand, LabGuideSignature, GenerationJob, WeeklyTopic
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+# With 16 bands of 4 rows, pairs at 0.8 similarity share a band 99.9% of the time, pairs
+# at 0.5 64% and pairs at 0.3 12%: thresholds below 0.6 would miss similar guides
+DEFAULT_THRESHOLD = 0.8
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+# Fixed seed: signatures are stored, so every process must draw the same permutations
+_rng = random.Random(20240301)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+_PACKING = struct.Struct(f'<{NUM_PERM}I')
+
+
+def normalize(text: str) -> str:
+    """Lowercase words without accents, separated by single spaces."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    kept = ''.join(c if c.isalnum() else ' ' for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(kept.casefold().split())
+
+
+def shingles(text: str) -> set:
+    """The character 3-grams of the normalized text."""
+    text = normalize(text)
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def _hash64(value: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), 'little')
+
+
+def minhash(text: str) -> tuple:
+    """
+    MinHash signature of a text.
+
+    The share of equal positions in two signatures estimates the Jaccard
+    similarity of the 3-gram sets of the texts.
+
+    Args:
+        text (str): Any text
+
+    Returns:
+        tuple: NUM_PERM integers below 2**32
+    """
+    hashes = [_hash64(shingle.encode('utf-8')) for shingle in shingles(text)]
+    if not hashes:
+        return (_MAX_HASH,) * NUM_PERM
+    return tuple(min([(a * h + b) % _PRIME for h in hashes]) & _MAX_HASH for a, b in _PERMUTATIONS)
+
+
+def request_text(title: str, notes: Optional[str]) -> str:
+    """The text of a generation request that guides are compared on."""
+    return f'{title or ""}\n{notes or ""}'
+
+
+def band_keys(signature: Sequence[int], subject_id: int) -> List[int]:
+    """One key per band of the signature; only guides of the same subject can share keys."""
+    keys = []
+    for band in range(BANDS):
+        values = signature[band * ROWS:(band + 1) * ROWS]
+        packed = struct.pack(f'<3I{ROWS}I', subject_id, band, ROWS, *values)
+        # Kept within a signed 64-bit column
+        keys.append(_hash64(packed) >> 1)
+    return keys
+
+
+def similarity(first: Sequence[int], second: Sequence[int]) -> float:
+    """Estimated Jaccard similarity of the texts behind two signatures."""
+    return sum(1 for x, y in zip(first, second) if x == y) / NUM_PERM
+
+
+def remember(lab_guide: LabGuide, notes: Optional[str] = None) -> LabGuideSignature:
+    """
+    Attach the signature of the request a guide was generated from.
+
+    The signature is added to the session with the guide and deleted with
+    it. Nothing is flushed, so it can be called before the guide has an ID.
+
+    Args:
+        lab_guide (LabGuide): The new guide
+        notes (str): Additional notes of the request
+
+    Returns:
+        LabGuideSignature: The signature
+    """
+    signature = minhash(request_text(lab_guide.title, notes))
+    lab_guide.signature = LabGuideSignature(
+        minhash=_PACKING.pack(*signature),
+        bands=[LabGuideBand(band_key=key) for key in set(band_keys(signature, lab_guide.subject_id))],
+    )
+    return lab_guide.signature
+
+
+@dataclass
+class SimilarGuide:
+    id: int
+    title: str
+    status: str
+    weekly_topic_id: int
+    week_number: int
+    topic_title: str
+    created_at: datetime
+    similarity: float
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'title': self.title,
+            'status': self.status,
+            'weekly_topic_id': self.weekly_topic_id,
+            'week_number': self.week_number,
+            'topic_title': self.topic_title,
+            'created_at': self.created_at.isoformat(),
+            'similarity': round(self.similarity, 2),
+        }
+
+
+def find_similar(subject_id: int,
+                 weekly_topic_id: int,
+                 title: str,
+                 notes: Optional[str] = None,
+                 threshold: float = DEFAULT_THRESHOLD,
+                 limit: int = 5) -> List[SimilarGuide]:
+    """
+    Guides of a subject generated from a request similar to this one.
+
+    Args:
+        subject_id (int): Subject of the new guide
+        weekly_topic_id (int): Weekly topic of the new guide
+        title (str): Requested title
+        notes (str): Requested additional notes
+        threshold (float): Minimum estimated similarity, between 0 and 1
+        limit (int): Maximum number of guides returned
+
+    Returns:
+        list: SimilarGuide entries, guides of the same topic first, then the most similar
+    """
+    signature = minhash(request_text(title, notes))
+    candidates = (db.session.query(LabGuideSignature.lab_guide_id, LabGuideSignature.minhash)
+                  .join(LabGuideBand, LabGuideBand.lab_guide_id == LabGuideSignature.lab_guide_id)
+                  .filter(LabGuideBand.band_key.in_(band_keys(signature, subject_id)))
+                  .distinct()
+                  .all())
+    scores = {}
+    for lab_guide_id, packed in candidates:
+        score = similarity(signature, _PACKING.unpack(packed))
+        if score >= threshold:
+            scores[lab_guide_id] = score
+    if not scores:
+        return []
+
+    rows = (db.session.query(LabGuide.id, LabGuide.title, LabGuide.status, LabGuide.weekly_topic_id,
+                             WeeklyTopic.week_number, WeeklyTopic.title, LabGuide.created_at)
+            .join(WeeklyTopic, WeeklyTopic.id == LabGuide.weekly_topic_id)
+            .filter(LabGuide.id.in_(scores), LabGuide.subject_id == subject_id)
+            .all())
+    similar = [SimilarGuide(*row, similarity=scores[row[0]]) for row in rows]
+    similar.sort(key=lambda guide: (guide.weekly_topic_id != weekly_topic_id, -guide.similarity, -guide.id))
+    return similar[:limit]
+
+
+def rebuild(batch_size: int = 500) -> int:
+    """
+    Add a signature to every guide that has none.
+
+    The notes come from the generation job that produced the guide, if any.
+
+    Args:
+        batch_size (int): Guides signed per transaction
+
+    Returns:
+        int: Number of guides signed
+    """
+    signed = 0
+    while True:
+        guides = (LabGuide.query
+                  .outerjoin(LabGuideSignature, LabGuideSignature.lab_guide_id == LabGuide.id)
+                  .filter(LabGuideSignature.lab_guide_id.is_(None))
+                  .order_by(LabGuide.id)
+                  .limit(batch_size)
+                  .all())
+        if not guides:
+            return signed
+        notes = dict(db.session.query(GenerationJob.lab_guide_id, GenerationJob.additional_notes)
+                     .filter(GenerationJob.lab_guide_id.in_([guide.id for guide in guides])))
+        for guide in guides:
+            remember(guide, notes.get(guide.id))
+        db.session.commit()
+        signed += len(guides)
@@ -0,0 +1,207 @@
+"""
+Identity Module
+
+This module loads the signed-in user for Flask-Login without reading the
+whole user on every request. The fields most requests need (username,
+email, user type, department, creation date and the IDs of the subjects a
+professor teaches) are read once and kept by each process as a Principal.
+Every request compares the version the Principal was read at with
+users.auth_version, which is bumped whenever the user is updated or their
+subjects change, so a change made through any process is seen by all of
+them on the next request. The session itself only holds the user ID and
+that version. Anything else, such as the subjects relationship, is served
+by the full ORM user, which is only loaded when a request actually uses it.
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from flask import session
+from flask_login import UserMixin, user_logged_in, user_logged_out
+from sqlalchemy import event, inspect
+
+from models import db, professor_subject, User, Professor
+
+SESSION_KEY = '_principal'
+
+
+class Principal(UserMixin):
+    """The signed-in user as cached by the process."""
+
+    def __init__(self, id: int, username: str, email: str, user_type: Optional[str],
+                 department: Optional[str], created_at: Optional[datetime], auth_version: int,
+                 subject_ids: FrozenSet[int] = frozenset()):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.user_type = user_type
+        self.department = department
+        self.created_at = created_at
+        self.auth_version = auth_version
+        self.subject_ids = frozenset(subject_ids)
+        self._user: Optional[User] = None
+
+    @property
+    def user(self) -> Optional[User]:
+        """The full ORM user, loaded on first use."""
+        if self._user is None:
+            self._user = db.session.get(User, self.id)
+        return self._user
+
+    def __getattr__(self, name):
+        # Only called for attributes a Principal does not have (subjects, check_password, ...)
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.user, name)
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'username': self.username,
+            'email': self.email,
+            'user_type': self.user_type,
+            'department': self.department,
+            'created_at': self.created_at,
+            'auth_version': self.auth_version,
+            'subject_ids': self.subject_ids,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Principal':
+        return cls(data['id'], data['username'], data['email'], data['user_type'],
+                   data['department'], data['created_at'], data['auth_version'], data['subject_ids'])
+
+
+def bump_auth_version(user: User):
+    """Make every process read a user's principal again on its next request (applied on flush)."""
+    if inspect(user).persistent:
+        # Incremented by the database, so concurrent bumps are never lost
+        user.auth_version = User.auth_version + 1
+
+
+def _on_user_changed(mapper, connection, target):
+    # Flushes that only touch relationships (e.g. a new guide of the professor) change nothing cached
+    state = inspect(target)
+    if state.attrs.auth_version.history.has_changes():
+        return
+    if state.session.is_modified(target, include_collections=False):
+        bump_auth_version(target)
+
+
+def _on_subjects_changed(target, value, initiator):
+    bump_auth_version(target)
+
+
+class IdentityCache:
+    """Per-process Principal cache checked against users.auth_version on every load."""
+
+    def __init__(self, app=None):
+        self.ttl = 60
+        # User ID -> (principal fields, time they were read)
+        self._principals: Dict[int, Tuple[Dict, float]] = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Bind the cache to a Flask application and version users and their subjects."""
+        app.config.setdefault('USER_IDENTITY_TTL', 60)
+        self.ttl = app.config['USER_IDENTITY_TTL']
+        app.extensions['identity_cache'] = self
+        # Mapper and attribute events are global: listen once however many caches are created
+        if not event.contains(User, 'before_update', _on_user_changed):
+            event.listen(User, 'before_update', _on_user_changed, propagate=True)
+        for name in ('append', 'remove'):
+            if not event.contains(Professor.subjects, name, _on_subjects_changed):
+                event.listen(Professor.subjects, name, _on_subjects_changed)
+        user_logged_in.connect(self._on_logged_in, app)
+        user_logged_out.connect(self._on_logged_out, app)
+
+    def _on_logged_in(self, sender, user, **extra):
+        principal = self._principal_of(user)
+        self._store(principal)
+        session[SESSION_KEY] = {'id': principal.id, 'auth_version': principal.auth_version}
+
+    def _on_logged_out(self, sender, user, **extra):
+        session.pop(SESSION_KEY, None)
+
+    def _principal_of(self, user: User) -> Principal:
+        subject_ids = frozenset()
+        if user.user_type == 'professor':
+            subject_ids = self._subject_ids(user.id)
+        principal = Principal(user.id, user.username, user.email, user.user_type,
+                              getattr(user, 'department', None), user.created_at, user.auth_version,
+                              subject_ids)
+        principal._user = user
+        return principal
+
+    @staticmethod
+    def _subject_ids(user_id: int) -> FrozenSet[int]:
+        return frozenset(subject_id for (subject_id,) in db.session.query(professor_subject.c.subject_id)
+                         .filter(professor_subject.c.professor_id == user_id))
+
+    def _query(self, user_id: int) -> Optional[Principal]:
+        professors = Professor.__table__
+        row = (db.session.query(User.id, User.username, User.email, User.user_type, User.created_at,
+                                User.auth_version, professors.c.department)
+               .outerjoin(professors, professors.c.id == User.id)
+               .filter(User.id == user_id)
+               .first())
+        if row is None:
+            return None
+        subject_ids = self._subject_ids(user_id) if row.user_type == 'professor' else frozenset()
+        return Principal(row.id, row.username, row.email, row.user_type, row.department, row.created_at,
+                         row.auth_version, subject_ids)
+
+    def _store(self, principal: Principal):
+        now = time.time()
+        with self._lock:
+            # Principals older than the TTL would be read again anyway
+            self._principals = {uid: entry for uid, entry in self._principals.items() if now - entry[1] < self.ttl}
+            self._principals[principal.id] = (principal.to_dict(), now)
+
+    def _cached(self, user_id: int, auth_version: int) -> Optional[Principal]:
+        with self._lock:
+            entry = self._principals.get(user_id)
+        if entry is None:
+            return None
+        data, loaded_at = entry
+        if data['auth_version'] != auth_version or time.time() - loaded_at >= self.ttl:
+            return None
+        return Principal.from_dict(data)
+
+    def load(self, user_id) -> Optional[Principal]:
+        """
+        Return the principal of a signed-in user, from the process cache while its version is current.
+
+        Costs one primary key lookup of users.auth_version per request; the
+        user and their subjects are only read again after they changed, or
+        after USER_IDENTITY_TTL seconds as a bound for changes made outside
+        the ORM.
+
+        Args:
+            user_id: The ID Flask-Login stored in the session
+
+        Returns:
+            Principal: The user, or None if the account no longer exists
+        """
+        user_id = int(user_id)
+        auth_version = db.session.query(User.auth_version).filter(User.id == user_id).scalar()
+        if auth_version is None:
+            session.pop(SESSION_KEY, None)
+            return None
+
+        seen = session.get(SESSION_KEY)
+        principal = None
+        if seen is not None and seen['id'] == user_id and seen['auth_version'] == auth_version:
+            principal = self._cached(user_id, auth_version)
+        if principal is None:
+            principal = self._query(user_id)
+            if principal is None:
+                session.pop(SESSION_KEY, None)
+                return None
+            self._store(principal)
+            session[SESSION_KEY] = {'id': user_id, 'auth_version': principal.auth_version}
+        return principal
@@ -0,0 +1,224 @@
+"""
+Lab Guide Document Module
+
+This module derives a structured document from the HTML stored in
+LabGuide.content: a tree of sections and subsections, each holding
+paragraphs and lists, with the sections matched to the standard structure
+returned by get_lab_guide_structure. The HTML is read in a single pass, so
+renderers (such as the PDF renderer) can build their output straight from
+the tree without rewriting the stored string.
+"""
+
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from typing import Dict, List, Optional
+
+from lab_guide_format import get_lab_guide_structure
+
+BULLET_RE = re.compile(r'^[-•*]\s+(.+)$')
+NUMBERED_RE = re.compile(r'^\d{1,2}[.)]\s+(.+)$')
+# Numbering of a heading such as "2. OBJETIVOS"
+NUMBERED_TITLE_RE = re.compile(r'^\d{1,2}[.)]\s+')
+
+SECTION_TAGS = {'h1', 'h2'}
+SUBSECTION_TAGS = {'h3', 'h4', 'h5', 'h6'}
+# Tags that end the text collected so far
+BLOCK_TAGS = SECTION_TAGS | SUBSECTION_TAGS | {'p', 'li', 'ul', 'ol', 'div', 'br', 'hr', 'pre', 'table', 'tr'}
+
+
+@dataclass
+class GuideBlock:
+    """A paragraph, or a list whose items are kept in order."""
+    kind: str  # paragraph, list
+    text: str = ''
+    items: List[str] = field(default_factory=list)
+    ordered: bool = False
+
+
+@dataclass
+class GuideSection:
+    """A section (level 1) or subsection (level 2) of a lab guide."""
+    title: str
+    level: int = 1
+    blocks: List[GuideBlock] = field(default_factory=list)
+    subsections: List['GuideSection'] = field(default_factory=list)
+    structure_title: Optional[str] = None  # Title of the matching section of the standard structure
+    content_type: Optional[str] = None  # text or list, as declared by the standard structure
+
+
+@dataclass
+class GuideDocument:
+    """A lab guide as an ordered tree of sections."""
+    blocks: List[GuideBlock] = field(default_factory=list)  # Content before the first section
+    sections: List[GuideSection] = field(default_factory=list)
+
+
+def _normalize(title: str) -> str:
+    """Case- and accent-insensitive form of a title without its numbering, used for matching."""
+    title = NUMBERED_TITLE_RE.sub('', title.strip()).rstrip(':')
+    decomposed = unicodedata.normalize('NFKD', title.casefold())
+    return ' '.join(''.join(c for c in decomposed if not unicodedata.combining(c)).split())
+
+
+def _match(title: str, candidates: List[Dict]) -> Optional[Dict]:
+    """
+    Return the structure entry a heading refers to, e.g. PROCEDIMIENTO -> Procedimiento paso a paso.
+
+    Titles are compared after normalization: an equal title wins, otherwise
+    the heading matches the only entry whose title starts with the heading's
+    words, or whose words the heading starts with. Partial words never match.
+    """
+    words = _normalize(title).split()
+    if not words:
+        return None
+    partial = []
+    for candidate in candidates:
+        expected = _normalize(candidate['title']).split()
+        if words == expected:
+            return candidate
+        shortest = min(len(words), len(expected))
+        if words[:shortest] == expected[:shortest]:
+            partial.append(candidate)
+    return partial[0] if len(partial) == 1 else None
+
+
+class LabGuideHTMLParser(HTMLParser):
+    """Single-pass parser building a GuideDocument from stored lab guide HTML."""
+
+    def __init__(self, structure: Optional[Dict] = None):
+        super().__init__(convert_charrefs=True)
+        self.structure = structure or get_lab_guide_structure()
+        self.document = GuideDocument()
+        self._section: Optional[GuideSection] = None
+        self._subsection: Optional[GuideSection] = None
+        self._text: List[str] = []
+        self._heading: Optional[str] = None  # Tag of the heading being read
+        self._list: Optional[GuideBlock] = None  # Explicit <ul>/<ol> being read
+        self._skip_depth = 0  # Depth inside the institutional header, which is not content
+
+    # Targets -----------------------------------------------------------
+
+    @property
+    def _container(self):
+        return self._subsection or self._section or self.document
+
+    def _open_section(self, title: str):
+        section_spec = _match(title, self.structure['sections'])
+        content_type = None
+        if section_spec:
+            # A section with a single subsection takes that subsection's content type
+            subsections = section_spec.get('subsections', [])
+            content_type = section_spec.get('type') or (subsections[0].get('type') if len(subsections) == 1 else None)
+        self._section = GuideSection(
+            title=title,
+            level=1,
+            structure_title=section_spec['title'] if section_spec else None,
+            content_type=content_type
+        )
+        self._subsection = None
+        self.document.sections.append(self._section)
+
+    def _open_subsection(self, title: str):
+        if self._section is None:
+            self._open_section('')
+        spec = next((s for s in self.structure['sections'] if s['title'] == self._section.structure_title), None)
+        subsection_spec = _match(title, spec.get('subsections', [])) if spec else None
+        self._subsection = GuideSection(
+            title=title,
+            level=2,
+            structure_title=subsection_spec['title'] if subsection_spec else None,
+            content_type=subsection_spec.get('type') if subsection_spec else None
+        )
+        self._section.subsections.append(self._subsection)
+
+    def _add_line(self, line: str):
+        """Add a line of text to the current section as a paragraph or list item."""
+        blocks = self._container.blocks
+        last = blocks[-1] if blocks else None
+
+        bullet = BULLET_RE.match(line)
+        numbered = NUMBERED_RE.match(line)
+        is_list = bullet or numbered or getattr(self._container, 'content_type', None) == 'list'
+        if is_list:
+            item = (bullet or numbered).group(1) if (bullet or numbered) else line
+            ordered = bool(numbered)
+            if last is not None and last.kind == 'list' and last.ordered == ordered:
+                last.items.append(item)
+            else:
+                blocks.append(GuideBlock(kind='list', items=[item], ordered=ordered))
+        elif last is None or last.kind != 'paragraph' or last.text != line:
+            # Repeated consecutive lines are an artifact of the generation
+            blocks.append(GuideBlock(kind='paragraph', text=line))
+
+    def _flush(self):
+        """Close the text collected since the last block boundary."""
+        text = ' '.join(''.join(self._text).split())
+        self._text = []
+        if not text:
+            return
+        if self._heading in SECTION_TAGS:
+            self._open_section(text)
+        elif self._heading in SUBSECTION_TAGS:
+            self._open_subsection(text)
+        elif self._list is not None:
+            self._list.items.append(text)
+        elif not all(c == '_' for c in text):
+            self._add_line(text)
+
+    # HTMLParser callbacks ------------------------------------------------
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'div':
+            if self._skip_depth or ('class', 'institutional-header') in attrs:
+                self._skip_depth += 1
+        if self._skip_depth or tag not in BLOCK_TAGS:
+            return
+        self._flush()
+        if tag in SECTION_TAGS or tag in SUBSECTION_TAGS:
+            self._heading = tag
+        elif tag in ('ul', 'ol'):
+            self._list = GuideBlock(kind='list', ordered=tag == 'ol')
+
+    def handle_endtag(self, tag):
+        if tag == 'div' and self._skip_depth:
+            self._skip_depth -= 1
+            return
+        if self._skip_depth or tag not in BLOCK_TAGS:
+            return
+        self._flush()
+        if tag == self._heading:
+            self._heading = None
+        elif tag in ('ul', 'ol') and self._list is not None:
+            if self._list.items:
+                self._container.blocks.append(self._list)
+            self._list = None
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._text.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+        if self._list is not None and self._list.items:
+            self._container.blocks.append(self._list)
+            self._list = None
+
+
+def parse_lab_guide(content: str, structure: Optional[Dict] = None) -> GuideDocument:
+    """
+    Build the section tree of a lab guide from its stored HTML.
+
+    Args:
+        content (str): LabGuide.content
+        structure (dict): Structure to match sections against (defaults to get_lab_guide_structure())
+
+    Returns:
+        GuideDocument: The sections of the guide, in order
+    """
+    parser = LabGuideHTMLParser(structure)
+    parser.feed(content)
+    parser.close()
+    return parser.document
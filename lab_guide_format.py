@@ -3,8 +3,62 @@ Lab Guide Format Module
 
 This module defines the structure and formatting for laboratory guides,
 including functions to format the content and clean markdown formatting.
+
+Both the markdown cleaner and the formatter of generated plain text read
+their input in a single pass, line by line, escape HTML as they go and
+collect the output in a list that is joined once, so their cost grows
+linearly with the size of the AI output. IncrementalFormatter applies the
+same rules to text that arrives in fragments while the AI is streaming.
 """
 
+import re
+from html import escape
+
+# Inline markdown, matched in one scan of a line: **bold**, *italics*, `code` and [text](url).
+# A url may hold one level of balanced parentheses, as in Wikipedia links.
+INLINE_RE = re.compile(
+    r'\*\*(?P<strong>[^*]+?)\*\*'
+    r'|\*(?P<em>[^*\s](?:[^*]*?[^*\s])?)\*'
+    r'|`(?P<code>[^`]+)`'
+    r'|\[(?P<text>[^\]]+)\]\((?P<href>(?:[^()\s]|\([^()\s]*\))+)\)'
+)
+# Link targets kept as links; anything else (e.g. javascript:) is shown as text
+SAFE_HREF_RE = re.compile(r'^(https?://|mailto:|/|#)', re.IGNORECASE)
+# List items in generated plain text: "- item", "• item", "* item" or "1. item"
+LIST_ITEM_RE = re.compile(r'^(?:[-•*]|(?P<number>\d{1,2})[.)])\s+(?P<text>.+)$')
+
+def format_inline(text: str) -> str:
+    """
+    Escapes a line of text and converts its inline markdown to HTML in one pass.
+    
+    Args:
+        text (str): One line of text
+        
+    Returns:
+        str: The escaped line with <strong>, <em>, <code> and <a> elements
+    """
+    if '*' not in text and '`' not in text and '[' not in text:
+        # Most lines have no markdown at all
+        return escape(text, quote=False)
+    parts = []
+    position = 0
+    for match in INLINE_RE.finditer(text):
+        parts.append(escape(text[position:match.start()], quote=False))
+        position = match.end()
+        kind = match.lastgroup
+        if kind == 'strong':
+            parts.append(f'<strong>{escape(match.group("strong"), quote=False)}</strong>')
+        elif kind == 'em':
+            parts.append(f'<em>{escape(match.group("em"), quote=False)}</em>')
+        elif kind == 'code':
+            parts.append(f'<code>{escape(match.group("code"), quote=False)}</code>')
+        elif SAFE_HREF_RE.match(match.group('href')):
+            parts.append(f'<a href="{escape(match.group("href"))}">{escape(match.group("text"), quote=False)}</a>')
+        else:
+            parts.append(escape(match.group('text'), quote=False))
+    parts.append(escape(text[position:], quote=False))
+    return ''.join(parts)
+
 def get_lab_guide_structure() -> dict:
     """
     Returns the standard structure for laboratory guides.
@@ -112,61 +166,57 @@ def clean_markdown_formatting(content: str) -> str:
     Returns:
         str: Cleaned content with proper HTML formatting
     """
-    # First, handle headers with proper HTML structure
-    lines = content.split('\n')
+    headers = {'# ': 'h1', '## ': 'h2', '### ': 'h3', '#### ': 'h4'}
     formatted_lines = []
     in_list = False
+    in_code = False
+    previous_blank = False
     
-    for line in lines:
-        # Handle headers
-        if line.startswith('# '):
-            formatted_lines.append(f'<h1>{line[2:]}</h1>')
-        elif line.startswith('## '):
-            formatted_lines.append(f'<h2>{line[3:]}</h2>')
-        elif line.startswith('### '):
-            formatted_lines.append(f'<h3>{line[4:]}</h3>')
-        elif line.startswith('#### '):
-            formatted_lines.append(f'<h4>{line[5:]}</h4>')
+    for line in content.split('\n'):
+        # Handle code blocks, kept verbatim
+        if line.startswith('```'):
+            if in_list:
+                formatted_lines.append('</ul>')
+                in_list = False
+            formatted_lines.append('</code></pre>' if in_code else '<pre><code>')
+            in_code = not in_code
+            continue
+        if in_code:
+            formatted_lines.append(escape(line, quote=False))
+            continue
+        
+        blank = line.strip() == ''
+        prefix = line[:line.find(' ') + 1] if line.startswith('#') else ''
         # Handle lists
-        elif line.startswith('- '):
+        if line.startswith('- '):
             if not in_list:
                 formatted_lines.append('<ul>')
                 in_list = True
-            formatted_lines.append(f'<li>{line[2:]}</li>')
-        # Handle empty lines and end of lists
-        elif line.strip() == '':
-            if in_list:
-                formatted_lines.append('</ul>')
-                in_list = False
-            formatted_lines.append('<br>')
-        # Handle regular text
+            formatted_lines.append(f'<li>{format_inline(line[2:])}</li>')
         else:
             if in_list:
                 formatted_lines.append('</ul>')
                 in_list = False
-            formatted_lines.append(f'<p>{line}</p>')
+            # Handle headers
+            if prefix in headers:
+                tag = headers[prefix]
+                formatted_lines.append(f'<{tag}>{format_inline(line[len(prefix):])}</{tag}>')
+            # Handle empty lines, collapsing runs of them
+            elif blank:
+                if not previous_blank:
+                    formatted_lines.append('<br>')
+            # Handle regular text
+            else:
+                formatted_lines.append(f'<p>{format_inline(line)}</p>')
+        previous_blank = blank
     
-    # Close any open list
+    # Close any open list or code block
     if in_list:
         formatted_lines.append('</ul>')
+    if in_code:
+        formatted_lines.append('</code></pre>')
     
-    # Join all lines and clean up any double line breaks
-    content = '\n'.join(formatted_lines)
-    content = content.replace('<br><br>', '<br>')
-    
-    # Handle any remaining markdown formatting
-    content = content.replace('**', '<strong>').replace('**', '</strong>')
-    content = content.replace('*', '<em>').replace('*', '</em>')
-    content = content.replace('`', '<code>').replace('`', '</code>')
-    
-    # Handle code blocks
-    content = content.replace('```', '<pre><code>').replace('```', '</code></pre>')
-    
-    # Handle links
-    import re
-    content = re.sub(r'\[([^\]]+)\]\(([^)]+)\)', r'<a href="\2">\1</a>', content)
-    
-    return content
+    return '\n'.join(formatted_lines)
 
 def format_lab_guide_content(content: str, professor_name: str, institution_info: dict) -> str:
     """
@@ -199,4 +249,186 @@ def format_lab_guide_content(content: str, professor_name: str, institution_info
     formatted_content = clean_markdown_formatting(content)
     
     # Combine header and content
-    return header + formatted_content 
\ No newline at end of file
+    return header + formatted_content 
+
+def format_guide_header(department: str,
+                        subject_code: str,
+                        subject_name: str,
+                        title: str,
+                        professor_name: str) -> str:
+    """
+    Builds the institutional header that opens every generated lab guide.
+    
+    Args:
+        department (str): Department of the professor
+        subject_code (str): Code of the subject
+        subject_name (str): Name of the subject
+        title (str): Title of the lab guide
+        professor_name (str): Name of the professor
+        
+    Returns:
+        str: HTML header, leaving the lab-guide-content div open
+    """
+    return f"""
+<div class="institutional-header">
+    <h1>Universidad Cooperativa de Colombia</h1>
+    <h2>{escape(department or '')}</h2>
+    <p><strong>Asignatura:</strong> {escape(subject_code)} - {escape(subject_name)}</p>
+    <p><strong>Laboratorio:</strong> {escape(title)}</p>
+    <p><strong>Docente:</strong> {escape(professor_name)}</p>
+    <p><strong>Semestre:</strong> 2024-1</p>
+</div>
+<hr>
+<div class="lab-guide-content">
+"""
+
+def format_generated_line(line: str) -> str:
+    """
+    Converts a single line of AI plain text output to HTML.
+    
+    Args:
+        line (str): One line of the generated content
+        
+    Returns:
+        str: The HTML block for the line, ending with a newline
+    """
+    line = line.strip()
+    if not line:  # Empty line
+        return '<br>\n'
+    elif line.isupper() and len(line) > 3:  # Section title
+        return f'<h2>{format_inline(line)}</h2>\n'
+    elif line.endswith(':'):  # Subsection title
+        return f'<h3>{format_inline(line)}</h3>\n'
+    else:  # Regular text
+        return f'<p>{format_inline(line)}</p>\n'
+
+class IncrementalFormatter:
+    """
+    Converts AI plain text to HTML as it arrives, one fragment at a time.
+    
+    Fragments may end in the middle of a line. Each line is formatted once,
+    as soon as the fragment that closes it is fed, so the cost of a fragment
+    depends only on its own size and never on the text seen before it.
+    Consecutive "- item" or "1. item" lines become a list that is streamed
+    too: the <ul> or <ol> tag is returned with the first item, every <li>
+    as soon as its line ends and the closing tag with the line (or the
+    close() call) that ends the list. The HTML returned is made of lines
+    that each hold one block, list item or list tag, so a page can append
+    it line by line; html is complete once close() has been called.
+    """
+
+    def __init__(self):
+        self._pending = []  # Fragments of the line that is still open
+        self._list_tag = None  # 'ul' or 'ol' while a list is open
+        self._blocks = []
+
+    @property
+    def html(self) -> str:
+        """All the HTML returned so far."""
+        return ''.join(self._blocks)
+
+    def feed(self, text: str) -> str:
+        """
+        Adds a fragment of generated text.
+        
+        Args:
+            text (str): The next fragment, with or without line breaks
+            
+        Returns:
+            str: HTML for the lines the fragment completes, or '' if none is complete yet
+        """
+        if '\n' not in text:
+            if text:
+                self._pending.append(text)
+            return ''
+        first, *middle, last = text.split('\n')
+        self._pending.append(first)
+        parts = [self._line(''.join(self._pending))]
+        parts.extend(self._line(line) for line in middle)
+        self._pending = [last] if last else []
+        return self._emit(parts)
+
+    def close(self) -> str:
+        """
+        Formats the last line and closes any open list.
+        
+        Returns:
+            str: The remaining HTML
+        """
+        parts = [self._line(''.join(self._pending)), self._close_list()]
+        self._pending = []
+        return self._emit(parts)
+
+    def _emit(self, parts) -> str:
+        html = ''.join(parts)
+        if html:
+            self._blocks.append(html)
+        return html
+
+    def _close_list(self) -> str:
+        if self._list_tag is None:
+            return ''
+        html = f'</{self._list_tag}>\n'
+        self._list_tag = None
+        return html
+
+    def _line(self, line: str) -> str:
+        stripped = line.strip()
+        # Numbered section titles such as "1. INTRODUCCION" stay titles
+        item = None if stripped.isupper() else LIST_ITEM_RE.match(stripped)
+        if item is None:
+            return self._close_list() + format_generated_line(stripped)
+        tag = 'ol' if item.group('number') else 'ul'
+        opened = ''
+        if tag != self._list_tag:
+            opened = f'{self._close_list()}<{tag}>\n'
+            self._list_tag = tag
+        return f'{opened}<li>{format_inline(item.group("text"))}</li>\n'
+
+def wrap_generated_guide(body: str,
+                         department: str,
+                         subject_code: str,
+                         subject_name: str,
+                         title: str,
+                         professor_name: str) -> str:
+    """
+    Adds the institutional header to the HTML body of a generated guide.
+    
+    Args:
+        body (str): HTML produced by an IncrementalFormatter
+        department (str): Department of the professor
+        subject_code (str): Code of the subject
+        subject_name (str): Name of the subject
+        title (str): Title of the lab guide
+        professor_name (str): Name of the professor
+        
+    Returns:
+        str: HTML content with the institutional header
+    """
+    return ''.join((format_guide_header(department, subject_code, subject_name, title, professor_name),
+                    body, '</div>'))
+
+def format_generated_guide(content: str,
+                           department: str,
+                           subject_code: str,
+                           subject_name: str,
+                           title: str,
+                           professor_name: str) -> str:
+    """
+    Converts the plain text returned by the AI into the HTML stored in LabGuide.content.
+    
+    Args:
+        content (str): Plain text generated by the AI
+        department (str): Department of the professor
+        subject_code (str): Code of the subject
+        subject_name (str): Name of the subject
+        title (str): Title of the lab guide
+        professor_name (str): Name of the professor
+        
+    Returns:
+        str: HTML content with the institutional header
+    """
+    formatter = IncrementalFormatter()
+    formatter.feed(content)
+    formatter.close()
+    return wrap_generated_guide(formatter.html, department, subject_code, subject_name, title, professor_name)
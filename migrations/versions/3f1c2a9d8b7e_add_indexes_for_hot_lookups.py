@@ -0,0 +1,44 @@
+"""Add indexes for hot lookups and one weekly topic per subject week
+
+Revision ID: 3f1c2a9d8b7e
+Revises: 
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d8b7e'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing tables were created by db.create_all(), which never adds
+    # indexes to a table that already exists; databases created after this
+    # change already have them, hence if_not_exists.
+    duplicates = op.get_bind().execute(sa.text(
+        'SELECT subject_id, week_number, COUNT(*) FROM weekly_topics '
+        'GROUP BY subject_id, week_number HAVING COUNT(*) > 1'
+    )).fetchall()
+    if duplicates:
+        listed = ', '.join(f'subject {subject_id} week {week}' for subject_id, week, _ in duplicates)
+        raise RuntimeError(f'Duplicate weekly topics must be merged before upgrading: {listed}')
+
+    op.create_index('ix_lab_guides_subject_id', 'lab_guides', ['subject_id'], if_not_exists=True)
+    op.create_index('ix_lab_guides_weekly_topic_id', 'lab_guides', ['weekly_topic_id'], if_not_exists=True)
+    op.create_index('ix_lab_guides_created_by_id', 'lab_guides', ['created_by_id'], if_not_exists=True)
+    op.create_index('uq_weekly_topics_subject_week', 'weekly_topics', ['subject_id', 'week_number'],
+                    unique=True, if_not_exists=True)
+    op.create_index('ix_professor_subject_subject_id', 'professor_subject', ['subject_id'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_professor_subject_subject_id', table_name='professor_subject', if_exists=True)
+    op.drop_index('uq_weekly_topics_subject_week', table_name='weekly_topics', if_exists=True)
+    op.drop_index('ix_lab_guides_created_by_id', table_name='lab_guides', if_exists=True)
+    op.drop_index('ix_lab_guides_weekly_topic_id', table_name='lab_guides', if_exists=True)
+    op.drop_index('ix_lab_guides_subject_id', table_name='lab_guides', if_exists=True)
@@ -0,0 +1,32 @@
+"""Add the lab_guide_fts full-text index of lab guides
+
+Revision ID: 8d2e4b6f1a3c
+Revises: 3f1c2a9d8b7e
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2e4b6f1a3c'
+down_revision = '3f1c2a9d8b7e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FTS5 is SQLite only. The table is filled by `flask index-guides`,
+    # since indexed content is stripped of HTML in Python (see guide_search).
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS lab_guide_fts USING fts5('
+        "title, content, topic_title, topic_description, tokenize='unicode61 remove_diacritics 2')"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute('DROP TABLE IF EXISTS lab_guide_fts')
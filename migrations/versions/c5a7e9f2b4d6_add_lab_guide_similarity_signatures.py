@@ -0,0 +1,40 @@
+"""Add lab guide similarity signatures and their LSH bands
+
+Revision ID: c5a7e9f2b4d6
+Revises: 8d2e4b6f1a3c
+Create Date: 2026-10-17 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a7e9f2b4d6'
+down_revision = '8d2e4b6f1a3c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases started after this change already have the tables from db.create_all().
+    # Existing guides are signed by `flask index-guides` (see guide_similarity).
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'lab_guide_signatures' not in tables:
+        op.create_table(
+            'lab_guide_signatures',
+            sa.Column('lab_guide_id', sa.Integer(), sa.ForeignKey('lab_guides.id'), primary_key=True),
+            sa.Column('minhash', sa.LargeBinary(), nullable=False),
+        )
+    if 'lab_guide_bands' not in tables:
+        op.create_table(
+            'lab_guide_bands',
+            sa.Column('band_key', sa.BigInteger(), primary_key=True),
+            sa.Column('lab_guide_id', sa.Integer(), sa.ForeignKey('lab_guide_signatures.lab_guide_id'),
+                      primary_key=True),
+        )
+
+
+def downgrade():
+    op.drop_table('lab_guide_bands', if_exists=True)
+    op.drop_table('lab_guide_signatures', if_exists=True)
@@ -0,0 +1,85 @@
+"""Add the generation_jobs table, its indexes and delete actions
+
+Revision ID: e4b8d1f6a2c9
+Revises: c5a7e9f2b4d6
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b8d1f6a2c9'
+down_revision = 'c5a7e9f2b4d6'
+branch_labels = None
+depends_on = None
+
+# Column of generation_jobs -> (referred table, ON DELETE action)
+ON_DELETE = {
+    'subject_id': ('subjects', 'CASCADE'),
+    'weekly_topic_id': ('weekly_topics', 'CASCADE'),
+    'lab_guide_id': ('lab_guides', 'SET NULL'),
+}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'generation_jobs' not in inspector.get_table_names():
+        op.create_table(
+            'generation_jobs',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('status', sa.String(20), nullable=False),
+            sa.Column('progress', sa.Integer(), nullable=False),
+            sa.Column('error', sa.Text(), nullable=True),
+            sa.Column('subject_id', sa.Integer(), sa.ForeignKey('subjects.id', ondelete='CASCADE'), nullable=False),
+            sa.Column('weekly_topic_id', sa.Integer(), sa.ForeignKey('weekly_topics.id', ondelete='CASCADE'),
+                      nullable=False),
+            sa.Column('created_by_id', sa.Integer(), sa.ForeignKey('professors.id'), nullable=False),
+            sa.Column('laboratory_id', sa.Integer(), sa.ForeignKey('laboratories.id'), nullable=True),
+            sa.Column('title', sa.String(200), nullable=False),
+            sa.Column('lab_number', sa.Integer(), nullable=False),
+            sa.Column('difficulty_level', sa.String(20), nullable=False),
+            sa.Column('estimated_duration', sa.Integer(), nullable=True),
+            sa.Column('additional_notes', sa.Text(), nullable=True),
+            sa.Column('use_cache', sa.Boolean(), nullable=False),
+            sa.Column('sectioned', sa.Boolean(), nullable=False),
+            sa.Column('lab_guide_id', sa.Integer(), sa.ForeignKey('lab_guides.id', ondelete='SET NULL'),
+                      nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('started_at', sa.DateTime(), nullable=True),
+            sa.Column('finished_at', sa.DateTime(), nullable=True),
+        )
+    else:
+        # Tables created by db.create_all() before the cache and sectioned generation existed
+        columns = {column['name'] for column in inspector.get_columns('generation_jobs')}
+        if 'use_cache' not in columns:
+            op.add_column('generation_jobs', sa.Column('use_cache', sa.Boolean(), nullable=False,
+                                                       server_default=sa.true()))
+        if 'sectioned' not in columns:
+            op.add_column('generation_jobs', sa.Column('sectioned', sa.Boolean(), nullable=False,
+                                                       server_default=sa.false()))
+        # SQLite does not enforce foreign keys here (see database.sqlite_pragmas) and the
+        # delete routes remove or unlink jobs first, so only other databases need the actions
+        if op.get_bind().dialect.name != 'sqlite':
+            for foreign_key in inspector.get_foreign_keys('generation_jobs'):
+                column = foreign_key['constrained_columns'][0]
+                if column not in ON_DELETE or foreign_key['options'].get('ondelete'):
+                    continue
+                referred_table, action = ON_DELETE[column]
+                op.drop_constraint(foreign_key['name'], 'generation_jobs', type_='foreignkey')
+                op.create_foreign_key(foreign_key['name'], 'generation_jobs', referred_table,
+                                      [column], ['id'], ondelete=action)
+
+    op.create_index('ix_generation_jobs_subject_id', 'generation_jobs', ['subject_id'], if_not_exists=True)
+    op.create_index('ix_generation_jobs_weekly_topic_id', 'generation_jobs', ['weekly_topic_id'],
+                    if_not_exists=True)
+    op.create_index('ix_generation_jobs_created_by_id', 'generation_jobs', ['created_by_id'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_generation_jobs_created_by_id', table_name='generation_jobs', if_exists=True)
+    op.drop_index('ix_generation_jobs_weekly_topic_id', table_name='generation_jobs', if_exists=True)
+    op.drop_index('ix_generation_jobs_subject_id', table_name='generation_jobs', if_exists=True)
+    # The table is left in place: db.create_all() may have created it before
+    # this revision ran, and the jobs in it outlive the schema change
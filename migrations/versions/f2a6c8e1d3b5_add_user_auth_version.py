@@ -0,0 +1,28 @@
+"""Add the auth version that signed-in sessions are checked against
+
+Revision ID: f2a6c8e1d3b5
+Revises: e4b8d1f6a2c9
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a6c8e1d3b5'
+down_revision = 'e4b8d1f6a2c9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases started after this change already have the column from db.create_all()
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('users')}
+    if 'auth_version' not in columns:
+        op.add_column('users', sa.Column('auth_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('auth_version')
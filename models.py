@@ -8,7 +8,8 @@ db = SQLAlchemy()
 # Association tables for many-to-many relationships
 professor_subject = db.Table('professor_subject',
     db.Column('professor_id', db.Integer, db.ForeignKey('professors.id'), primary_key=True),
-    db.Column('subject_id', db.Integer, db.ForeignKey('subjects.id'), primary_key=True)
+    # The primary key starts with professor_id; subject lookups need their own index
+    db.Column('subject_id', db.Integer, db.ForeignKey('subjects.id'), primary_key=True, index=True)
 )
 
 degree_subject = db.Table('degree_subject',
@@ -27,6 +28,7 @@ class User(db.Model, UserMixin):
         password_hash (str): Hashed password
         created_at (datetime): Account creation timestamp
         user_type (str): Type of user (for polymorphic behavior)
+        auth_version (int): Bumped whenever the user or their subjects change (see identity)
     """
     __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True)
@@ -35,6 +37,7 @@ class User(db.Model, UserMixin):
     password_hash = db.Column(db.String(128), nullable=False)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     user_type = db.Column(db.String(50))  # Used for polymorphic behavior
+    auth_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     __mapper_args__ = {
         'polymorphic_identity': 'user',
@@ -218,9 +221,9 @@ class LabGuide(db.Model):
     updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Foreign keys
-    subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id'), nullable=False)
-    weekly_topic_id = db.Column(db.Integer, db.ForeignKey('weekly_topics.id'), nullable=False)
-    created_by_id = db.Column(db.Integer, db.ForeignKey('professors.id'), nullable=False)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id'), nullable=False, index=True)
+    weekly_topic_id = db.Column(db.Integer, db.ForeignKey('weekly_topics.id'), nullable=False, index=True)
+    created_by_id = db.Column(db.Integer, db.ForeignKey('professors.id'), nullable=False, index=True)
     
     # Additional metadata
     status = db.Column(db.String(20), nullable=False, default='draft')  # draft, published, archived
@@ -253,6 +256,117 @@ class LabGuide(db.Model):
         self.status = 'archived'
         self.updated_at = datetime.utcnow()
 
+class LabGuideSignature(db.Model):
+    """
+    MinHash signature of the request (title and notes) a lab guide was generated from.
+    Attributes:
+        lab_guide_id (int): Primary key and foreign key to the lab guide
+        minhash (bytes): The signature, packed as unsigned 32-bit integers (see guide_similarity)
+    """
+    __tablename__ = 'lab_guide_signatures'
+    lab_guide_id = db.Column(db.Integer, db.ForeignKey('lab_guides.id'), primary_key=True)
+    minhash = db.Column(db.LargeBinary, nullable=False)
+
+    # Relationships
+    lab_guide = db.relationship('LabGuide', backref=db.backref('signature', uselist=False,
+                                                               cascade='all, delete-orphan'))
+    bands = db.relationship('LabGuideBand', cascade='all, delete-orphan')
+
+    def __repr__(self):
+        return f'<LabGuideSignature {self.lab_guide_id}>'
+
+class LabGuideBand(db.Model):
+    """
+    Hash of one band of a signature, used to find similar guides without comparing every signature.
+    Attributes:
+        band_key (int): Hash of the band and the subject of the guide
+        lab_guide_id (int): Foreign key to the signature
+    """
+    __tablename__ = 'lab_guide_bands'
+    band_key = db.Column(db.BigInteger, primary_key=True)
+    lab_guide_id = db.Column(db.Integer, db.ForeignKey('lab_guide_signatures.lab_guide_id'), primary_key=True)
+
+    def __repr__(self):
+        return f'<LabGuideBand {self.band_key} -> {self.lab_guide_id}>'
+
+class GenerationJob(db.Model):
+    """
+    Represents a queued AI generation of a lab guide.
+    Attributes:
+        id (int): Primary key
+        status (str): Status of the job (queued, running, succeeded, failed)
+        progress (int): Completion percentage reported to the client (0-100)
+        error (str): Error message when the job failed
+        subject_id (int): Foreign key to the subject the guide belongs to
+        weekly_topic_id (int): Foreign key to the weekly topic of the guide
+        created_by_id (int): Foreign key to the professor who requested it
+        laboratory_id (int): Foreign key to the assigned laboratory
+        title (str): Title requested for the lab guide
+        lab_number (int): The number of the lab
+        difficulty_level (str): Requested difficulty level
+        estimated_duration (int): Requested duration in minutes
+        additional_notes (str): Extra instructions for the AI
+        use_cache (bool): Whether an identical earlier generation may be reused
+        sectioned (bool): Whether the guide is generated section by section
+        lab_guide_id (int): Foreign key to the draft created by the job
+        created_at (datetime): When the job was enqueued
+        started_at (datetime): When a worker picked the job up
+        finished_at (datetime): When the job succeeded or failed
+    """
+    __tablename__ = 'generation_jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, succeeded, failed
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+
+    # Generation parameters
+    # A job goes with its subject or topic; deleting its guide only unlinks it
+    subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id', ondelete='CASCADE'), nullable=False, index=True)
+    weekly_topic_id = db.Column(db.Integer, db.ForeignKey('weekly_topics.id', ondelete='CASCADE'),
+                                nullable=False, index=True)
+    created_by_id = db.Column(db.Integer, db.ForeignKey('professors.id'), nullable=False, index=True)
+    laboratory_id = db.Column(db.Integer, db.ForeignKey('laboratories.id'), nullable=True)
+    title = db.Column(db.String(200), nullable=False)
+    lab_number = db.Column(db.Integer, nullable=False)
+    difficulty_level = db.Column(db.String(20), nullable=False, default='intermediate')
+    estimated_duration = db.Column(db.Integer, nullable=True)
+    additional_notes = db.Column(db.Text, nullable=True)
+    use_cache = db.Column(db.Boolean, nullable=False, default=True)
+    sectioned = db.Column(db.Boolean, nullable=False, default=False)
+
+    # Result
+    lab_guide_id = db.Column(db.Integer, db.ForeignKey('lab_guides.id', ondelete='SET NULL'), nullable=True)
+
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    # Relationships
+    subject = db.relationship('Subject')
+    weekly_topic = db.relationship('WeeklyTopic')
+    created_by = db.relationship('Professor', backref=db.backref('generation_jobs', lazy='dynamic'))
+    lab_guide = db.relationship('LabGuide')
+
+    def __repr__(self):
+        return f'<GenerationJob {self.id} - {self.status}>'
+
+    @property
+    def is_finished(self):
+        return self.status in ('succeeded', 'failed')
+
+    def succeed(self, lab_guide):
+        """Mark the job as done and link the generated draft"""
+        self.status = 'succeeded'
+        self.progress = 100
+        self.lab_guide = lab_guide
+        self.finished_at = datetime.utcnow()
+
+    def fail(self, error):
+        """Mark the job as failed with the given error message"""
+        self.status = 'failed'
+        self.error = error
+        self.finished_at = datetime.utcnow()
+
 class WeeklyTopic(db.Model):
     """
     Represents a weekly topic in a subject.
@@ -264,6 +378,10 @@ class WeeklyTopic(db.Model):
         subject_id (int): Foreign key to the associated subject
     """
     __tablename__ = 'weekly_topics'
+    __table_args__ = (
+        # One topic per week of a subject; also serves lookups by subject ordered by week
+        db.Index('uq_weekly_topics_subject_week', 'subject_id', 'week_number', unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
     week_number = db.Column(db.Integer, nullable=False)
     title = db.Column(db.String(200), nullable=False)
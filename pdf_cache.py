@@ -0,0 +1,180 @@
+"""
+PDF Cache Module
+
+This module keeps rendered lab guide PDFs on disk so that a guide
+downloaded by a whole class is only rendered once. Entries are keyed on
+the guide id, its last modification time, what the header shows of its
+subject and author, and the PDF template version; editing or deleting a
+guide drops its entries, and the least recently used files are evicted
+once the cache exceeds its size limit.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Dict, Optional
+
+from sqlalchemy import event
+
+from models import LabGuide
+from pdf_renderer import PDF_TEMPLATE_VERSION
+
+
+class PDFCache:
+    """Size-bounded directory of rendered lab guide PDFs."""
+
+    def __init__(self, app=None):
+        self.directory = None
+        self.max_bytes = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Bind the cache to a Flask application and invalidate it on guide changes."""
+        app.config.setdefault('PDF_CACHE_DIR', os.path.join(app.instance_path, 'pdf_cache'))
+        app.config.setdefault('PDF_CACHE_MAX_BYTES', 200 * 1024 * 1024)
+        self.directory = app.config['PDF_CACHE_DIR']
+        self.max_bytes = app.config['PDF_CACHE_MAX_BYTES']
+        os.makedirs(self.directory, exist_ok=True)
+        app.extensions['pdf_cache'] = self
+
+        event.listen(LabGuide, 'after_update', self._on_guide_changed)
+        event.listen(LabGuide, 'after_delete', self._on_guide_changed)
+
+    @staticmethod
+    def key(lab_guide: LabGuide) -> str:
+        """
+        Cache key (also used as ETag) of the current version of a guide.
+
+        Renaming the subject or the author does not touch the guide, but
+        changes the header of its PDF, so what the header shows is keyed too.
+
+        Args:
+            lab_guide: The guide to key
+
+        Returns:
+            '<guide id>-<digest of its version, its header fields and the template version>'
+        """
+        subject, author = lab_guide.subject, lab_guide.created_by
+        version = json.dumps([lab_guide.updated_at.isoformat(), subject.code, subject.name,
+                              author.username, author.department, PDF_TEMPLATE_VERSION], ensure_ascii=False)
+        return f'{lab_guide.id}-{hashlib.sha256(version.encode("utf-8")).hexdigest()[:16]}'
+
+    def path(self, key: str) -> str:
+        """Location of the PDF for key, whether or not it is cached yet."""
+        return os.path.join(self.directory, f'{key}.pdf')
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the cached PDF for key, or None."""
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        # The modification time doubles as the last access time for eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def path_for(self, key: str) -> Optional[str]:
+        """Return the path of the cached PDF for key, or None; the file may be evicted later."""
+        path = self.path(key)
+        try:
+            # The modification time doubles as the last access time for eviction
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def set(self, key: str, data: bytes):
+        """Store a rendered PDF and evict the least recently used ones if needed."""
+        # Write to a temporary file first so readers never see a partial PDF
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path(key))
+        self._evict(keep=self.path(key))
+
+    def added(self, key: str):
+        """Account for a PDF written directly to path(key), e.g. by a render process."""
+        self._evict(keep=self.path(key))
+
+    def _evict(self, keep: Optional[str] = None):
+        if not self.max_bytes:
+            return
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pdf'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort(reverse=True)
+
+        kept_bytes = 0
+        for _, size, path in entries:
+            kept_bytes += size
+            # The entry just added is never evicted, even if it alone exceeds the limit
+            if kept_bytes > self.max_bytes and path != keep:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def invalidate(self, guide_id: int):
+        """Drop every cached version of a guide."""
+        prefix = f'{guide_id}-'
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith(prefix) and entry.name.endswith('.pdf'):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pdf'):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+    def _on_guide_changed(self, mapper, connection, lab_guide: LabGuide):
+        self.invalidate(lab_guide.id)
+
+    def stats(self) -> Dict:
+        """Counters for monitoring the cache effectiveness."""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        sizes = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pdf'):
+                try:
+                    sizes.append(entry.stat().st_size)
+                except OSError:
+                    continue
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'entries': len(sizes),
+            'bytes': sum(sizes),
+        }
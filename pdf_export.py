@@ -0,0 +1,273 @@
+"""
+PDF Export Module
+
+This module exports many lab guides at once as a ZIP of PDFs, e.g. every
+guide of a subject or of a professor at the end of the term. The guides
+are snapshotted from the database up front; PDFs already in the PDF cache
+are reused and the others are rendered into the cache by the render pool
+that also serves single downloads. The archive is produced incrementally,
+so neither the PDFs nor the ZIP are ever held in memory as a whole.
+Progress is written to an ExportProgressStore, which the page polls while
+the browser saves the archive.
+"""
+
+import json
+import os
+import re
+import tempfile
+import time
+import unicodedata
+import zipfile
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy.orm import joinedload
+
+from models import LabGuide
+from pdf_cache import PDFCache
+from pdf_renderer import GuideSnapshot
+from render_pool import RenderPool, RenderPoolSaturated
+
+CHUNK_SIZE = 64 * 1024
+# IDs the page picks for an export it wants to follow
+EXPORT_ID_RE = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+
+@dataclass
+class ExportProgress:
+    """Progress of an export, reported after every finished entry."""
+    done: int
+    total: int
+    rendered: int = 0
+    cached: int = 0
+    failed: int = 0
+    current: Optional[str] = None  # Archive name of the last finished entry
+
+
+ProgressCallback = Callable[[ExportProgress], None]
+
+
+class ExportProgressStore:
+    """
+    Progress of the running exports, kept on disk so any web process can report it.
+
+    A browser saving a download cannot read it as it arrives, so the page
+    picks an export ID, passes it with the download and polls the progress
+    under that ID. Entries are keyed on the user and the ID; entries older
+    than EXPORT_PROGRESS_TTL seconds are removed when new exports start.
+    """
+
+    def __init__(self, app=None):
+        self.directory = None
+        self.ttl = 3600
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Bind the store to a Flask application."""
+        pdf_cache_dir = app.config.get('PDF_CACHE_DIR', os.path.join(app.instance_path, 'pdf_cache'))
+        app.config.setdefault('EXPORT_PROGRESS_DIR', os.path.join(pdf_cache_dir, 'exports'))
+        app.config.setdefault('EXPORT_PROGRESS_TTL', 3600)
+        self.directory = app.config['EXPORT_PROGRESS_DIR']
+        self.ttl = app.config['EXPORT_PROGRESS_TTL']
+        os.makedirs(self.directory, exist_ok=True)
+        app.extensions['export_progress'] = self
+
+    def _path(self, user_id: int, export_id: str) -> str:
+        return os.path.join(self.directory, f'{user_id}-{export_id}.json')
+
+    def start(self, user_id: int, export_id: str, total: int) -> ProgressCallback:
+        """
+        Record a new export of total guides.
+
+        Args:
+            user_id: The user downloading the export
+            export_id: ID chosen by the page, matching EXPORT_ID_RE
+            total: Number of guides in the export
+
+        Returns:
+            The progress callback to pass to stream_export_zip
+        """
+        self._expire()
+        self._write(user_id, export_id, ExportProgress(done=0, total=total))
+        return lambda progress: self._write(user_id, export_id, progress)
+
+    def _write(self, user_id: int, export_id: str, progress: ExportProgress):
+        status = asdict(progress)
+        status['finished'] = progress.done == progress.total
+        # Write to a temporary file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(status, f)
+        os.replace(tmp_path, self._path(user_id, export_id))
+
+    def get(self, user_id: int, export_id: str) -> Optional[Dict]:
+        """Return the last progress of an export of the user, or None if unknown."""
+        try:
+            with open(self._path(user_id, export_id), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                continue
+
+
+class _ZipStream:
+    """Write-only, non-seekable file object whose content is drained in chunks."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _slug(text: str) -> str:
+    """ASCII, filesystem-safe form of a title."""
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^A-Za-z0-9]+', '_', text).strip('_').lower() or 'guia'
+
+
+def archive_name(snapshot: GuideSnapshot) -> str:
+    """Path of a guide inside the export, grouped by subject."""
+    return (f'{_slug(snapshot.subject.code).upper()}/'
+            f'{snapshot.lab_number:02d}_{_slug(snapshot.title)}_{snapshot.id}.pdf')
+
+
+def guides_for_subjects(subject_ids: List[int]) -> List[LabGuide]:
+    """All lab guides of the given subjects, with what the renderer reads loaded up front."""
+    if not subject_ids:
+        return []
+    return (LabGuide.query
+            .filter(LabGuide.subject_id.in_(subject_ids))
+            .options(joinedload(LabGuide.subject), joinedload(LabGuide.created_by))
+            .order_by(LabGuide.subject_id, LabGuide.lab_number, LabGuide.id)
+            .all())
+
+
+def snapshot_guides(lab_guides: Iterable[LabGuide], cache: PDFCache) -> List[GuideSnapshot]:
+    """Detach guides from the session so that they can be rendered in other processes."""
+    return [GuideSnapshot.from_lab_guide(lab_guide, cache.key(lab_guide)) for lab_guide in lab_guides]
+
+
+def _copy_into(archive: zipfile.ZipFile, name: str, path: str, stream: _ZipStream) -> Iterator[bytes]:
+    """Add the file at path to the archive as name, yielding the archive chunks as they are produced."""
+    with open(path, 'rb') as source, archive.open(name, 'w') as entry:
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            entry.write(chunk)
+            yield stream.drain()
+
+
+def stream_export_zip(snapshots: List[GuideSnapshot],
+                      cache: PDFCache,
+                      pool: RenderPool,
+                      progress: Optional[ProgressCallback] = None) -> Iterator[bytes]:
+    """
+    Produce a ZIP archive with the PDF of every guide, chunk by chunk.
+
+    Cached PDFs are copied into the archive first. The others are rendered
+    into the cache by the shared render pool, at most pool.max_workers at a
+    time for this export, and added in the order they finish. When the pool
+    is saturated the export waits for its own renders (or for the pool's
+    retry hint) instead of failing, so concurrent exports and downloads
+    share the same bounded set of processes. Guides that fail to render are
+    listed in ERRORES.txt at the end of the archive.
+
+    Args:
+        snapshots: Guides to export
+        cache: PDF cache to reuse and fill
+        pool: Render pool the missing PDFs are rendered in
+        progress: Called with an ExportProgress after every entry
+
+    Yields:
+        Consecutive chunks of the ZIP archive
+    """
+    state = ExportProgress(done=0, total=len(snapshots))
+    failures = []
+
+    def report(name: str):
+        state.done += 1
+        state.current = name
+        if progress is not None:
+            progress(state)
+
+    stream = _ZipStream()
+    # PDFs are already compressed: the fastest deflate level is enough
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+        to_render = deque()
+        for snapshot in snapshots:
+            path = cache.path_for(snapshot.cache_key)
+            if path is None:
+                to_render.append(snapshot)
+                continue
+            name = archive_name(snapshot)
+            try:
+                yield from _copy_into(archive, name, path, stream)
+            except FileNotFoundError:
+                # Evicted between the lookup and the copy
+                to_render.append(snapshot)
+                continue
+            state.cached += 1
+            report(name)
+
+        futures = {}
+        while to_render or futures:
+            while to_render and len(futures) < pool.max_workers:
+                snapshot = to_render[0]
+                try:
+                    future = pool.submit(snapshot, cache.path(snapshot.cache_key))
+                except RenderPoolSaturated as e:
+                    if not futures:
+                        # Nothing of ours to wait for: back off as a download would be told to
+                        time.sleep(e.retry_after)
+                    break
+                to_render.popleft()
+                futures[future] = snapshot
+            if not futures:
+                continue
+
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                snapshot = futures.pop(future)
+                name = archive_name(snapshot)
+                try:
+                    path = future.result()
+                except Exception as e:
+                    failures.append(f'{name}: {str(e)}')
+                    state.failed += 1
+                    report(name)
+                    continue
+                cache.added(snapshot.cache_key)
+                try:
+                    yield from _copy_into(archive, name, path, stream)
+                except FileNotFoundError:
+                    # Evicted by the renders that finished after it
+                    to_render.append(snapshot)
+                    continue
+                state.rendered += 1
+                report(name)
+
+        if failures:
+            archive.writestr('ERRORES.txt', '\n'.join(failures) + '\n')
+    yield stream.drain()
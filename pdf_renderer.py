@@ -0,0 +1,379 @@
+"""
+PDF Renderer Module
+
+This module renders a LabGuide as a PDF document with ReportLab. The
+stylesheet, the fonts and the logo are prepared once per process by
+LabGuidePDFRenderer and reused by every render. The output only depends
+on the guide (and its author), so rendered documents can be cached and
+shared between everyone who downloads the same guide.
+"""
+
+import logging
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import BinaryIO, Optional
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle, StyleSheet1
+from reportlab.lib.units import cm
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Flowable, ListFlowable, ListItem
+from reportlab.lib.fonts import addMapping
+
+from lab_guide_document import GuideDocument, parse_lab_guide
+
+# Bump whenever the layout changes so that cached PDFs are rendered again.
+# 4: the footer shows when the guide was last updated rather than when the
+# PDF was rendered, which a cached PDF would have frozen at its first render.
+PDF_TEMPLATE_VERSION = '4'
+
+logger = logging.getLogger(__name__)
+
+LOGO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'images', 'logou.png')
+LOGO_SIZE = 2*cm
+# Resolution the logo is downscaled to; the source image is far larger than 2 cm needs
+LOGO_DPI = 300
+
+
+@dataclass(frozen=True)
+class SubjectSnapshot:
+    code: str
+    name: str
+
+
+@dataclass(frozen=True)
+class AuthorSnapshot:
+    username: str
+    department: Optional[str]
+
+
+@dataclass(frozen=True)
+class GuideSnapshot:
+    """
+    Detached, picklable copy of everything the renderer reads from a LabGuide.
+
+    Snapshots are rendered in worker processes, which have no database session.
+    """
+    id: int
+    title: str
+    content: str
+    lab_number: int
+    subject: SubjectSnapshot
+    created_by: AuthorSnapshot
+    updated_at: datetime
+    cache_key: str
+
+    @classmethod
+    def from_lab_guide(cls, lab_guide, cache_key: str) -> 'GuideSnapshot':
+        return cls(
+            id=lab_guide.id,
+            title=lab_guide.title,
+            content=lab_guide.content,
+            lab_number=lab_guide.lab_number,
+            subject=SubjectSnapshot(code=lab_guide.subject.code, name=lab_guide.subject.name),
+            created_by=AuthorSnapshot(username=lab_guide.created_by.username,
+                                      department=lab_guide.created_by.department),
+            updated_at=lab_guide.updated_at,
+            cache_key=cache_key
+        )
+
+
+class LogoFlowable(Flowable):
+    """Draws a prepared ImageReader, so the image is not decoded again for every document."""
+
+    def __init__(self, image: ImageReader, width: float, height: float):
+        super().__init__()
+        self.image = image
+        self.width = width
+        self.height = height
+        self.hAlign = 'CENTER'
+
+    def wrap(self, available_width, available_height):
+        return self.width, self.height
+
+    def draw(self):
+        self.canv.drawImage(self.image, 0, 0, self.width, self.height, mask='auto')
+
+
+class LabGuidePDFRenderer:
+    """
+    Renders lab guides with a stylesheet, fonts and logo prepared once.
+
+    Everything is built lazily on first use and then only read, so a single
+    renderer can be shared by all requests (and threads) of a process.
+    """
+
+    def __init__(self,
+                 logo_path: Optional[str] = LOGO_PATH,
+                 font_path: Optional[str] = None,
+                 bold_font_path: Optional[str] = None):
+        """
+        Args:
+            logo_path: PNG/JPEG drawn above the header (None for no logo)
+            font_path: TrueType font for the text (defaults to PDF_FONT_PATH, else Helvetica)
+            bold_font_path: TrueType font for bold text (defaults to PDF_FONT_BOLD_PATH)
+        """
+        self.logo_path = logo_path
+        self.font_path = font_path or os.getenv('PDF_FONT_PATH')
+        self.bold_font_path = bold_font_path or os.getenv('PDF_FONT_BOLD_PATH')
+        self._styles: Optional[StyleSheet1] = None
+        self._logo: Optional[ImageReader] = None
+        self._logo_loaded = False
+        self._lock = threading.Lock()
+
+    def _register_fonts(self) -> Optional[str]:
+        """Register the configured TrueType fonts and return the family name, if any."""
+        if not self.font_path:
+            return None
+        family = 'LabGuideFont'
+        bold = family + '-Bold'
+        pdfmetrics.registerFont(TTFont(family, self.font_path))
+        pdfmetrics.registerFont(TTFont(bold, self.bold_font_path or self.font_path))
+        # Map <b> and <i> markup in paragraphs to the registered faces
+        addMapping(family, 0, 0, family)
+        addMapping(family, 1, 0, bold)
+        addMapping(family, 0, 1, family)
+        addMapping(family, 1, 1, bold)
+        return family
+
+    def _build_styles(self) -> StyleSheet1:
+        styles = getSampleStyleSheet()
+        font_name = self._register_fonts()
+        if font_name:
+            for style in styles.byName.values():
+                style.fontName = font_name
+        styles.add(ParagraphStyle(
+            name='Header',
+            parent=styles['Heading1'],
+            fontSize=18,
+            spaceAfter=30,
+            alignment=1,  # Center alignment
+            textColor=colors.HexColor('#003366')
+        ))
+        styles.add(ParagraphStyle(
+            name='SubHeader',
+            parent=styles['Heading2'],
+            fontSize=14,
+            spaceAfter=20,
+            alignment=1,
+            textColor=colors.HexColor('#003366')
+        ))
+        styles.add(ParagraphStyle(
+            name='CustomBodyText',
+            parent=styles['Normal'],
+            fontSize=11,
+            spaceAfter=12,
+            leading=14
+        ))
+        styles.add(ParagraphStyle(
+            name='GuideSection',
+            parent=styles['Heading2'],
+            fontSize=13,
+            spaceBefore=14,
+            spaceAfter=8,
+            keepWithNext=1,
+            textColor=colors.HexColor('#003366')
+        ))
+        styles.add(ParagraphStyle(
+            name='GuideSubsection',
+            parent=styles['Heading3'],
+            fontSize=11.5,
+            spaceBefore=8,
+            spaceAfter=6,
+            keepWithNext=1
+        ))
+        styles.add(ParagraphStyle(
+            name='GuideListItem',
+            parent=styles['CustomBodyText'],
+            spaceAfter=4
+        ))
+        styles.add(ParagraphStyle(
+            name='Footer',
+            parent=styles['Normal'],
+            fontSize=9,
+            textColor=colors.gray,
+            alignment=1
+        ))
+        return styles
+
+    def _load_logo(self) -> Optional[ImageReader]:
+        if not self.logo_path or not os.path.exists(self.logo_path):
+            logger.warning('University logo file not found at %s', self.logo_path)
+            return None
+        try:
+            from PIL import Image as PILImage
+            with PILImage.open(self.logo_path) as image:
+                pixels = round(LOGO_SIZE / 72 * LOGO_DPI)
+                image.thumbnail((pixels, pixels))
+                image.load()
+                logo = ImageReader(image.copy())
+            # Decode the pixels now so that renders only read them
+            logo.getRGBData()
+            return logo
+        except Exception:
+            logger.exception('Error loading logo from %s', self.logo_path)
+            return None
+
+    @property
+    def styles(self) -> StyleSheet1:
+        if self._styles is None:
+            with self._lock:
+                if self._styles is None:
+                    self._styles = self._build_styles()
+        return self._styles
+
+    @property
+    def logo(self) -> Optional[ImageReader]:
+        if not self._logo_loaded:
+            with self._lock:
+                if not self._logo_loaded:
+                    self._logo = self._load_logo()
+                    self._logo_loaded = True
+        return self._logo
+
+    def _append_blocks(self, story: list, blocks):
+        styles = self.styles
+        for block in blocks:
+            if block.kind == 'list':
+                story.append(ListFlowable(
+                    [ListItem(Paragraph(escape(item), styles['GuideListItem'])) for item in block.items],
+                    bulletType='1' if block.ordered else 'bullet',
+                    start=1 if block.ordered else '•',
+                    leftIndent=18,
+                    spaceAfter=8
+                ))
+            else:
+                story.append(Paragraph(escape(block.text), styles['CustomBodyText']))
+
+    def _append_document(self, story: list, document: GuideDocument):
+        """Add flowables for every section, subsection, paragraph and list of a guide."""
+        styles = self.styles
+        self._append_blocks(story, document.blocks)
+        for section in document.sections:
+            if section.title:
+                story.append(Paragraph(escape(section.title), styles['GuideSection']))
+            self._append_blocks(story, section.blocks)
+            for subsection in section.subsections:
+                story.append(Paragraph(escape(subsection.title), styles['GuideSubsection']))
+                self._append_blocks(story, subsection.blocks)
+
+    def render(self, lab_guide, output: BinaryIO):
+        """
+        Render a lab guide as a PDF document.
+
+        The header shows the professor who created the guide, so every user
+        downloading it gets the same document.
+
+        Args:
+            lab_guide: The LabGuide to render
+            output: Binary file-like object the PDF is written to
+        """
+        author = lab_guide.created_by
+        styles = self.styles
+
+        # Create the PDF document
+        doc = SimpleDocTemplate(
+            output,
+            pagesize=A4,
+            rightMargin=2.5*cm,
+            leftMargin=2.5*cm,
+            topMargin=2.5*cm,
+            bottomMargin=2.5*cm
+        )
+
+        # Build the PDF content
+        story = []
+
+        # Add logo if it exists
+        if self.logo is not None:
+            story.append(LogoFlowable(self.logo, LOGO_SIZE, LOGO_SIZE))
+            story.append(Spacer(1, 20))
+
+        # Add header information
+        story.append(Paragraph("Universidad Cooperativa de Colombia", styles['Header']))
+        story.append(Paragraph(author.department or '', styles['SubHeader']))
+        story.append(Spacer(1, 20))
+
+        # Add subject information
+        story.append(Paragraph(f"<b>Asignatura:</b> {lab_guide.subject.code} - {lab_guide.subject.name}", styles['CustomBodyText']))
+        story.append(Paragraph(f"<b>Laboratorio:</b> {lab_guide.title}", styles['CustomBodyText']))
+        story.append(Paragraph(f"<b>Docente:</b> {author.username}", styles['CustomBodyText']))
+        story.append(Paragraph(f"<b>Semestre:</b> 2024-1", styles['CustomBodyText']))
+        story.append(Spacer(1, 30))
+
+        # Add a single line
+        story.append(Paragraph("_" * 80, styles['CustomBodyText']))
+        story.append(Spacer(1, 20))
+
+        # Add the sections of the guide, read from its stored HTML in one pass
+        self._append_document(story, parse_lab_guide(lab_guide.content))
+
+        # Add footer with the date of the guide's last update, part of the cache key
+        story.append(Spacer(1, 30))
+        story.append(Paragraph("_" * 80, styles['CustomBodyText']))
+        story.append(Paragraph(f"Guía actualizada el {lab_guide.updated_at.strftime('%d/%m/%Y %H:%M')}",
+                               styles['Footer']))
+
+        # Build the PDF
+        doc.build(story)
+
+
+_renderer: Optional[LabGuidePDFRenderer] = None
+_renderer_lock = threading.Lock()
+
+
+def get_pdf_renderer() -> LabGuidePDFRenderer:
+    """Return the renderer shared by the current process, creating it on first use."""
+    global _renderer
+    if _renderer is None:
+        with _renderer_lock:
+            if _renderer is None:
+                _renderer = LabGuidePDFRenderer()
+    return _renderer
+
+
+def render_lab_guide_pdf(lab_guide, output: BinaryIO):
+    """
+    Render a lab guide as a PDF document with the shared renderer.
+
+    Args:
+        lab_guide: The LabGuide to render
+        output: Binary file-like object the PDF is written to
+    """
+    get_pdf_renderer().render(lab_guide, output)
+
+
+def render_snapshot_to_file(snapshot: GuideSnapshot, path: str) -> int:
+    """
+    Render a guide snapshot straight into a file, without keeping the PDF in memory.
+
+    The document is written to a temporary file next to path and then moved
+    into place, so readers never see a partial PDF.
+
+    Args:
+        snapshot: The guide to render
+        path: Destination of the PDF
+
+    Returns:
+        Size of the PDF in bytes
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            get_pdf_renderer().render(snapshot, f)
+            size = f.tell()
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return size
@@ -0,0 +1,178 @@
+"""
+Render Pool Module
+
+This module moves CPU-bound PDF rendering off the web workers. Renders
+are submitted to a per-process pool of worker processes with a bounded
+queue: once every worker is busy and the queue is full, new renders are
+rejected with a retry hint instead of piling up, so a burst of downloads
+cannot stall logins and dashboards. Queue depth and render times are
+exposed for monitoring.
+
+Render processes are spawned, and a spawned process runs the __main__
+module of its parent before anything else. The worker function lives
+here, next to imports of the renderer alone, and the main module of the
+server must not set up the app when run again: flask run, gunicorn and
+pytest guard theirs, and app.py hands `python app.py` over to flask run.
+"""
+
+import math
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+
+from pdf_renderer import GuideSnapshot, render_snapshot_to_file
+
+
+class RenderPoolSaturated(Exception):
+    """Raised when the render queue is full; retry_after is a hint in seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f'PDF render queue is full, retry in {retry_after}s')
+        self.retry_after = retry_after
+
+
+def _timed_render(snapshot: GuideSnapshot, path: str) -> Tuple[str, float]:
+    """Render into path in a worker process and report the time spent rendering."""
+    start = time.perf_counter()
+    render_snapshot_to_file(snapshot, path)
+    return path, time.perf_counter() - start
+
+
+class RenderPool:
+    """Per-process pool of render processes with a bounded queue."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.max_workers = 2
+        self.queue_depth = 8
+        self.timeout = 60
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self._render_times = deque(maxlen=200)
+        self._wait_times = deque(maxlen=200)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Bind the pool to a Flask application."""
+        app.config.setdefault('PDF_RENDER_WORKERS', 2)
+        app.config.setdefault('PDF_RENDER_QUEUE_DEPTH', 8)
+        app.config.setdefault('PDF_RENDER_TIMEOUT', 60)
+        self.max_workers = app.config['PDF_RENDER_WORKERS']
+        self.queue_depth = app.config['PDF_RENDER_QUEUE_DEPTH']
+        self.timeout = app.config['PDF_RENDER_TIMEOUT']
+        self.app = app
+        app.extensions['render_pool'] = self
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        # Processes are only started on the first render so that CLI
+        # commands and migrations never spawn them. They are spawned rather
+        # than forked because the web server is multi-threaded.
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def _retry_after(self) -> int:
+        """Seconds until a slot is likely to be free, from the recent render times."""
+        average = sum(self._render_times) / len(self._render_times) if self._render_times else 1.0
+        return max(1, math.ceil(average * self._in_flight / self.max_workers))
+
+    def submit(self, snapshot: GuideSnapshot, path: str) -> 'Future[str]':
+        """
+        Queue a render. The PDF is written to path by the worker process and
+        never crosses the process boundary.
+
+        Args:
+            snapshot: The guide to render
+            path: Destination of the PDF
+
+        Returns:
+            A future resolving to path once the PDF is in place
+
+        Raises:
+            RenderPoolSaturated: If every worker is busy and the queue is full
+        """
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.queue_depth:
+                self.rejected += 1
+                raise RenderPoolSaturated(self._retry_after())
+            self._in_flight += 1
+            self.submitted += 1
+
+        submitted_at = time.perf_counter()
+        result: 'Future[str]' = Future()
+        try:
+            try:
+                inner = self.executor.submit(_timed_render, snapshot, path)
+            except BrokenProcessPool:
+                # A worker died (e.g. killed by the OS); start a fresh pool
+                with self._lock:
+                    self._executor = None
+                inner = self.executor.submit(_timed_render, snapshot, path)
+        except Exception:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+
+        def on_done(future):
+            with self._lock:
+                self._in_flight -= 1
+                error = future.exception()
+                if error is None:
+                    rendered_path, render_time = future.result()
+                    self.completed += 1
+                    self._render_times.append(render_time)
+                    self._wait_times.append(max(0.0, time.perf_counter() - submitted_at - render_time))
+                else:
+                    self.failed += 1
+            if error is None:
+                result.set_result(rendered_path)
+            else:
+                result.set_exception(error)
+
+        inner.add_done_callback(on_done)
+        return result
+
+    def render(self, snapshot: GuideSnapshot, path: str) -> str:
+        """Render a guide into path in the pool and wait for it (up to PDF_RENDER_TIMEOUT seconds)."""
+        return self.submit(snapshot, path).result(timeout=self.timeout)
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+    def stats(self) -> Dict:
+        """Queue depth, counters and render times for monitoring."""
+        with self._lock:
+            render_times = sorted(self._render_times)
+            wait_times = list(self._wait_times)
+            p95 = render_times[max(0, math.ceil(len(render_times) * 0.95) - 1)] if render_times else None
+            return {
+                'workers': self.max_workers,
+                'max_queue_depth': self.queue_depth,
+                'in_flight': self._in_flight,
+                'queued': max(0, self._in_flight - self.max_workers),
+                'submitted': self.submitted,
+                'rejected': self.rejected,
+                'completed': self.completed,
+                'failed': self.failed,
+                'render_ms_avg': round(sum(render_times) / len(render_times) * 1000, 1) if render_times else None,
+                'render_ms_p95': round(p95 * 1000, 1) if p95 is not None else None,
+                'wait_ms_avg': round(sum(wait_times) / len(wait_times) * 1000, 1) if wait_times else None,
+            }
@@ -0,0 +1,143 @@
+"""
+Stub LLM Server
+
+A deterministic stand-in for an OpenAI-compatible chat-completions
+endpoint, answering with the content of the 'stub' AI provider (see
+ai_providers.build_stub_content). It lets the HTTP side of the
+generation pipeline be exercised locally without an API key:
+
+    python stub_llm_server.py --port 8001 --delay 2
+    export OPENROUTER_BASE_URL=http://127.0.0.1:8001/v1
+    export OPENROUTER_API_KEY=stub
+
+--fail-first N answers the first N requests with an HTTP error, to
+exercise retries, failover and failed jobs.
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ai_providers import build_stub_content
+
+
+class StubChatCompletionsHandler(BaseHTTPRequestHandler):
+    """Answers POST .../chat/completions with a deterministic completion."""
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        prompt = payload.get('messages', [{}])[-1].get('content', '')
+        content = build_stub_content(prompt)
+
+        if self.server.record_request(payload):
+            self._fail()
+            return
+
+        if payload.get('stream'):
+            self._stream(content)
+            return
+
+        time.sleep(self.server.delay)
+
+        body = json.dumps({
+            "id": "stub-completion",
+            "object": "chat.completion",
+            "model": payload.get('model', 'stub'),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }]
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _fail(self):
+        """Answer with the configured HTTP error status."""
+        time.sleep(self.server.delay)
+        body = json.dumps({"error": {"message": "stub failure", "code": self.server.fail_status}}).encode('utf-8')
+        self.send_response(self.server.fail_status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, content: str):
+        """Send the content line by line as chat.completion.chunk events."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(b': STUB PROCESSING\n\n')
+
+        lines = content.splitlines(keepends=True)
+        for line in lines:
+            time.sleep(self.server.delay / len(lines))
+            chunk = {
+                "id": "stub-completion",
+                "object": "chat.completion.chunk",
+                "choices": [{"index": 0, "delta": {"content": line}, "finish_reason": None}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+        self.wfile.write(b'data: [DONE]\n\n')
+        self.wfile.flush()
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    """Threaded stub server that counts its requests and can fail the first ones."""
+
+    daemon_threads = True
+
+    def __init__(self, address, delay: float = 0.0, fail_first: int = 0, fail_status: int = 503):
+        super().__init__(address, StubChatCompletionsHandler)
+        self.delay = delay
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.payloads = []
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def record_request(self, payload: dict) -> bool:
+        """Record a request payload; returns whether the request has to fail."""
+        with self._lock:
+            self.payloads.append(payload)
+            return len(self.payloads) <= self.fail_first
+
+
+def make_server(host: str = '127.0.0.1', port: int = 8001, delay: float = 0.0,
+                fail_first: int = 0, fail_status: int = 503) -> StubServer:
+    """Create (but do not start) a stub server bound to host:port (0 picks a free port)."""
+    return StubServer((host, port), delay=delay, fail_first=fail_first, fail_status=fail_status)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stub OpenAI-compatible chat-completions server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--delay', type=float, default=0.0, help='Seconds to wait before answering')
+    parser.add_argument('--fail-first', type=int, default=0, help='Answer the first N requests with an error')
+    parser.add_argument('--fail-status', type=int, default=503, help='HTTP status of the failed answers')
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.delay, args.fail_first, args.fail_status)
+    print(f'Stub chat-completions server on {server.base_url}')
+    server.serve_forever()
@@ -0,0 +1,93 @@
+import itertools
+import os
+import tempfile
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+# app.py sets up its database and PDF cache when it is imported: keep the
+# tests that load it away from the instance folder
+_instance = tempfile.mkdtemp(prefix='lab-guide-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_instance, 'site.db')
+os.environ['PDF_CACHE_DIR'] = os.path.join(_instance, 'pdf_cache')
+os.environ['AI_PROVIDER'] = 'stub'
+os.environ['AI_CACHE_BACKEND'] = 'none'
+
+from ai_config import AIConfig, HostRateLimiter  # noqa: E402
+from ai_providers import Endpoint, reset_ai_config  # noqa: E402
+from benchmarks.support import create_app, seed_professor  # noqa: E402
+from guide_search import GuideSearch  # noqa: E402
+from models import db  # noqa: E402
+from stub_llm_server import make_server  # noqa: E402
+
+_usernames = itertools.count(1)
+
+
+@pytest.fixture
+def app():
+    """App bound to a fresh in-memory database, with its app context pushed."""
+    app = create_app(SECRET_KEY='test')
+    with app.app_context():
+        db.create_all()
+        # Guides are indexed by mapper events as soon as any test has loaded app.py
+        GuideSearch(app)
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def web_app():
+    """
+    The application of app.py; its database is shared by the tests.
+
+    No app context is pushed: a request would reuse it, with its session
+    and signed-in user.
+    """
+    from app import app as web_app
+    return web_app
+
+
+@pytest.fixture
+def professor(web_app):
+    """A professor of web_app with one subject of three weekly topics; the password is 'secret'."""
+    with web_app.app_context():
+        professor = seed_professor(f'prof{next(_usernames)}', 1, topics=3)
+        professor.set_password('secret')
+        db.session.commit()
+        subject = professor.subjects.first()
+        return SimpleNamespace(id=professor.id, username=professor.username, subject_id=subject.id,
+                               subject_code=subject.code,
+                               topic_ids=[topic.id for topic in subject.weekly_topics.order_by('week_number')])
+
+
+@pytest.fixture
+def client(web_app, professor):
+    """Test client of web_app signed in as professor."""
+    client = web_app.test_client()
+    client.post('/login', data={'username': professor.username, 'password': 'secret'})
+    return client
+
+
+@pytest.fixture
+def stub_server():
+    """A stub chat-completions server on a free port, serving from a thread."""
+    server = make_server(port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def stub_ai(web_app, stub_server):
+    """AI client of web_app sending its requests to stub_server, without retries or rate limit."""
+    config = AIConfig(endpoints=[Endpoint(name='stub', base_url=stub_server.base_url, model='stub')],
+                      max_retries=0, backoff_factor=0, rate_limiter=HostRateLimiter(0))
+    web_app.config['AI_PROVIDER'] = config
+    reset_ai_config(web_app)
+    yield config
+    web_app.config['AI_PROVIDER'] = 'stub'
+    reset_ai_config(web_app)
@@ -0,0 +1,110 @@
+import time
+
+import pytest
+
+import ai_cache
+from ai_cache import CacheBackend, DiskBackend, MemoryLRUBackend, ResponseCache, SQLiteBackend
+from ai_config import AIConfig, HostRateLimiter
+from ai_providers import CircuitBreaker, Endpoint
+
+GUIDE = dict(subject_name='Redes', topic_title='Perceptrón', topic_description='Clasificación lineal',
+             lab_number=1, difficulty_level='intermediate', estimated_duration=90)
+
+
+class Clock:
+    """Stands in for time.time() in ai_cache; the disk backend also ages entries by their real mtime."""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+    def tick(self, seconds=1.0):
+        self.now += seconds
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ai_cache.time, 'time', clock)
+    return clock
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'disk'])
+def make_backend(request, tmp_path):
+    def make(**options):
+        if request.param == 'memory':
+            return MemoryLRUBackend(**options)
+        if request.param == 'sqlite':
+            return SQLiteBackend(str(tmp_path / 'cache.sqlite3'), **options)
+        return DiskBackend(str(tmp_path / 'cache'), **options)
+    return make
+
+
+def test_backends_implement_the_whole_interface():
+    with pytest.raises(TypeError):
+        CacheBackend()
+
+
+def test_hit_and_miss(make_backend, clock):
+    cache = ResponseCache(make_backend())
+    cache.set('a', 'guía')
+
+    assert cache.get('a') == 'guía'
+    assert cache.get('b') is None
+    assert cache.stats() == {'backend': type(cache.backend).__name__, 'hits': 1, 'misses': 1, 'stores': 1,
+                             'hit_rate': 0.5}
+
+
+def test_entries_expire_after_the_ttl(make_backend, clock):
+    backend = make_backend(ttl=60)
+    backend.set('a', 'x')
+
+    clock.tick(59)
+    assert backend.get('a') == 'x'
+    clock.tick(1)
+    assert backend.get('a') is None
+    assert len(backend) == 0
+
+
+def test_least_recently_used_entry_is_evicted(make_backend, clock):
+    backend = make_backend(max_entries=2)
+    backend.set('a', 'x')
+    clock.tick()
+    backend.set('b', 'y')
+    clock.tick()
+    backend.get('a')
+    clock.tick()
+
+    backend.set('c', 'z')
+
+    assert (backend.get('a'), backend.get('b'), backend.get('c')) == ('x', None, 'z')
+
+
+def test_delete_and_clear(make_backend, clock):
+    backend = make_backend()
+    backend.set('a', 'x')
+    backend.set('b', 'y')
+
+    backend.delete('a')
+    assert (backend.get('a'), len(backend)) == (None, 1)
+    backend.clear()
+    assert len(backend) == 0
+
+
+def test_failover_completions_are_stored_under_the_model_that_answered(stub_server):
+    primary = Endpoint(name='primary', base_url='http://127.0.0.1:9/v1', model='primary-model',
+                       breaker=CircuitBreaker(min_requests=1))
+    primary.breaker.record_failure(0.1)
+    fallback = Endpoint(name='fallback', base_url=stub_server.base_url, model='fallback-model')
+    config = AIConfig(endpoints=[primary, fallback], max_retries=0, rate_limiter=HostRateLimiter(0),
+                      cache=ResponseCache(MemoryLRUBackend()))
+
+    content = config.generate_lab_guide(**GUIDE)
+
+    prompt = config._construct_prompt(**GUIDE)
+    assert content
+    assert config.cache.backend.get(config._cache_key(prompt)) is None
+    assert config.cache.backend.get(config._cache_key(prompt, 'fallback-model')) == content
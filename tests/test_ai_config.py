@@ -0,0 +1,96 @@
+import logging
+
+import pytest
+
+import ai_config
+from ai_config import AIConfig, HostRateLimiter
+from ai_providers import CircuitBreaker, Endpoint
+
+GUIDE = dict(subject_name='Redes', topic_title='Perceptrón', topic_description='Clasificación lineal',
+             lab_number=1, difficulty_level='intermediate', estimated_duration=90)
+
+
+@pytest.fixture
+def config(stub_server):
+    return AIConfig(endpoints=[Endpoint(name='stub', base_url=stub_server.base_url, model='stub')],
+                    max_retries=0, backoff_factor=0, rate_limiter=HostRateLimiter(0))
+
+
+@pytest.fixture
+def sampled_once(monkeypatch):
+    """Sampling that selects the first body it is asked about and none after it."""
+    decisions = iter([True])
+    monkeypatch.setattr(ai_config, 'log_bodies_enabled', lambda: next(decisions, False))
+
+
+def logged_bodies(caplog):
+    return [record.getMessage() for record in caplog.records if record.getMessage() in ('ai.request', 'ai.response')]
+
+
+def test_a_sampled_call_logs_both_bodies(config, sampled_once, caplog):
+    caplog.set_level(logging.DEBUG, logger='lab_guide_ai.ai')
+
+    assert config.generate_lab_guide(**GUIDE)
+
+    assert logged_bodies(caplog) == ['ai.request', 'ai.response']
+
+
+def test_a_sampled_stream_logs_both_bodies(config, sampled_once, caplog):
+    caplog.set_level(logging.DEBUG, logger='lab_guide_ai.ai')
+
+    assert ''.join(config.stream_lab_guide(**GUIDE))
+
+    assert logged_bodies(caplog) == ['ai.request', 'ai.response']
+
+
+def test_last_available_endpoint_retries(stub_server):
+    stub_server.fail_first = 1
+    up = Endpoint(name='up', base_url=stub_server.base_url, model='stub')
+    # Listed after it, but its breaker opened once the candidates were chosen
+    down = Endpoint(name='down', base_url='http://127.0.0.1:9/v1', model='stub', breaker=CircuitBreaker(min_requests=1))
+    down.breaker.record_failure(0.1)
+    config = AIConfig(endpoints=[up, down], max_retries=2, backoff_factor=0, rate_limiter=HostRateLimiter(0))
+    config.router.candidates = lambda: [up, down]
+
+    assert config.generate_lab_guide(**GUIDE)
+
+    assert [(a.endpoint, a.status_code) for a in config.last_attempts] == [('up', 503), ('up', 200)]
+
+
+def test_sectioned_generation_retries_a_failed_section(config, stub_server):
+    stub_server.fail_first = 1
+
+    content = config.generate_lab_guide(**GUIDE, sectioned=True)
+
+    sections = config.lab_guide_structure['sections']
+    assert len(stub_server.payloads) == len(sections) + 1
+    # Assembled in the order of the structure, each section under its title
+    assert content.startswith(sections[0]['title'].upper() + '\n')
+    position = 0
+    for section in sections[1:]:
+        position = content.find(f"\n\n{section['title'].upper()}\n", position)
+        assert position != -1
+
+
+def test_sectioned_generation_fails_once_a_section_runs_out_of_retries(config, stub_server):
+    config.section_retries = 1
+    stub_server.fail_first = 1000
+
+    assert config.generate_lab_guide(**GUIDE, sectioned=True) is None
+
+    # Every section failed, either at the stub or, once the breaker opened, before reaching it
+    sections = config.lab_guide_structure['sections']
+    assert config.last_error.startswith(f"Error generating sections ({', '.join(s['title'] for s in sections)})")
+
+
+def test_default_rate_limit_lets_the_sections_of_a_guide_out_at_once(stub_server, monkeypatch):
+    monkeypatch.delenv('AI_RATE_LIMIT_BURST', raising=False)
+    config = AIConfig(endpoints=[Endpoint(name='stub', base_url=stub_server.base_url, model='stub')], max_retries=0)
+    waits = []
+    acquire = config.rate_limiter.acquire
+    config.rate_limiter.acquire = lambda host: waits.append(acquire(host)) or waits[-1]
+
+    assert config.generate_lab_guide(**GUIDE, sectioned=True)
+
+    assert len(waits) == len(config.lab_guide_structure['sections'])
+    assert sum(waits) == 0
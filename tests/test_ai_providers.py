@@ -0,0 +1,112 @@
+import random
+
+import pytest
+
+import ai_providers
+from ai_providers import CircuitBreaker, Endpoint, EndpointRouter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ai_providers.time, 'monotonic', clock)
+    return clock
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker(window=4, min_requests=4, error_rate_threshold=0.5, cooldown=30)
+
+
+def test_breaker_opens_at_the_error_rate(breaker):
+    for ok in (True, False, True):
+        (breaker.record_success if ok else breaker.record_failure)(0.1)
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_failure(0.1)
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+
+def test_breaker_opens_on_latency(clock):
+    breaker = CircuitBreaker(window=2, min_requests=2, latency_threshold=1.0)
+    breaker.record_success(0.5)
+    breaker.record_success(2.0)
+
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_half_open_breaker_lets_a_single_probe_through(breaker, clock):
+    for _ in range(4):
+        breaker.record_failure(0.1)
+    clock.now += 29
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now += 1
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+    # The probe is in flight
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+
+def test_successful_probe_closes_the_breaker(breaker, clock):
+    for _ in range(4):
+        breaker.record_failure(0.1)
+    clock.now += 30
+    breaker.allow_request()
+
+    breaker.record_success(0.1)
+
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.stats()['requests'] == 0
+    assert breaker.allow_request() and breaker.allow_request()
+
+
+def test_failed_probe_opens_the_breaker_for_another_cooldown(breaker, clock):
+    for _ in range(4):
+        breaker.record_failure(0.1)
+    clock.now += 30
+    breaker.allow_request()
+
+    breaker.record_failure(0.1)
+
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 29
+    assert not breaker.allow_request()
+    clock.now += 1
+    assert breaker.allow_request()
+
+
+def endpoint(name, weight=1.0):
+    return Endpoint(name=name, base_url=f'http://{name}.invalid/v1', model=name, weight=weight)
+
+
+def test_router_orders_endpoints_by_weight():
+    random.seed(8)
+    router = EndpointRouter([endpoint('heavy', 3), endpoint('light', 1), endpoint('off', 0)])
+
+    orders = [[e.name for e in router.candidates()] for _ in range(4000)]
+
+    first = sum(order[0] == 'heavy' for order in orders) / len(orders)
+    assert 0.72 < first < 0.78
+    assert all(order[-1] == 'off' for order in orders)
+
+
+def test_router_leaves_out_open_endpoints():
+    down = endpoint('down')
+    down.breaker = CircuitBreaker(min_requests=1)
+    down.breaker.record_failure(0.1)
+    router = EndpointRouter([down, endpoint('up')])
+
+    assert [e.name for e in router.candidates()] == ['up']
+    assert [stats['state'] for stats in router.stats()] == ['open', 'closed']
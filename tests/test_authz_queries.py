@@ -0,0 +1,32 @@
+import pytest
+
+from authz import can_access_guide, can_access_subject
+from benchmarks.support import count_queries, seed_professor
+from models import db, Professor, LabGuide
+
+
+@pytest.mark.parametrize('subjects', [1, 10, 200])
+def test_guide_checks_take_one_query_per_request(app, subjects):
+    professor_id = seed_professor(f'prof{subjects}', subjects, guides=1).id
+    guide_id = LabGuide.query.filter_by(created_by_id=professor_id).order_by(LabGuide.id.desc()).first().id
+    db.session.expunge_all()
+
+    with app.test_request_context():
+        professor = db.session.get(Professor, professor_id)
+        lab_guide = db.session.get(LabGuide, guide_id)
+        with count_queries() as statements:
+            allowed = [can_access_guide(lab_guide, professor) for _ in range(3)]
+
+    assert allowed == [True, True, True]
+    assert len(statements) == 1
+
+
+def test_other_professors_subjects_are_denied(app):
+    owner = seed_professor('owner', 2, guides=1)
+    other = seed_professor('other', 1)
+    lab_guide = LabGuide.query.filter_by(created_by_id=owner.id).first()
+
+    with app.test_request_context():
+        assert can_access_guide(lab_guide, owner)
+        assert not can_access_guide(lab_guide, other)
+        assert not can_access_subject('not a number', owner)
@@ -0,0 +1,27 @@
+import pytest
+
+from benchmarks.support import count_queries, seed_professor
+from dashboard_views import load_subject_cards
+from models import db
+
+
+@pytest.mark.parametrize('subjects', [1, 10, 30])
+def test_subject_cards_take_three_queries(app, subjects):
+    professor_id = seed_professor(f'prof{subjects}', subjects, topics=4, guides=2).id
+    db.session.expunge_all()
+
+    with count_queries() as statements:
+        cards = load_subject_cards(professor_id)
+
+    assert len(statements) == 3
+    assert len(cards) == subjects
+
+
+def test_subject_cards_order_topics_by_week(app):
+    professor_id = seed_professor('prof', 2, topics=5, guides=3).id
+
+    cards = load_subject_cards(professor_id)
+
+    for card in cards:
+        assert [topic.week_number for topic in card.topics] == [1, 2, 3, 4, 5]
+        assert len(card.guides) == 3
@@ -0,0 +1,150 @@
+import time
+
+import pytest
+
+from generation_jobs import _claim, run_bulk_jobs, run_job
+from models import db, GenerationJob, LabGuide
+
+
+def poll(client, job_id, timeout=10):
+    """Poll the status endpoint until the job finishes; returns its last status and the statuses seen."""
+    seen = []
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = client.get(f'/api/generation_jobs/{job_id}').get_json()
+        if not seen or seen[-1] != status['status']:
+            seen.append(status['status'])
+        if status['status'] in ('succeeded', 'failed'):
+            return status, seen
+        time.sleep(0.02)
+    pytest.fail(f'job {job_id} still {seen[-1]} after {timeout}s')
+
+
+def queue_job(web_app, professor, week=1):
+    with web_app.app_context():
+        topic_id = professor.topic_ids[week - 1]
+        job = GenerationJob(subject_id=professor.subject_id, weekly_topic_id=topic_id, title=f'Tema {week}',
+                            lab_number=week, estimated_duration=90, created_by_id=professor.id)
+        db.session.add(job)
+        db.session.commit()
+        return job.id
+
+
+def run(web_app, job_id):
+    """Run a job in the calling thread; returns (status, error, lab_guide_id)."""
+    with web_app.app_context():
+        job = run_job(job_id)
+        return job.status, job.error, job.lab_guide_id
+
+
+def test_job_goes_from_queued_to_running_to_succeeded(web_app, client, professor, stub_ai, stub_server):
+    job_id = queue_job(web_app, professor)
+    assert client.get(f'/api/generation_jobs/{job_id}').get_json()['status'] == 'queued'
+
+    stub_server.delay = 0.5
+    web_app.extensions['generation_pool'].submit(job_id)
+    status, seen = poll(client, job_id)
+
+    # The first poll may come before a worker claims the job
+    assert seen in (['queued', 'running', 'succeeded'], ['running', 'succeeded'])
+    assert status['progress'] == 100
+    assert status['lab_guide_url'] == f"/lab_guide/{status['lab_guide_id']}"
+    assert len(stub_server.payloads) == 1
+
+
+def test_succeeded_job_writes_the_draft(web_app, professor, stub_ai, stub_server):
+    job_id = queue_job(web_app, professor)
+
+    status, _, lab_guide_id = run(web_app, job_id)
+
+    assert status == 'succeeded'
+    with web_app.app_context():
+        guide = db.session.get(LabGuide, lab_guide_id)
+        assert (guide.status, guide.subject_id, guide.created_by_id) == ('draft', professor.subject_id, professor.id)
+        assert guide.title == 'Tema 1'
+        assert professor.subject_code in guide.content
+        assert 'lab-guide-content' in guide.content
+
+
+def test_failed_completion_marks_the_job_failed(web_app, client, professor, stub_ai, stub_server):
+    stub_server.fail_first = 1
+    job_id = queue_job(web_app, professor)
+
+    status, error, lab_guide_id = run(web_app, job_id)
+
+    assert (status, lab_guide_id) == ('failed', None)
+    assert error
+    polled = client.get(f'/api/generation_jobs/{job_id}').get_json()
+    assert (polled['status'], polled['error'], polled['lab_guide_url']) == ('failed', error, None)
+
+
+def test_claimed_job_is_not_run_again(web_app, professor, stub_ai, stub_server):
+    job_id = queue_job(web_app, professor)
+    run(web_app, job_id)
+
+    status, _, _ = run(web_app, job_id)
+
+    assert status == 'succeeded'
+    assert len(stub_server.payloads) == 1
+
+
+def test_create_lab_guide_enqueues_a_job(client, professor, stub_ai, stub_server):
+    response = client.post('/dashboard/create_lab_guide', data={
+        'subject_id': professor.subject_id, 'weekly_topic_id': professor.topic_ids[0], 'title': 'Redes neuronales',
+        'lab_number': 1, 'difficulty_level': 'intermediate', 'estimated_duration': 120,
+    })
+
+    assert response.status_code == 302
+    job_id = int(response.headers['Location'].rsplit('/', 1)[-1])
+    assert client.get(f'/generation_job/{job_id}').status_code == 200
+    status, _ = poll(client, job_id)
+    assert status['status'] == 'succeeded'
+    assert 'Redes neuronales' in stub_server.payloads[0]['messages'][-1]['content']
+
+
+def test_jobs_are_only_shown_to_their_creator(web_app, client, professor, stub_ai):
+    job_id = queue_job(web_app, professor)
+    other = web_app.test_client()
+    other.post('/login', data={'username': 'drsmith', 'password': 'password123'})
+
+    assert other.get(f'/api/generation_jobs/{job_id}').status_code == 403
+    assert client.get('/api/generation_jobs/999999').status_code == 404
+
+
+def test_bulk_run_only_generates_the_jobs_it_claimed(web_app, professor, stub_ai, stub_server):
+    job_ids = [queue_job(web_app, professor, week) for week in (1, 2, 3)]
+    with web_app.app_context():
+        # Another worker claimed the second job first
+        assert _claim(job_ids[1:2]) == job_ids[1:2]
+
+        results = run_bulk_jobs(job_ids, batch_size=2)
+
+    assert [result.status for result in results] == ['succeeded', 'running', 'succeeded']
+    assert len(stub_server.payloads) == 2
+    with web_app.app_context():
+        assert _claim(job_ids) == []
+
+
+def test_generate_subject_guides_parses_its_flags(web_app, client, professor, stub_ai):
+    response = client.post(f'/api/subjects/{professor.subject_id}/generate-guides',
+                           json={'estimated_duration': '90', 'skip_cache': 'false', 'sectioned': '0'})
+
+    assert response.status_code == 202
+    topics = response.get_json()['topics']
+    assert [topic['week_number'] for topic in topics] == [1, 2, 3]
+    for topic in topics:
+        status, _ = poll(client, topic['job_id'])
+        assert status['status'] == 'succeeded'
+    with web_app.app_context():
+        job = db.session.get(GenerationJob, topics[0]['job_id'])
+        assert (job.estimated_duration, job.use_cache, job.sectioned) == (90, True, False)
+
+
+@pytest.mark.parametrize('params', [{'estimated_duration': 'dos horas'}, {'estimated_duration': None},
+                                    {'skip_cache': 'maybe'}, {'sectioned': 'si'}])
+def test_generate_subject_guides_rejects_bad_parameters(web_app, client, professor, params):
+    response = client.post(f'/api/subjects/{professor.subject_id}/generate-guides', json=params)
+
+    assert response.status_code == 400
+    with web_app.app_context():
+        assert GenerationJob.query.filter_by(subject_id=professor.subject_id).count() == 0
@@ -0,0 +1,119 @@
+import pytest
+from sqlalchemy import text
+
+from benchmarks.support import seed_professor
+from guide_search import TABLE, WORD_RE, match_query, plain_text, snippet
+from models import db, LabGuide, WeeklyTopic
+
+HEADER = '<div class="lab-guide-header"><h1>Universidad</h1></div>\n'
+
+
+@pytest.fixture
+def search(app):
+    return app.extensions['guide_search']
+
+
+@pytest.fixture
+def subject(app):
+    return seed_professor('prof', 1, topics=2).subjects.first()
+
+
+def add_guide(subject, title, body, week=1):
+    topic = subject.weekly_topics.filter_by(week_number=week).one()
+    guide = LabGuide(title=title, lab_number=week, subject=subject, weekly_topic=topic,
+                     created_by=subject.professors.first(),
+                     content=f'{HEADER}<div class="lab-guide-content"><p>{body}</p></div>')
+    db.session.add(guide)
+    db.session.commit()
+    return guide
+
+
+def indexed(guide_id):
+    return db.session.execute(text(f'SELECT title, content, topic_title FROM {TABLE} WHERE rowid = :id'),
+                              {'id': guide_id}).fetchone()
+
+
+def titles(search, terms, subject):
+    return [hit.title for hit in search.search(terms, [subject.id]).hits]
+
+
+def test_inserted_guides_are_indexed_without_their_header(subject):
+    guide = add_guide(subject, 'Redes neuronales', 'Entrenamiento del perceptr&oacute;n')
+
+    row = indexed(guide.id)
+
+    assert (row.title, row.content, row.topic_title) == ('Redes neuronales', 'Entrenamiento del perceptrón', 'Tema 1')
+
+
+def test_updated_guides_are_indexed_again(search, subject):
+    guide = add_guide(subject, 'Redes neuronales', 'Perceptrón')
+
+    guide.title = 'Árboles de decisión'
+    guide.content = '<div class="lab-guide-content"><p>Entropía</p></div>'
+    db.session.commit()
+
+    assert titles(search, 'redes', subject) == []
+    assert titles(search, 'arboles entropia', subject) == ['Árboles de decisión']
+
+
+def test_deleted_guides_leave_the_index(search, subject):
+    guide = add_guide(subject, 'Redes neuronales', 'Perceptrón')
+    guide_id = guide.id
+
+    db.session.delete(guide)
+    db.session.commit()
+
+    assert indexed(guide_id) is None
+    assert titles(search, 'redes', subject) == []
+
+
+def test_topic_changes_reach_the_guides_of_the_topic(search, subject):
+    guide = add_guide(subject, 'Práctica 1', 'Texto')
+
+    topic = db.session.get(WeeklyTopic, guide.weekly_topic_id)
+    topic.title = 'Clasificación bayesiana'
+    db.session.commit()
+
+    assert indexed(guide.id).topic_title == 'Clasificación bayesiana'
+    assert titles(search, 'bayesiana', subject) == ['Práctica 1']
+
+
+def test_title_matches_rank_above_content_matches(search, subject):
+    add_guide(subject, 'Práctica de laboratorio', 'Se usa una red convolucional para imágenes', week=1)
+    add_guide(subject, 'Red convolucional', 'Clasificación de imágenes', week=2)
+
+    page = search.search('convolucional', [subject.id])
+
+    assert [hit.title for hit in page.hits] == ['Red convolucional', 'Práctica de laboratorio']
+    assert page.hits[0].score < page.hits[1].score
+    assert '<mark>convolucional</mark>' in page.hits[1].snippet
+
+
+def test_results_are_paged_and_limited_to_the_subjects(search, subject):
+    for week in (1, 2):
+        add_guide(subject, f'Redes {week}', 'Texto', week=week)
+    other = seed_professor('other', 1).subjects.first()
+    add_guide(other, 'Redes ajenas', 'Texto')
+
+    first = search.search('redes', [subject.id], page=1, limit=1)
+    second = search.search('redes', [subject.id], page=2, limit=1)
+
+    assert (len(first.hits), first.next_page, len(second.hits), second.next_page) == (1, 2, 1, None)
+    assert {first.hits[0].title, second.hits[0].title} == {'Redes 1', 'Redes 2'}
+    assert search.search('redes', []).hits == []
+
+
+def test_rebuild_indexes_existing_guides(search, subject):
+    guide = add_guide(subject, 'Redes neuronales', 'Perceptrón')
+    db.session.execute(text(f'DELETE FROM {TABLE}'))
+    db.session.commit()
+
+    assert search.rebuild(batch_size=1) == 1
+    assert indexed(guide.id).title == 'Redes neuronales'
+
+
+def test_query_words_are_quoted_and_accents_ignored():
+    assert match_query('Redes "neuro*') == '"Redes" "neuro"*'
+    assert match_query(' -- ') is None
+    content = plain_text('<div class="lab-guide-content"><p>La neurona &amp; el perceptrón</p></div>')
+    assert snippet(content, WORD_RE.findall('perceptron')) == 'La neurona &amp; el <mark>perceptrón</mark>'
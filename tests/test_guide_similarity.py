@@ -0,0 +1,88 @@
+import pytest
+
+from benchmarks.support import seed_professor
+from guide_similarity import (BANDS, band_keys, find_similar, minhash, rebuild, remember, similarity)
+from models import db, LabGuide, LabGuideBand, LabGuideSignature
+
+NOTES = 'Usar el conjunto de datos Iris y comparar con una regresión logística'
+
+
+@pytest.fixture
+def subject(app):
+    return seed_professor('prof', 1, topics=2).subjects.first()
+
+
+def add_guide(subject, title, notes=None, week=1, signed=True):
+    guide = LabGuide(title=title, content='<p>x</p>', lab_number=week, subject_id=subject.id,
+                     weekly_topic_id=subject.weekly_topics.filter_by(week_number=week).one().id,
+                     created_by_id=subject.professors.first().id)
+    if signed:
+        remember(guide, notes)
+    db.session.add(guide)
+    db.session.commit()
+    return guide
+
+
+def test_signatures_estimate_the_similarity_of_the_texts():
+    signature = minhash('Perceptrón multicapa con retropropagación')
+
+    assert minhash('PERCEPTRON multicapa, con retropropagacion') == signature
+    assert similarity(signature, minhash('Perceptrón multicapa con retropropagación del error')) > 0.7
+    assert similarity(signature, minhash('Árboles de decisión y bosques aleatorios')) < 0.2
+
+
+def test_band_keys_depend_on_the_subject():
+    signature = minhash('Perceptrón multicapa')
+
+    assert len(band_keys(signature, 1)) == BANDS
+    assert not set(band_keys(signature, 1)) & set(band_keys(signature, 2))
+
+
+def test_near_duplicate_requests_are_found(subject):
+    guide = add_guide(subject, 'Perceptrón multicapa', NOTES)
+    add_guide(subject, 'Árboles de decisión', 'Conjunto de datos del Titanic', week=2)
+
+    similar = find_similar(subject.id, guide.weekly_topic_id, 'Perceptron multicapa', NOTES + '.')
+
+    assert [(match.id, match.week_number) for match in similar] == [(guide.id, 1)]
+    assert similar[0].similarity >= 0.8
+
+
+def test_dissimilar_requests_and_other_subjects_are_not_found(app, subject):
+    add_guide(subject, 'Perceptrón multicapa', NOTES)
+    other = seed_professor('other', 1).subjects.first()
+    add_guide(other, 'Redes convolucionales', 'Clasificar imágenes de dígitos')
+
+    assert find_similar(subject.id, 1, 'Redes convolucionales', 'Clasificar imágenes de dígitos') == []
+    assert find_similar(other.id, 1, 'Perceptrón multicapa', NOTES) == []
+
+
+def test_guides_of_the_same_topic_come_first(subject):
+    week_2 = add_guide(subject, 'Perceptrón multicapa', NOTES, week=2)
+    week_1 = add_guide(subject, 'Perceptrón multicapa', NOTES + ' sobre flores', week=1)
+
+    similar = find_similar(subject.id, week_2.weekly_topic_id, 'Perceptrón multicapa', NOTES + ' sobre flores',
+                           threshold=0.6)
+
+    assert [match.id for match in similar] == [week_2.id, week_1.id]
+    assert similar[0].similarity < similar[1].similarity
+
+
+def test_signatures_are_deleted_with_their_guide(subject):
+    guide = add_guide(subject, 'Perceptrón multicapa', NOTES)
+
+    db.session.delete(guide)
+    db.session.commit()
+
+    assert LabGuideSignature.query.count() == 0
+    assert LabGuideBand.query.count() == 0
+    assert find_similar(subject.id, 1, 'Perceptrón multicapa', NOTES) == []
+
+
+def test_rebuild_signs_only_unsigned_guides(subject):
+    add_guide(subject, 'Perceptrón multicapa', NOTES)
+    unsigned = add_guide(subject, 'Árboles de decisión', signed=False, week=2)
+
+    assert rebuild(batch_size=1) == 1
+    assert rebuild() == 0
+    assert [match.id for match in find_similar(subject.id, 2, 'Árboles de decisión')] == [unsigned.id]
@@ -0,0 +1,103 @@
+import gc
+import weakref
+
+import pytest
+from flask import session
+
+from benchmarks.support import count_queries, seed_professor
+from identity import SESSION_KEY, IdentityCache
+from models import db, LabGuide, Subject, User
+
+
+@pytest.fixture
+def caches(app):
+    """The cache of the process making changes and the cache of another process."""
+    return IdentityCache(app), IdentityCache()
+
+
+def load(app, cache, user_id, seen=None):
+    """Load a user in a request of its own, carrying over the session of an earlier one."""
+    with app.test_request_context():
+        session.update(seen or {})
+        principal = cache.load(user_id)
+        return principal, dict(session)
+
+
+def test_session_only_holds_the_id_and_auth_version(app, caches):
+    _, other = caches
+    professor_id = seed_professor('prof', 3).id
+
+    principal, seen = load(app, other, professor_id)
+
+    assert len(principal.subject_ids) == 3
+    assert seen[SESSION_KEY] == {'id': professor_id, 'auth_version': 0}
+
+
+def test_cached_principal_costs_one_query(app, caches):
+    _, other = caches
+    professor_id = seed_professor('prof', 3).id
+    _, seen = load(app, other, professor_id)
+
+    with count_queries() as statements:
+        principal, _ = load(app, other, professor_id, seen)
+
+    assert len(statements) == 1
+    assert principal.username == 'prof'
+
+
+def test_subject_changes_reach_other_processes(app, caches):
+    _, other = caches
+    professor = seed_professor('prof', 1)
+    _, seen = load(app, other, professor.id)
+
+    professor.subjects.append(Subject(code='NEW', name='Nueva', credits=3))
+    db.session.commit()
+    principal, _ = load(app, other, professor.id, seen)
+
+    assert len(principal.subject_ids) == 2
+
+
+def test_user_updates_reach_other_processes(app, caches):
+    _, other = caches
+    professor = seed_professor('prof', 1)
+    _, seen = load(app, other, professor.id)
+
+    professor.username = 'renamed'
+    db.session.commit()
+    principal, _ = load(app, other, professor.id, seen)
+
+    assert principal.username == 'renamed'
+
+
+def test_new_guides_keep_the_auth_version(app, caches):
+    professor = seed_professor('prof', 1, guides=1)
+    subject = db.session.get(Subject, next(iter(professor.subjects)).id)
+
+    db.session.add(LabGuide(title='Otra', content='<p>x</p>', lab_number=2, subject=subject,
+                            weekly_topic=subject.weekly_topics.first(), created_by=professor))
+    db.session.commit()
+
+    assert professor.auth_version == 0
+
+
+def test_deleted_user_is_signed_out(app, caches):
+    _, other = caches
+    professor = seed_professor('prof', 0)
+    _, seen = load(app, other, professor.id)
+
+    db.session.delete(db.session.get(User, professor.id))
+    db.session.commit()
+    principal, seen = load(app, other, professor.id, seen)
+
+    assert principal is None
+    assert SESSION_KEY not in seen
+
+
+
+def test_caches_are_not_kept_alive_by_the_model_events(app):
+    registered = app.extensions.get('identity_cache')
+    cache = weakref.ref(IdentityCache(app))
+    app.extensions['identity_cache'] = registered
+    gc.collect()
+
+    assert cache() is None
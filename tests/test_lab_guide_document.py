@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from lab_guide_document import _match, parse_lab_guide
+from lab_guide_format import format_generated_guide, get_lab_guide_structure
+
+DATA = os.path.join(os.path.dirname(__file__), 'data')
+
+
+@pytest.fixture
+def stored_guide():
+    """A guide as generated and stored by an earlier version of the app."""
+    with open(os.path.join(DATA, 'stored_lab_guide.html'), encoding='utf-8') as f:
+        return parse_lab_guide(f.read())
+
+
+def test_stored_guide_sections_are_matched_to_the_structure(stored_guide):
+    matched = [(section.title, section.structure_title) for section in stored_guide.sections
+               if section.structure_title]
+
+    assert matched == [('OBJETIVOS', 'Objetivos'), ('FUNDAMENTO TEORICO', 'Fundamento teórico'),
+                       ('MATERIALES', 'Materiales y equipos'), ('PROCEDIMIENTO', 'Procedimiento paso a paso')]
+    # The institutional header is not content
+    assert stored_guide.blocks == []
+    assert stored_guide.sections[0].title == 'LABORATORIO DE MATEMATICAS: VARIAS VARIABLES'
+
+
+def test_stored_guide_lists(stored_guide):
+    sections = {section.title: section for section in stored_guide.sections}
+
+    materials, = sections['MATERIALES'].blocks
+    steps, = sections['PROCEDIMIENTO'].blocks
+    assert (materials.kind, materials.ordered, materials.items[1]) == ('list', False, 'Hoja de papel y lápiz para anotaciones')
+    assert (steps.kind, steps.ordered, len(steps.items)) == ('list', True, 5)
+    assert steps.items[4] == 'Compare y analice los resultados obtenidos para ambas funciones.'
+
+
+def test_stored_guide_unknown_headings_keep_their_content(stored_guide):
+    analysis = stored_guide.sections[-1]
+    subsection, = analysis.subsections
+
+    assert (analysis.title, analysis.structure_title, analysis.blocks) == ('ANALISIS Y CONCLUSIONES', None, [])
+    assert subsection.title.startswith('En esta sección') and subsection.structure_title is None
+    assert [(block.kind, len(block.items)) for block in subsection.blocks] == [('list', 4), ('paragraph', 0)]
+
+
+def test_generated_subsections_are_matched_within_their_section():
+    content = format_generated_guide('2. OBJETIVOS\nGeneral:\nComprender el perceptrón.\nEspecíficos:\n'
+                                     'Entrenar un modelo\nEvaluarlo\n', department='Ingeniería',
+                                     subject_code='IA1', subject_name='IA', title='Perceptrón', professor_name='prof')
+
+    section, = parse_lab_guide(content).sections
+
+    assert section.structure_title == 'Objetivos'
+    general, specific = section.subsections
+    assert (general.structure_title, general.blocks[0].kind) == ('General', 'paragraph')
+    # Lines of a list subsection are items even without bullets
+    assert (specific.structure_title, specific.blocks[0].items) == ('Específicos', ['Entrenar un modelo', 'Evaluarlo'])
+
+
+@pytest.mark.parametrize('heading, expected', [
+    ('Conclusiones', 'Conclusiones'),
+    ('PROCEDIMIENTO', 'Procedimiento paso a paso'),
+    ('Análisis de resultados obtenidos', 'Análisis de resultados'),
+    ('3) Materiales y equipos:', 'Materiales y equipos'),
+    ('MATERIAL', None),
+    ('Conclusion', None),
+    ('ACTIVIDADES', None),
+    ('Análisis y conclusiones', None),
+])
+def test_headings_match_on_whole_words(heading, expected):
+    entry = _match(heading, get_lab_guide_structure()['sections'])
+
+    assert (entry['title'] if entry else None) == expected
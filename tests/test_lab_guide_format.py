@@ -0,0 +1,57 @@
+import pytest
+
+from lab_guide_format import IncrementalFormatter, format_inline
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('Ver [scikit-learn](https://scikit-learn.org).',
+     'Ver <a href="https://scikit-learn.org">scikit-learn</a>.'),
+    ('Ver [Python](https://en.wikipedia.org/wiki/Python_(programming_language)) hoy',
+     'Ver <a href="https://en.wikipedia.org/wiki/Python_(programming_language)">Python</a> hoy'),
+    ('([Ruido](https://en.wikipedia.org/wiki/Noise_(signal_processing)))',
+     '(<a href="https://en.wikipedia.org/wiki/Noise_(signal_processing)">Ruido</a>)'),
+    ('[x](javascript:alert(1))', 'x'),
+    ('**<b>** y `a < b`', '<strong>&lt;b&gt;</strong> y <code>a &lt; b</code>'),
+])
+def test_format_inline(text, expected):
+    assert format_inline(text) == expected
+
+
+def test_streamed_links_keep_their_parentheses():
+    line = '- Ver [Python](https://en.wikipedia.org/wiki/Python_(programming_language))'
+    formatter = IncrementalFormatter()
+    # Split inside the parentheses of the url
+    html = formatter.feed(line[:60]) + formatter.feed(line[60:]) + formatter.close()
+
+    assert html == ('<ul>\n<li>Ver <a href="https://en.wikipedia.org/wiki/Python_(programming_language)">'
+                    'Python</a></li>\n</ul>\n')
+
+
+def test_lines_split_across_chunks_are_formatted_once_complete():
+    formatter = IncrementalFormatter()
+
+    assert formatter.feed('INTRODUC') == ''
+    assert formatter.feed('CION\nEl percep') == '<h2>INTRODUCCION</h2>\n'
+    assert formatter.feed('trón **clasifica**') == ''
+    assert formatter.feed('.\nMateriales:\n') == '<p>El perceptrón <strong>clasifica</strong>.</p>\n<h3>Materiales:</h3>\n'
+    assert formatter.close() == '<br>\n'
+
+
+def test_list_items_are_streamed_as_their_lines_end():
+    formatter = IncrementalFormatter()
+
+    assert formatter.feed('Pasos:\n1. Cargar') == '<h3>Pasos:</h3>\n'
+    assert formatter.feed(' los datos\n2. Entre') == '<ol>\n<li>Cargar los datos</li>\n'
+    assert formatter.feed('nar\n') == '<li>Entrenar</li>\n'
+    assert formatter.feed('- Python\n') == '</ol>\n<ul>\n<li>Python</li>\n'
+    assert formatter.feed('Fin') == ''
+    assert formatter.close() == '</ul>\n<p>Fin</p>\n'
+    assert formatter.html == ('<h3>Pasos:</h3>\n<ol>\n<li>Cargar los datos</li>\n<li>Entrenar</li>\n</ol>\n'
+                              '<ul>\n<li>Python</li>\n</ul>\n<p>Fin</p>\n')
+
+
+def test_close_ends_an_open_list():
+    formatter = IncrementalFormatter()
+
+    assert formatter.feed('- a\n- b') == '<ul>\n<li>a</li>\n'
+    assert formatter.close() == '<li>b</li>\n</ul>\n'
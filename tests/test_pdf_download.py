@@ -0,0 +1,75 @@
+import math
+
+import pytest
+
+from models import db, LabGuide, Subject, User
+
+
+@pytest.fixture
+def guide_id(web_app, professor):
+    with web_app.app_context():
+        guide = LabGuide(title='Perceptrón', content='<h2>INTRODUCCION</h2>\n<p>Texto</p>\n', lab_number=1,
+                         subject_id=professor.subject_id, weekly_topic_id=professor.topic_ids[0],
+                         created_by_id=professor.id)
+        db.session.add(guide)
+        db.session.commit()
+        return guide.id
+
+
+def download(client, guide_id, etag=None):
+    headers = {'If-None-Match': f'"{etag}"'} if etag else {}
+    return client.get(f'/lab_guide/{guide_id}/pdf', headers=headers)
+
+
+def update(web_app, model, id, **values):
+    with web_app.app_context():
+        row = db.session.get(model, id)
+        for name, value in values.items():
+            setattr(row, name, value)
+        db.session.commit()
+
+
+def test_pdf_is_revalidated_with_its_etag(client, guide_id):
+    response = download(client, guide_id)
+    etag, _ = response.get_etag()
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/pdf'
+    assert response.data.startswith(b'%PDF')
+    assert response.cache_control.private and response.cache_control.no_cache
+    not_modified = download(client, guide_id, etag)
+    assert not_modified.status_code == 304
+    assert not_modified.get_etag() == (etag, False)
+
+
+@pytest.mark.parametrize('model, values', [
+    (LabGuide, {'title': 'Perceptrón multicapa'}),
+    (Subject, {'code': 'RENAMED'}),
+    (Subject, {'name': 'Otra materia'}),
+    (User, {'username': 'renamed'}),
+    (User, {'department': 'Matemáticas'}),
+])
+def test_changes_shown_in_the_pdf_change_its_etag(web_app, client, professor, guide_id, model, values):
+    etag, _ = download(client, guide_id).get_etag()
+    row_id = {LabGuide: guide_id, Subject: professor.subject_id, User: professor.id}[model]
+    if 'username' in values:
+        values['username'] += str(professor.id)
+
+    update(web_app, model, row_id, **values)
+    response = download(client, guide_id, etag)
+
+    assert response.status_code == 200
+    assert response.get_etag()[0] != etag
+
+
+
+def test_saturated_render_pool_answers_503_with_retry_after(web_app, client, guide_id, monkeypatch):
+    pool = web_app.extensions['render_pool']
+    monkeypatch.setattr(pool, '_in_flight', pool.max_workers + pool.queue_depth)
+    monkeypatch.setattr(pool, '_render_times', [3.0])
+
+    response = download(client, guide_id)
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == str(math.ceil(3 * (pool.max_workers + pool.queue_depth) / pool.max_workers))
+    assert pool.stats()['rejected'] >= 1
@@ -0,0 +1,49 @@
+import io
+import zipfile
+
+import pytest
+
+from models import db, LabGuide
+
+
+@pytest.fixture
+def guide_ids(web_app, professor):
+    with web_app.app_context():
+        guides = [LabGuide(title=f'Guía {week}', content='<h2>INTRODUCCION</h2>\n<p>Texto</p>\n', lab_number=week,
+                           subject_id=professor.subject_id, weekly_topic_id=topic_id, created_by_id=professor.id)
+                  for week, topic_id in enumerate(professor.topic_ids[:2], start=1)]
+        db.session.add_all(guides)
+        db.session.commit()
+        return [guide.id for guide in guides]
+
+
+def export(client, professor, export_id=None):
+    query = f'?export_id={export_id}' if export_id else ''
+    return client.get(f'/subject/{professor.subject_id}/lab_guides.zip{query}')
+
+
+def test_export_progress_can_be_polled(client, professor, guide_ids):
+    response = export(client, professor, 'export-1234')
+
+    with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+        assert len(archive.namelist()) == 2
+    progress = client.get('/api/exports/export-1234').get_json()
+    assert (progress['done'], progress['total'], progress['failed'], progress['finished']) == (2, 2, 0, True)
+    assert progress['rendered'] + progress['cached'] == 2
+
+
+def test_export_progress_is_only_shown_to_its_user(web_app, client, professor, guide_ids):
+    export(client, professor, 'export-5678').close()
+    other = web_app.test_client()
+    other.post('/login', data={'username': 'drsmith', 'password': 'password123'})
+
+    assert client.get('/api/exports/export-5678').status_code == 200
+    assert other.get('/api/exports/export-5678').status_code == 404
+
+
+@pytest.mark.parametrize('export_id', ['short', 'dots.not.allowed', 'a' * 65])
+def test_exports_without_a_valid_id_are_not_followed(client, professor, guide_ids, export_id):
+    response = export(client, professor, export_id)
+
+    assert response.status_code == 200
+    assert client.get(f'/api/exports/{export_id}').status_code == 404
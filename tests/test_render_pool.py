@@ -0,0 +1,48 @@
+from datetime import datetime
+
+import pytest
+
+from pdf_renderer import AuthorSnapshot, GuideSnapshot, SubjectSnapshot
+from render_pool import RenderPool, RenderPoolSaturated
+
+
+def snapshot(n):
+    return GuideSnapshot(id=n, title=f'Guía {n}', content='<h2>INTRODUCCION</h2>\n<p>Texto</p>\n', lab_number=n,
+                         subject=SubjectSnapshot(code='IA1', name='IA'),
+                         created_by=AuthorSnapshot(username='prof', department='Ingeniería'),
+                         updated_at=datetime(2026, 1, 1), cache_key=f'{n}-key')
+
+
+@pytest.fixture
+def pool():
+    pool = RenderPool()
+    pool.max_workers, pool.queue_depth = 1, 1
+    yield pool
+    pool.shutdown()
+
+
+def test_renders_beyond_the_workers_and_the_queue_are_rejected(pool, tmp_path):
+    # Processes take a while to spawn, so neither render finishes before the third is submitted
+    futures = [pool.submit(snapshot(n), str(tmp_path / f'{n}.pdf')) for n in (1, 2)]
+
+    with pytest.raises(RenderPoolSaturated) as saturated:
+        pool.submit(snapshot(3), str(tmp_path / '3.pdf'))
+
+    assert saturated.value.retry_after >= 1
+    assert (pool.stats()['in_flight'], pool.stats()['queued'], pool.stats()['rejected']) == (2, 1, 1)
+    for future in futures:
+        with open(future.result(timeout=60), 'rb') as f:
+            assert f.read(4) == b'%PDF'
+    stats = pool.stats()
+    assert (stats['in_flight'], stats['completed'], stats['failed']) == (0, 2, 0)
+    assert pool.render(snapshot(3), str(tmp_path / '3.pdf')) == str(tmp_path / '3.pdf')
+
+
+def test_retry_after_follows_the_recent_render_times(pool):
+    pool._render_times.extend([4.0, 6.0])
+    pool._in_flight = 2
+
+    with pytest.raises(RenderPoolSaturated) as saturated:
+        pool.submit(snapshot(1), 'unused.pdf')
+
+    assert saturated.value.retry_after == 10
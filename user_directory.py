@@ -0,0 +1,106 @@
+"""
+User Directory Module
+
+This module lists user accounts a page at a time. Pages are read with
+keyset pagination on the primary key and project only the listed columns
+of the users table, so a page costs the same however many accounts
+exist, and the polymorphic join with professors is never built. The
+total number of users is cached and refreshed when accounts are added or
+removed, or after USER_COUNT_TTL seconds.
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import event, func
+
+from models import db, User
+
+MAX_PAGE_SIZE = 100
+
+
+@dataclass
+class UserRow:
+    id: int
+    username: str
+    user_type: Optional[str]
+    created_at: datetime
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'username': self.username,
+            'user_type': self.user_type,
+            'created_at': self.created_at.isoformat(),
+        }
+
+
+@dataclass
+class UserPage:
+    """A page of users; next_after is the cursor of the following page, if any."""
+    users: List[UserRow]
+    next_after: Optional[int]
+    total: int
+
+
+class UserCount:
+    """Cached number of users, invalidated by account inserts and deletes."""
+
+    def __init__(self, app=None):
+        self.ttl = 60
+        self._value: Optional[int] = None
+        self._expires = 0.0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Bind the count to a Flask application and watch the users table."""
+        app.config.setdefault('USER_COUNT_TTL', 60)
+        self.ttl = app.config['USER_COUNT_TTL']
+        app.extensions['user_count'] = self
+        event.listen(User, 'after_insert', self._invalidate, propagate=True)
+        event.listen(User, 'after_delete', self._invalidate, propagate=True)
+
+    def _invalidate(self, mapper, connection, target):
+        self.invalidate()
+
+    def invalidate(self):
+        with self._lock:
+            self._value = None
+
+    def get(self) -> int:
+        with self._lock:
+            if self._value is not None and time.monotonic() < self._expires:
+                return self._value
+        value = db.session.query(func.count(User.id)).scalar()
+        with self._lock:
+            self._value = value
+            self._expires = time.monotonic() + self.ttl
+        return value
+
+
+def list_users(after: Optional[int], limit: int, count: UserCount) -> UserPage:
+    """
+    Read a page of users ordered by ID.
+
+    Args:
+        after (int): ID of the last user of the previous page (None for the first page)
+        limit (int): Page size, clamped to 1..MAX_PAGE_SIZE
+        count (UserCount): Cache of the total number of users
+
+    Returns:
+        UserPage: The users of the page, the cursor of the next page and the total
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = db.session.query(User.id, User.username, User.user_type, User.created_at)
+    if after is not None:
+        query = query.filter(User.id > after)
+    # One extra row tells whether another page follows without counting
+    rows = query.order_by(User.id).limit(limit + 1).all()
+    users = [UserRow(*row) for row in rows[:limit]]
+    next_after = users[-1].id if len(rows) > limit else None
+    return UserPage(users=users, next_after=next_after, total=count.get())